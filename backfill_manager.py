@@ -58,47 +58,79 @@ class BackfillManager:
         print(f"[2/3] 开始分批回填（每批 {self.batch_size} 只股票）...")
         stock_codes = stocks['code'].tolist()
         total_batches = (len(stock_codes) + self.batch_size - 1) // self.batch_size
+        # 按代码建立有序索引，批次内按索引取元信息，避免每批对全表做布尔扫描
+        stocks_indexed = stocks.set_index('code').sort_index()
         
         self._update_task_status('running')
         
         success_count = 0
         fail_count = 0
         
-        for batch_idx in range(total_batches):
-            try:
-                start_idx = batch_idx * self.batch_size
-                end_idx = min((batch_idx + 1) * self.batch_size, len(stock_codes))
-                batch_codes = stock_codes[start_idx:end_idx]
-                
-                print(f"\n批次 {batch_idx + 1}/{total_batches}:")
-                print(f"  处理股票 {start_idx + 1} - {end_idx} / {len(stock_codes)}")
-                
-                # 回填批次数据
-                success, rate_limited = self._process_batch(batch_codes, stocks)
-                
-                if success:
-                    success_count += 1
-                else:
-                    fail_count += 1
-                
-                # --- RATE LIMIT BEGIN (EASY REMOVE) ---
-                if rate_limited:
-                    print("⚠️  触发全量回填限速，已停止后续批次")
-                    self._update_task_status('rate_limited')
-                    break
-                # --- RATE LIMIT END ---
+        if not getattr(config, "TUSHARE_USE_IN_BACKFILL", False):
+            print("  ⚠️  未启用 Tushare 回填，跳过全部批次")
+            fail_count = total_batches
+            batches = []
+        else:
+            batches = [
+                stock_codes[i:i + self.batch_size]
+                for i in range(0, len(stock_codes), self.batch_size)
+            ]
+        
+        # 回填期间删除二级索引，结束后统一重建
+        database.drop_secondary_indexes()
+        
+        # 后台线程并发拉取，当前线程负责计算与写库（SQLite 单写入者）
+        fetched_batches = data_fetcher.fetch_market_data_tushare_batches(
+            batches,
+            self.start_date,
+            self.end_date,
+            max_calls=getattr(config, "BACKFILL_RATE_LIMIT_CALLS_PER_MIN", 45),
+            rate_limit_enable=getattr(config, "BACKFILL_RATE_LIMIT_ENABLE", True),
+            run_label="backfill"
+        )
+        
+        try:
+            for batch_idx, batch_codes, batch_data, rate_limited, call_count in fetched_batches:
+                try:
+                    start_idx = batch_idx * self.batch_size
+                    end_idx = start_idx + len(batch_codes)
+                    
+                    print(f"\n批次 {batch_idx + 1}/{total_batches}: 处理股票 {start_idx + 1} - {end_idx} / {len(stock_codes)}")
+                    
+                    # --- RATE LIMIT BEGIN (EASY REMOVE) ---
+                    if rate_limited:
+                        print(f"  ⚠️  回填触发限速（已调用 {call_count} 次）")
+                    # --- RATE LIMIT END ---
+                    
+                    # 回填批次数据
+                    success = self._process_batch(batch_codes, batch_data, stocks_indexed)
+                    
+                    if success:
+                        success_count += 1
+                    else:
+                        fail_count += 1
+                    
+                    # --- RATE LIMIT BEGIN (EASY REMOVE) ---
+                    if rate_limited:
+                        print("⚠️  触发全量回填限速，已停止后续批次")
+                        self._update_task_status('rate_limited')
+                        break
+                    # --- RATE LIMIT END ---
 
-                # 更新进度
-                progress_pct = (batch_idx + 1) / total_batches * 100
-                print(f"  总体进度: {progress_pct:.1f}% ({batch_idx + 1}/{total_batches})")
-                
-            except KeyboardInterrupt:
-                print("\n⚠️  用户中断，保存当前进度...")
-                self._update_task_status('interrupted')
-                break
-            except Exception as e:
-                print(f"✗ 批次 {batch_idx + 1} 处理失败: {e}")
-                fail_count += 1
+                    # 更新进度
+                    progress_pct = (batch_idx + 1) / total_batches * 100
+                    print(f"  总体进度: {progress_pct:.1f}% ({batch_idx + 1}/{total_batches})")
+                    
+                except Exception as e:
+                    print(f"✗ 批次 {batch_idx + 1} 处理失败: {e}")
+                    fail_count += 1
+        except KeyboardInterrupt:
+            print("\n⚠️  用户中断，保存当前进度...")
+            self._update_task_status('interrupted')
+        finally:
+            fetched_batches.close()
+            print("  重建索引...")
+            database.rebuild_secondary_indexes()
         
         # 完成任务
         print(f"\n[3/3] 回填任务完成")
@@ -111,58 +143,43 @@ class BackfillManager:
         print("✓ 全量回填完成")
         print("="*60)
     
-    def _process_batch(self, batch_codes: list, stocks: pd.DataFrame) -> tuple[bool, bool]:
-        """处理单个批次"""
+    def _process_batch(self, batch_codes: list, batch_data: pd.DataFrame,
+                       stocks_indexed: pd.DataFrame) -> bool:
+        """处理单个已拉取的批次：计算连板并写库（stocks_indexed 为按 code 索引的元信息）"""
         try:
-            # 获取批次数据
-            print(f"  [1/3] 获取历史数据...")
-            rate_limited = False
-            if getattr(config, "TUSHARE_USE_IN_BACKFILL", False):
-                # --- RATE LIMIT BEGIN (EASY REMOVE) ---
-                batch_data, rate_limited, call_count = data_fetcher.fetch_market_data_tushare(
-                    batch_codes,
-                    self.start_date,
-                    self.end_date,
-                    max_calls=getattr(config, "BACKFILL_RATE_LIMIT_CALLS_PER_MIN", 45),
-                    rate_limit_enable=getattr(config, "BACKFILL_RATE_LIMIT_ENABLE", True),
-                    run_label="backfill"
-                )
-                if rate_limited:
-                    print(f"  ⚠️  回填触发限速（已调用 {call_count} 次）")
-                # --- RATE LIMIT END ---
-            else:
-                print("  ⚠️  未启用 Tushare 回填，跳过批次")
-                return False, rate_limited
-            
             if batch_data.empty:
-                print(f"  ⚠️  批次数据为空")
-                return False, rate_limited
+                print("  ⚠️  批次数据为空")
+                return False
             
-            # 保存市场数据
-            print(f"  [2/3] 保存市场数据 ({len(batch_data)} 条)...")
-            try:
-                database.save_daily_data(batch_data)
-            except Exception as e:
-                # 可能是重复数据，继续执行
-                print(f"  ⚠️  保存数据警告: {e}")
+            batch_stocks = stocks_indexed.loc[
+                stocks_indexed.index.intersection(batch_codes)
+            ].reset_index()
             
-            # 计算连板
-            print(f"  [3/3] 计算连板高度...")
-            batch_stocks = stocks[stocks['code'].isin(batch_codes)]
+            # 先算完连板再开写事务，计算期间不持有写锁（预读线程写拉取缓存不必等待）
+            print(f"  [1/2] 计算连板高度 ({len(batch_data)} 条行情)...")
             batch_results = limit_calculator.calculate_batch_chain(batch_data, batch_stocks)
+            conn = database.get_connection()
+            try:
+                # 行情与连板结果在同一事务内写入
+                print("  [2/2] 保存市场数据与连板结果...")
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    database.save_daily_data(batch_data, conn=conn)
+                    if not batch_results.empty:
+                        database.save_limit_results(batch_results, conn=conn)
+                print(f"  ✓ 批次完成，计算 {len(batch_results)} 条连板记录")
+            except Exception as e:
+                # 重复行已由 INSERT OR IGNORE 跳过，到这里的都是真实失败：本批次已整体回滚，记为失败
+                print(f"  ✗ 保存批次数据失败（已回滚）: {e}")
+                return False
+            finally:
+                conn.close()
             
-            if not batch_results.empty:
-                try:
-                    database.save_limit_results(batch_results)
-                    print(f"  ✓ 批次完成，计算 {len(batch_results)} 条连板记录")
-                except Exception as e:
-                    print(f"  ⚠️  保存结果警告: {e}")
-            
-            return True, rate_limited
+            return True
             
         except Exception as e:
             print(f"  ✗ 批次处理异常: {e}")
-            return False, False
+            return False
     
     def _create_task_record(self):
         """创建任务记录"""
@@ -187,8 +204,11 @@ def resume_interrupted_task(task_id: str):
     print(f"尝试恢复任务: {task_id}")
     
     conn = database.get_connection()
-    query = f"SELECT * FROM fetch_progress WHERE task_id = '{task_id}'"
-    task = pd.read_sql_query(query, conn)
+    task = pd.read_sql_query(
+        "SELECT start_date, end_date, status FROM fetch_progress WHERE task_id = ?",
+        conn,
+        params=(task_id,)
+    )
     conn.close()
     
     if task.empty:
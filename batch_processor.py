@@ -1,13 +1,29 @@
 """
 批量处理模块 - MVP版本（近3个月数据）
 """
+import heapq
 import pandas as pd
-import sqlite3
+from collections import Counter
 from datetime import datetime
 import database
 import data_fetcher
 import limit_calculator
 import config
+from data_fetcher import _dbg_log
+
+# #region agent log
+# 进程启动时记录一次实际加载的 database 模块版本
+_dbg_log("H4", "batch_processor.py:module", "loaded", {
+    "database_file": getattr(database, "__file__", ""),
+    "db_module_version": getattr(database, "DB_MODULE_VERSION", "missing"),
+    "db_has_version": hasattr(database, "DB_MODULE_VERSION")
+})
+# #endregion agent log
+
+
+def _select_stocks(stocks_indexed: pd.DataFrame, codes) -> pd.DataFrame:
+    """按代码从以 code 为索引的元信息中取出子集（哈希查找，避免全表 isin 扫描）"""
+    return stocks_indexed.loc[stocks_indexed.index.intersection(codes)].reset_index()
 
 
 def run_mvp_pipeline(recent_days: int = None):
@@ -25,15 +41,8 @@ def run_mvp_pipeline(recent_days: int = None):
     print("="*60)
     # #region agent log
     try:
-        from data_fetcher import _dbg_log as _dbg_log_local
-        import importlib
-        import database as _db_mod
-        _db_mod = importlib.reload(_db_mod)
-        _dbg_log_local("H4", "batch_processor.py:run_mvp_pipeline", "enter", {
-            "recent_days": int(recent_days),
-            "database_file": getattr(_db_mod, "__file__", ""),
-            "db_module_version": getattr(_db_mod, "DB_MODULE_VERSION", "missing"),
-            "db_has_version": hasattr(_db_mod, "DB_MODULE_VERSION")
+        _dbg_log("H4", "batch_processor.py:run_mvp_pipeline", "enter", {
+            "recent_days": int(recent_days)
         })
     except Exception:
         pass
@@ -61,7 +70,7 @@ def run_mvp_pipeline(recent_days: int = None):
     print(f"日期范围: {start_date} ~ {end_date}")
     # #region agent log
     try:
-        _dbg_log_local("H4", "batch_processor.py:run_mvp_pipeline", "date_range", {"start_date": start_date, "end_date": end_date})
+        _dbg_log("H4", "batch_processor.py:run_mvp_pipeline", "date_range", {"start_date": start_date, "end_date": end_date})
     except Exception:
         pass
     # #endregion agent log
@@ -70,13 +79,16 @@ def run_mvp_pipeline(recent_days: int = None):
     mvp_limit = getattr(config, "MVP_LIMIT_STOCKS", 0)
     if mvp_limit and int(mvp_limit) > 0:
         print(f"\n⚠️  MVP模式：只处理前 {int(mvp_limit)} 只股票用于快速验证")
-        stock_codes = stocks['code'].head(int(mvp_limit)).tolist()
+        stocks_subset = stocks.head(int(mvp_limit))
     else:
-        stock_codes = stocks['code'].tolist()
+        stocks_subset = stocks
+    # 只使用已获取数据对应的股票元信息；代码列表与索引每次流程只构建一次
+    stock_codes = stocks_subset['code'].tolist()
+    stocks_indexed = stocks.set_index('code').sort_index()
     
     # #region agent log
     try:
-        _dbg_log_local("H9", "batch_processor.py:run_mvp_pipeline", "before_fetch_market", {
+        _dbg_log("H9", "batch_processor.py:run_mvp_pipeline", "before_fetch_market", {
             "codes_count": len(stock_codes),
             "mvp_limit": int(mvp_limit) if mvp_limit else 0
         })
@@ -90,7 +102,7 @@ def run_mvp_pipeline(recent_days: int = None):
             max_calls = int(getattr(config, "TUSHARE_MAX_CALLS_PER_MIN", 50))
             # #region agent log
             try:
-                _dbg_log_local("H18", "batch_processor.py:run_mvp_pipeline", "mvp_use_tushare_only", {
+                _dbg_log("H18", "batch_processor.py:run_mvp_pipeline", "mvp_use_tushare_only", {
                     "max_calls": int(max_calls)
                 })
             except Exception:
@@ -99,88 +111,90 @@ def run_mvp_pipeline(recent_days: int = None):
 
             market_data = pd.DataFrame()
             # 是否使用按日期批量拉取模式（需要较高Tushare积分）
-            use_by_date_mode = getattr(config, "TUSHARE_USE_BY_DATE_MODE", False)
+            # 天数按自然日计（交易日不多于此），用于 'auto' 模式估算调用次数
+            n_days = (datetime.strptime(end_date, '%Y%m%d') - datetime.strptime(start_date, '%Y%m%d')).days + 1
+            use_by_date_mode = config.use_tushare_by_date(len(stock_codes), n_days)
             if not mvp_limit and use_by_date_mode:
                 # === 按日期批量拉取模式（需要较高积分，免费用户数据不全） ===
                 print("\n⚙️  使用按日期批量拉取模式...")
-                market_data = data_fetcher.fetch_market_data_tushare_by_date(
-                    start_date,
-                    end_date
-                )
-                if market_data.empty:
+                # 逐个交易日拉取、过滤并写库，只保留计算所需列用于后续连板计算
+                compute_chunks = []
+                saved_rows = 0
+                print("\n保存市场数据到数据库...")
+                try:
                     # #region agent log
                     try:
-                        _dbg_log_local("H29", "batch_processor.py:run_mvp_pipeline", "by_date_empty_fallback", {
+                        _dbg_log("H35", "batch_processor.py:run_mvp_pipeline", "save_daily_direct_start", {
                             "start_date": start_date,
                             "end_date": end_date
                         })
                     except Exception:
                         pass
                     # #endregion agent log
-                else:
-                    # 过滤到当前股票列表（避免意外品种）
-                    if "code" in market_data.columns:
-                        market_data = market_data[market_data["code"].isin(set(stock_codes))]
-                    # #region agent log
+                    # 复用 database 的连接（PRAGMA 统一在 get_connection 中设置）
+                    conn = database.get_connection()
                     try:
-                        _dbg_log_local("H28", "batch_processor.py:run_mvp_pipeline", "market_data_filtered", {
-                            "rows": int(len(market_data)),
-                            "unique_codes": int(market_data["code"].nunique()) if "code" in market_data.columns else 0
-                        })
-                    except Exception:
-                        pass
-                    # #endregion agent log
+                        # 各交易日先以多行 VALUES 写入无索引的临时暂存表，
+                        # 最后一次性按 (date, code) 顺序导入目标表，整体一个事务
+                        with conn:
+                            conn.execute("BEGIN")
+                            stage = database.create_stage_table(conn, 'daily_market_data')
+                            columns = None
+                            # 生成器内已过滤到当前股票列表（避免意外品种）
+                            for chunk in data_fetcher.fetch_market_data_tushare_by_date(
+                                start_date, end_date, stock_codes=stock_codes
+                            ):
+                                columns = list(chunk.columns)
+                                database.insert_dataframe_multirow(conn, stage, chunk)
+                                compute_chunks.append(chunk.drop(columns=['volume', 'amount']))
+                                del chunk
+                            if columns:
+                                saved_rows = database.load_stage_table(
+                                    conn, stage, 'daily_market_data', columns, order_by="date, code"
+                                )
+                    finally:
+                        conn.close()
+                        market_data = (
+                            data_fetcher.concat_market_frames(compute_chunks) if compute_chunks else pd.DataFrame()
+                        )
+                        del compute_chunks
 
+                    if market_data.empty:
+                        # #region agent log
+                        try:
+                            _dbg_log("H29", "batch_processor.py:run_mvp_pipeline", "by_date_empty_fallback", {
+                                "start_date": start_date,
+                                "end_date": end_date
+                            })
+                        except Exception:
+                            pass
+                        # #endregion agent log
+                    else:
+                        # #region agent log
+                        try:
+                            _dbg_log("H28", "batch_processor.py:run_mvp_pipeline", "market_data_filtered", {
+                                "rows": int(len(market_data)),
+                                "unique_codes": int(market_data["code"].nunique())
+                            })
+                        except Exception:
+                            pass
+                        # #endregion agent log
                     # #region agent log
                     try:
-                        _dbg_log_local("H9", "batch_processor.py:run_mvp_pipeline", "after_fetch_market", {"rows": int(len(market_data))})
-                    except Exception:
-                        pass
-                    # #endregion agent log
-
-                # 保存市场数据（直接写入，避免旧模块缓存）
-                print("\n保存市场数据到数据库...")
-                try:
-                    chunk_size = int(getattr(config, "DAILY_SAVE_CHUNK_SIZE", 50000))
-                    # #region agent log
-                    try:
-                        _dbg_log_local("H35", "batch_processor.py:run_mvp_pipeline", "save_daily_direct_start", {
-                            "rows": int(len(market_data)),
-                            "chunk_size": int(chunk_size)
-                        })
-                    except Exception:
-                        pass
-                    # #endregion agent log
-                    conn = sqlite3.connect(config.DB_PATH, timeout=30)
-                    conn.execute("PRAGMA busy_timeout=30000;")
-                    conn.execute("PRAGMA journal_mode=WAL;")
-                    market_data.to_sql(
-                        'daily_market_data',
-                        conn,
-                        if_exists='append',
-                        index=False,
-                        chunksize=chunk_size,
-                        method='multi'
-                    )
-                    conn.commit()
-                    conn.close()
-                    # #region agent log
-                    try:
-                        _dbg_log_local("H35", "batch_processor.py:run_mvp_pipeline", "save_daily_direct_done", {
-                            "rows": int(len(market_data))
+                        _dbg_log("H35", "batch_processor.py:run_mvp_pipeline", "save_daily_direct_done", {
+                            "rows": int(saved_rows)
                         })
                     except Exception:
                         pass
                     # #endregion agent log
-                    print(f"✓ 市场数据已保存，共 {len(market_data)} 条记录")
+                    print(f"✓ 市场数据已保存，共 {saved_rows} 条记录")
                 except Exception as e:
                     print(f"⚠️  保存数据时出现警告: {e}")
                     print("继续执行后续步骤...")
 
-                    # 步骤4: 计算连板高度
+                # 步骤4: 计算连板高度（直接使用刚写入的行情，无需回读）
+                if not market_data.empty:
                     print("\n[4/5] 计算连板高度...")
-                    # 只使用已获取数据对应的股票元信息
-                    stocks_subset = stocks[stocks['code'].isin(stock_codes)]
                     limit_results = limit_calculator.calculate_batch_chain(market_data, stocks_subset)
                     batch_mode = False
 
@@ -195,7 +209,8 @@ def run_mvp_pipeline(recent_days: int = None):
                 batch_size = int(getattr(config, "MVP_BATCH_SIZE", config.FETCH_BATCH_SIZE))
                 total_batches = (len(stock_codes) + batch_size - 1) // batch_size
                 print(f"\n⚙️  MVP批量模式：{total_batches} 批，每批 {batch_size} 只股票")
-                limit_results_list = []
+                # 逐批累计摘要统计，无需拼接全部批次结果
+                summary = SummaryAccumulator(end_date)
 
                 for batch_idx in range(total_batches):
                     start_idx = batch_idx * batch_size
@@ -203,11 +218,12 @@ def run_mvp_pipeline(recent_days: int = None):
                     batch_codes = stock_codes[start_idx:end_idx]
                     # #region agent log
                     try:
-                        _dbg_log_local("H26", "batch_processor.py:run_mvp_pipeline", "batch_start", {
-                            "batch_idx": int(batch_idx + 1),
-                            "codes_count": int(len(batch_codes)),
-                            "batch_size": int(batch_size),
-                        })
+                        if getattr(config, "DEBUG_LOG_ENABLE", False):
+                            _dbg_log("H26", "batch_processor.py:run_mvp_pipeline", "batch_start", {
+                                "batch_idx": int(batch_idx + 1),
+                                "codes_count": int(len(batch_codes)),
+                                "batch_size": int(batch_size),
+                            })
                     except Exception:
                         pass
                     # #endregion agent log
@@ -218,7 +234,8 @@ def run_mvp_pipeline(recent_days: int = None):
                         end_date,
                         max_calls=max_calls,
                         rate_limit_enable=True,
-                        run_label="mvp_batch"
+                        run_label="mvp_batch",
+                        allow_by_date=False
                     )
                     if rate_limited:
                         print(f"⚠️  MVP 批次 {batch_idx + 1} 触发 Tushare 限速（已调用 {call_count} 次），停止后续批次")
@@ -228,16 +245,14 @@ def run_mvp_pipeline(recent_days: int = None):
                         continue
 
                     # 保存市场数据
-                    print("\n保存市场数据到数据库...")
                     try:
                         database.save_daily_data(batch_data)
                         print(f"✓ 批次 {batch_idx + 1} 市场数据已保存，共 {len(batch_data)} 条记录")
                     except Exception as e:
                         print(f"⚠️  批次 {batch_idx + 1} 保存数据警告: {e}")
 
-                    # 计算连板高度
-                    print("\n[4/5] 计算连板高度...")
-                    batch_stocks = stocks[stocks['code'].isin(batch_codes)]
+                    print(f"\n[4/5] 批次 {batch_idx + 1} 计算连板高度...")
+                    batch_stocks = _select_stocks(stocks_indexed, batch_codes)
                     batch_results = limit_calculator.calculate_batch_chain(batch_data, batch_stocks)
                     if not batch_results.empty:
                         try:
@@ -245,12 +260,11 @@ def run_mvp_pipeline(recent_days: int = None):
                             print(f"✓ 批次 {batch_idx + 1} 连板分析结果已保存，共 {len(batch_results)} 条记录")
                         except Exception as e:
                             print(f"⚠️  批次 {batch_idx + 1} 保存结果警告: {e}")
-                        limit_results_list.append(batch_results)
+                        summary.add(batch_results)
 
-                if not limit_results_list:
+                if not summary.total_rows:
                     print("✗ MVP批量模式未获取到任何有效连板结果，流程终止")
                     return
-                limit_results = pd.concat(limit_results_list, ignore_index=True)
                 batch_mode = True
             else:
                 if market_data.empty:
@@ -270,7 +284,7 @@ def run_mvp_pipeline(recent_days: int = None):
 
                     # #region agent log
                     try:
-                        _dbg_log_local("H9", "batch_processor.py:run_mvp_pipeline", "after_fetch_market", {"rows": int(len(market_data))})
+                        _dbg_log("H9", "batch_processor.py:run_mvp_pipeline", "after_fetch_market", {"rows": int(len(market_data))})
                     except Exception:
                         pass
                     # #endregion agent log
@@ -286,8 +300,6 @@ def run_mvp_pipeline(recent_days: int = None):
 
                     # 步骤4: 计算连板高度
                     print("\n[4/5] 计算连板高度...")
-                    # 只使用已获取数据对应的股票元信息
-                    stocks_subset = stocks[stocks['code'].isin(stock_codes)]
                     limit_results = limit_calculator.calculate_batch_chain(market_data, stocks_subset)
                     batch_mode = False
         else:
@@ -296,28 +308,32 @@ def run_mvp_pipeline(recent_days: int = None):
     except Exception as e:
         # #region agent log
         try:
-            _dbg_log_local("H9", "batch_processor.py:run_mvp_pipeline", "fetch_market_exception", {"error": str(e), "error_type": type(e).__name__})
+            _dbg_log("H9", "batch_processor.py:run_mvp_pipeline", "fetch_market_exception", {"error": str(e), "error_type": type(e).__name__})
         except Exception:
             pass
         # #endregion agent log
         raise
     
-    if limit_results.empty:
-        print("✗ 连板计算失败，流程终止")
-        return
-    
-    # 保存连板分析结果（非批量模式）
-    if not batch_mode:
+    if batch_mode:
+        # 批量模式下结果已逐批保存，摘要已逐批累计
+        print("\n[5/5] 生成数据摘要...")
+        summary.print_summary()
+    else:
+        if limit_results.empty:
+            print("✗ 连板计算失败，流程终止")
+            return
+        
+        # 保存连板分析结果（非批量模式）
         print("\n保存连板分析结果到数据库...")
         try:
             database.save_limit_results(limit_results)
             print(f"✓ 连板分析结果已保存，共 {len(limit_results)} 条记录")
         except Exception as e:
             print(f"⚠️  保存结果时出现警告: {e}")
-    
-    # 步骤5: 生成摘要统计
-    print("\n[5/5] 生成数据摘要...")
-    generate_summary(limit_results, end_date)
+        
+        # 步骤5: 生成摘要统计
+        print("\n[5/5] 生成数据摘要...")
+        generate_summary(limit_results, end_date)
     
     print("\n" + "="*60)
     print("✓ MVP流程完成！")
@@ -369,8 +385,7 @@ def run_full_backfill(start_date: str = None, end_date: str = None):
     
     # #region agent log
     try:
-        from data_fetcher import _dbg_log as _dbg_log_local
-        _dbg_log_local("H19", "batch_processor.py:run_full_backfill", "enter", {
+        _dbg_log("H19", "batch_processor.py:run_full_backfill", "enter", {
             "start_date": start_date,
             "end_date": end_date,
             "batch_size": int(batch_size),
@@ -380,55 +395,63 @@ def run_full_backfill(start_date: str = None, end_date: str = None):
         pass
     # #endregion agent log
 
-    for batch_idx in range(total_batches):
-        start_idx = batch_idx * batch_size
-        end_idx = min((batch_idx + 1) * batch_size, len(stock_codes))
-        batch_codes = stock_codes[start_idx:end_idx]
-        
-        print(f"\n处理批次 {batch_idx + 1}/{total_batches}...")
-        
-        # 获取批次数据（仅使用 Tushare）
-        if not getattr(config, "TUSHARE_USE_IN_BACKFILL", False):
-            print("✗ 未启用 Tushare 回填，且已禁用其他数据源")
-            return
-        # #region agent log
-        try:
-            _dbg_log_local("H19", "batch_processor.py:run_full_backfill", "backfill_use_tushare_only", {
-                "batch_idx": int(batch_idx + 1),
-                "codes_count": int(len(batch_codes)),
-                "max_calls": int(getattr(config, "BACKFILL_RATE_LIMIT_CALLS_PER_MIN", 45))
-            })
-        except Exception:
-            pass
-        # #endregion agent log
-        batch_data, rate_limited, call_count = data_fetcher.fetch_market_data_tushare(
-            batch_codes,
-            start_date,
-            end_date,
-            max_calls=getattr(config, "BACKFILL_RATE_LIMIT_CALLS_PER_MIN", 45),
-            rate_limit_enable=getattr(config, "BACKFILL_RATE_LIMIT_ENABLE", True),
-            run_label="backfill"
-        )
-        if rate_limited:
-            print(f"⚠️  回填触发 Tushare 限速（已调用 {call_count} 次），停止后续批次")
-            break
-        
-        if not batch_data.empty:
-            # 保存市场数据
+    # 获取批次数据（仅使用 Tushare）
+    if not getattr(config, "TUSHARE_USE_IN_BACKFILL", False):
+        print("✗ 未启用 Tushare 回填，且已禁用其他数据源")
+        return
+
+    batches = [stock_codes[i:i + batch_size] for i in range(0, len(stock_codes), batch_size)]
+    # 按代码建立有序索引，批次内按索引取元信息，避免每批对全表做布尔扫描
+    stocks_indexed = stocks.set_index('code').sort_index()
+    # 回填期间删除二级索引，结束后统一重建
+    database.drop_secondary_indexes()
+    # 后台线程并发拉取，当前线程负责计算与写库（SQLite 单写入者）
+    fetched_batches = data_fetcher.fetch_market_data_tushare_batches(
+        batches,
+        start_date,
+        end_date,
+        max_calls=getattr(config, "BACKFILL_RATE_LIMIT_CALLS_PER_MIN", 45),
+        rate_limit_enable=getattr(config, "BACKFILL_RATE_LIMIT_ENABLE", True),
+        run_label="backfill"
+    )
+    try:
+        for batch_idx, batch_codes, batch_data, rate_limited, call_count in fetched_batches:
+            print(f"\n处理批次 {batch_idx + 1}/{total_batches}...")
+            # #region agent log
             try:
-                database.save_daily_data(batch_data)
-            except Exception as e:
-                print(f"⚠️  批次 {batch_idx + 1} 保存数据警告: {e}")
-            
-            # 计算连板
-            batch_stocks = stocks[stocks['code'].isin(batch_codes)]
-            batch_results = limit_calculator.calculate_batch_chain(batch_data, batch_stocks)
+                if getattr(config, "DEBUG_LOG_ENABLE", False):
+                    _dbg_log("H19", "batch_processor.py:run_full_backfill", "backfill_use_tushare_only", {
+                        "batch_idx": int(batch_idx + 1),
+                        "codes_count": int(len(batch_codes)),
+                        "max_calls": int(getattr(config, "BACKFILL_RATE_LIMIT_CALLS_PER_MIN", 45))
+                    })
+            except Exception:
+                pass
+            # #endregion agent log
+            if rate_limited:
+                print(f"⚠️  回填触发 Tushare 限速（已调用 {call_count} 次），停止后续批次")
+                break
             
-            if not batch_results.empty:
+            if not batch_data.empty:
+                # 保存市场数据
                 try:
-                    database.save_limit_results(batch_results)
+                    database.save_daily_data(batch_data)
                 except Exception as e:
-                    print(f"⚠️  批次 {batch_idx + 1} 保存结果警告: {e}")
+                    print(f"⚠️  批次 {batch_idx + 1} 保存数据警告: {e}")
+                
+                # 计算连板
+                batch_stocks = _select_stocks(stocks_indexed, batch_codes)
+                batch_results = limit_calculator.calculate_batch_chain(batch_data, batch_stocks)
+                
+                if not batch_results.empty:
+                    try:
+                        database.save_limit_results(batch_results)
+                    except Exception as e:
+                        print(f"⚠️  批次 {batch_idx + 1} 保存结果警告: {e}")
+    finally:
+        fetched_batches.close()
+        print("\n重建索引...")
+        database.rebuild_secondary_indexes()
     
     print("\n[4/4] 回填完成！")
     print("="*60)
@@ -469,90 +492,123 @@ def run_daily_update(target_date: str = None):
         print(f"✗ {target_date} 无交易数据（可能为休市日）")
         return
     
-    # 保存当日数据
+    # 当日行情与连板结果在同一事务内写入，失败时整体回滚
+    conn = database.get_connection()
     try:
-        database.save_daily_data(daily_data)
-        print(f"✓ {target_date} 市场数据已保存")
-    except Exception as e:
-        print(f"⚠️  保存数据警告: {e}")
-    
-    # 计算连板（需要结合历史数据）
-    print(f"\n[3/3] 计算 {target_date} 连板高度...")
-    
-    # 为了计算连板，需要获取每只股票的前一交易日状态
-    # 简化版：重新计算最近30天的连板状态
-    lookback_days = 30
-    start_date, _ = data_fetcher.get_recent_trading_days(lookback_days)
-    
-    all_results = []
-    for code in stock_codes[:50]:  # MVP: 只处理前50只
-        historical_data = database.get_stock_daily_data(code, start_date, target_date)
-        
-        if not historical_data.empty:
-            stock_info = stocks[stocks['code'] == code].iloc[0]
-            limit_ratio = stock_info['limit_ratio']
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            database.save_daily_data(daily_data, conn=conn)
+            print(f"✓ {target_date} 市场数据已写入")
             
-            result = limit_calculator.calculate_single_stock_chain(
-                historical_data, code, limit_ratio
-            )
+            # 计算连板（需要结合历史数据）
+            print(f"\n[3/3] 计算 {target_date} 连板高度...")
             
-            # 只保存目标日期的结果
-            result = result[result['date'] == target_date]
-            if not result.empty:
-                all_results.append(result)
-    
-    if all_results:
-        final_results = pd.concat(all_results, ignore_index=True)
-        try:
-            database.save_limit_results(final_results)
-            print(f"✓ {target_date} 连板分析结果已保存")
-        except Exception as e:
-            print(f"⚠️  保存结果警告: {e}")
+            # 为了计算连板，需要获取每只股票的前一交易日状态
+            # 简化版：重新计算最近30天的连板状态
+            lookback_days = 30
+            start_date, _ = data_fetcher.get_recent_trading_days(lookback_days)
+            
+            # 一次查询取回全部股票的回看数据；使用同一连接读取，才能看到本事务内刚写入的当日数据
+            historical_data = database.get_daily_data_bulk(stock_codes, start_date, target_date, conn=conn)
+            
+            if not historical_data.empty:
+                all_results = limit_calculator.calculate_batch_chain(historical_data, stocks)
+                # 只保存目标日期的结果
+                if not all_results.empty:
+                    final_results = all_results[all_results['date'] == target_date]
+                    if not final_results.empty:
+                        database.save_limit_results(final_results, conn=conn)
+        print(f"✓ {target_date} 市场数据与连板分析结果已保存")
+    except Exception as e:
+        print(f"⚠️  保存数据警告（已回滚）: {e}")
+    finally:
+        conn.close()
     
     print("\n" + "="*60)
     print("✓ 每日更新完成！")
     print("="*60)
 
 
+class SummaryAccumulator:
+    """按批次累计指定日期的摘要统计（涨停/炸板/一字板数量、连板分布、高连板 Top N）"""
+
+    def __init__(self, date: str, top_n: int = 10):
+        self.date = date
+        self.top_n = top_n
+        self.total_rows = 0
+        self.daily_rows = 0
+        self.limit_count = 0
+        self.fried_count = 0
+        self.yizi_count = 0
+        self.height_counts = Counter()
+        self.high_chain_count = 0
+        # 最小堆：(连板高度, -到达顺序, code, board_type)，同高度时先到者优先
+        self._top_high = []
+        self._seq = 0
+
+    def add(self, limit_results: pd.DataFrame):
+        """累计一个批次的连板分析结果"""
+        if limit_results.empty:
+            return
+        self.total_rows += len(limit_results)
+        daily_data = limit_results[limit_results['date'] == self.date]
+        if daily_data.empty:
+            return
+
+        self.daily_rows += len(daily_data)
+        sums = daily_data[['limit_status', 'is_fried']].sum()
+        self.limit_count += int(sums['limit_status'])
+        self.fried_count += int(sums['is_fried'])
+        self.yizi_count += int(daily_data['board_type'].eq('yizi').sum())
+        self.height_counts.update(daily_data['chain_height'].value_counts().to_dict())
+
+        high_chain = daily_data[daily_data['chain_height'] >= 3]
+        self.high_chain_count += len(high_chain)
+        for code, height, board_type in zip(
+            high_chain['code'], high_chain['chain_height'], high_chain['board_type']
+        ):
+            item = (int(height), -self._seq, code, board_type)
+            self._seq += 1
+            if len(self._top_high) < self.top_n:
+                heapq.heappush(self._top_high, item)
+            elif item > self._top_high[0]:
+                heapq.heapreplace(self._top_high, item)
+
+    def print_summary(self):
+        """打印摘要（与 generate_summary 输出格式一致）"""
+        print(f"\n📊 数据摘要 ({self.date}):")
+        print("-" * 40)
+
+        if self.daily_rows:
+            print(f"涨停数量: {self.limit_count}")
+            print(f"炸板数量: {self.fried_count}")
+            print(f"一字板数量: {self.yizi_count}")
+
+            # 连板高度分布
+            print("\n连板高度分布:")
+            for height in range(1, 11):
+                count = self.height_counts.get(height, 0)
+                if count > 0:
+                    print(f"  {height}板: {count}只")
+
+            # 高连板股票
+            if self.high_chain_count:
+                print(f"\n3板及以上股票 (共{self.high_chain_count}只):")
+                for height, _, code, board_type in sorted(self._top_high, reverse=True):
+                    print(f"  {code}: {height}板 ({board_type})")
+
+        print("-" * 40)
+
+
 def generate_summary(limit_results: pd.DataFrame, date: str = None):
     """生成数据摘要统计"""
     if date is None:
         # 使用最新日期
         date = limit_results['date'].max()
     
-    print(f"\n📊 数据摘要 ({date}):")
-    print("-" * 40)
-    
-    # 当日涨停统计
-    daily_data = limit_results[limit_results['date'] == date]
-    
-    if not daily_data.empty:
-        limit_count = daily_data['limit_status'].sum()
-        fried_count = daily_data['is_fried'].sum()
-        yizi_count = len(daily_data[daily_data['board_type'] == 'yizi'])
-        
-        print(f"涨停数量: {limit_count}")
-        print(f"炸板数量: {fried_count}")
-        print(f"一字板数量: {yizi_count}")
-        
-        # 连板高度分布
-        print("\n连板高度分布:")
-        for height in range(1, 11):
-            count = len(daily_data[daily_data['chain_height'] == height])
-            if count > 0:
-                print(f"  {height}板: {count}只")
-        
-        # 高连板股票
-        high_chain = daily_data[daily_data['chain_height'] >= 3].sort_values(
-            'chain_height', ascending=False
-        )
-        
-        if not high_chain.empty:
-            print(f"\n3板及以上股票 (共{len(high_chain)}只):")
-            for _, row in high_chain.head(10).iterrows():
-                print(f"  {row['code']}: {int(row['chain_height'])}板 ({row['board_type']})")
-    
-    print("-" * 40)
+    summary = SummaryAccumulator(date)
+    summary.add(limit_results)
+    summary.print_summary()
 
 
 if __name__ == '__main__':
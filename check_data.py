@@ -1,134 +1,237 @@
 # -*- coding: utf-8 -*-
 """数据完整性检查脚本"""
-import sqlite3
+import argparse
+import glob
+import json
 import os
-
-db_path = os.path.join(os.path.dirname(__file__), 'data', 'stock_limit.db')
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-
-print("=" * 70)
-print("                    数据完整性检查报告")
-print("=" * 70)
-
-# 1. 基本统计
-print("\n📊 基本统计")
-print("-" * 50)
-
-cursor.execute('SELECT COUNT(*) FROM stock_meta')
-stock_count = cursor.fetchone()[0]
-print(f"股票总数 (stock_meta): {stock_count}")
-
-cursor.execute('SELECT COUNT(*) FROM daily_market_data')
-market_count = cursor.fetchone()[0]
-print(f"日线数据总数 (daily_market_data): {market_count}")
-
-cursor.execute('SELECT COUNT(*) FROM limit_analysis_result')
-limit_count = cursor.fetchone()[0]
-print(f"涨停分析结果数 (limit_analysis_result): {limit_count}")
-
-# 2. 日期范围
-print("\n📅 日期范围")
-print("-" * 50)
-
-cursor.execute('SELECT MIN(date), MAX(date) FROM daily_market_data')
-date_range = cursor.fetchone()
-print(f"数据起始日期: {date_range[0]}")
-print(f"数据结束日期: {date_range[1]}")
-
-cursor.execute('SELECT COUNT(DISTINCT date) FROM daily_market_data')
-trade_days = cursor.fetchone()[0]
-print(f"交易日总数: {trade_days} 天")
-
-# 3. 每日数据量分布
-print("\n📈 每日数据量分布")
-print("-" * 50)
-
-cursor.execute('''
-    SELECT date, COUNT(*) as cnt 
-    FROM daily_market_data 
-    GROUP BY date 
-    ORDER BY date
-''')
-daily_stats = cursor.fetchall()
-
-# 计算统计
-counts = [r[1] for r in daily_stats]
-avg_count = sum(counts) / len(counts) if counts else 0
-min_count = min(counts) if counts else 0
-max_count = max(counts) if counts else 0
-
-print(f"每日平均数据量: {avg_count:.0f} 条")
-print(f"每日最小数据量: {min_count} 条")
-print(f"每日最大数据量: {max_count} 条")
-
-# 显示前5天和后5天
-print("\n前5个交易日:")
-for row in daily_stats[:5]:
-    print(f"  {row[0]}: {row[1]} 条")
-    
-print("\n后5个交易日:")
-for row in daily_stats[-5:]:
-    print(f"  {row[0]}: {row[1]} 条")
-
-# 4. 数据覆盖率
-print("\n📋 数据覆盖率分析")
-print("-" * 50)
-
-theoretical_max = stock_count * trade_days
-coverage = (market_count / theoretical_max * 100) if theoretical_max > 0 else 0
-print(f"理论最大数据量: {stock_count} × {trade_days} = {theoretical_max} 条")
-print(f"实际数据量: {market_count} 条")
-print(f"数据覆盖率: {coverage:.1f}%")
-
-# 5. 涨停统计
-print("\n🔥 涨停统计")
-print("-" * 50)
-
-cursor.execute('SELECT COUNT(*) FROM limit_analysis_result WHERE limit_status = 1')
-limit_up_count = cursor.fetchone()[0]
-print(f"涨停记录数: {limit_up_count}")
-
-cursor.execute('SELECT MAX(chain_height) FROM limit_analysis_result')
-max_chain = cursor.fetchone()[0]
-print(f"最高连板数: {max_chain}")
-
-# 连板高度分布
-cursor.execute('''
-    SELECT chain_height, COUNT(*) as cnt 
-    FROM limit_analysis_result 
-    WHERE chain_height > 0
-    GROUP BY chain_height 
-    ORDER BY chain_height
-''')
-chain_stats = cursor.fetchall()
-print("\n连板高度分布:")
-for row in chain_stats[:10]:
-    print(f"  {row[0]}板: {row[1]} 次")
-
-# 6. 数据异常检查
-print("\n⚠️  数据异常检查")
-print("-" * 50)
-
-# 检查是否有空值
-cursor.execute('SELECT COUNT(*) FROM daily_market_data WHERE close IS NULL OR pre_close IS NULL')
-null_count = cursor.fetchone()[0]
-print(f"空值记录数: {null_count}")
-
-# 检查重复记录
-cursor.execute('''
-    SELECT date, code, COUNT(*) as cnt 
-    FROM daily_market_data 
-    GROUP BY date, code 
-    HAVING cnt > 1
-''')
-duplicates = cursor.fetchall()
-print(f"重复记录数: {len(duplicates)}")
-
-if null_count == 0 and len(duplicates) == 0:
-    print("\n✅ 数据完整性检查通过！")
-else:
-    print("\n⚠️  存在数据异常，请检查")
-
-conn.close()
-print("\n" + "=" * 70)
\ No newline at end of file
+import sys
+import database
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'data', 'stock_limit.db')
+# 报告缓存目录：数据版本未变化时直接复用上次的统计结果
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'data', '.cache')
+
+
+def scalar(conn, sql: str, params=()):
+    """执行返回单个值的查询（语句由连接的预编译缓存复用）"""
+    return conn.execute(sql, params).fetchone()[0]
+
+
+def data_version(conn) -> str:
+    """
+    数据版本键：写入函数在每次写入时递增的写入序号（单行查询，行数不变的修正也会变化）
+
+    旧库尚无写入序号表时退回最新交易日 + 各表行数
+    """
+    write_seq = database.get_write_seq(conn)
+    if write_seq is not None:
+        return f"w{write_seq}"
+    row = conn.execute('''
+        SELECT (SELECT MAX(date) FROM daily_market_data),
+               (SELECT COUNT(*) FROM daily_market_data),
+               (SELECT COUNT(*) FROM limit_analysis_result),
+               (SELECT COUNT(*) FROM stock_meta)
+    ''').fetchone()
+    return "_".join(str(v) for v in row)
+
+
+def collect_report(conn) -> dict:
+    """执行全部检查查询，返回统计结果"""
+    cursor = conn.cursor()
+
+    # 每日统计优先读取触发器维护的汇总表（每个交易日一行），旧库无汇总表时扫描明细
+    if scalar(conn, "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'daily_stats_summary'"):
+        daily_source = 'SELECT date, row_count AS cnt FROM daily_stats_summary'
+    else:
+        daily_source = '''
+            SELECT date, COUNT(*) AS cnt
+            FROM daily_market_data
+            GROUP BY date
+        '''
+
+    # 股票数、日线总量、日期范围、交易日数、每日数据量及覆盖率在一次查询中完成
+    cursor.execute(f'''
+        WITH daily AS ({daily_source}),
+        stats AS (
+            SELECT (SELECT COUNT(*) FROM stock_meta) AS stock_count,
+                   COALESCE(SUM(cnt), 0) AS market_count, MIN(date) AS date_min, MAX(date) AS date_max,
+                   COUNT(*) AS trade_days, COALESCE(AVG(cnt), 0) AS avg_count,
+                   COALESCE(MIN(cnt), 0) AS min_count, COALESCE(MAX(cnt), 0) AS max_count
+            FROM daily
+        )
+        SELECT stock_count, market_count, date_min, date_max, trade_days,
+               avg_count, min_count, max_count,
+               stock_count * trade_days,
+               CASE WHEN stock_count * trade_days > 0
+                    THEN market_count * 100.0 / (stock_count * trade_days) ELSE 0 END
+        FROM stats
+    ''')
+    report = dict(zip(
+        ['stock_count', 'market_count', 'date_min', 'date_max', 'trade_days',
+         'avg_count', 'min_count', 'max_count', 'theoretical_max', 'coverage'],
+        cursor.fetchone()
+    ))
+
+    # 结果表的总数、涨停数、最高连板一次扫描取得
+    cursor.execute('''
+        SELECT COUNT(*), COALESCE(SUM(limit_status = 1), 0), MAX(chain_height)
+        FROM limit_analysis_result
+    ''')
+    report['limit_count'], report['limit_up_count'], report['max_chain'] = cursor.fetchone()
+
+    # 前5天和后5天（只取首尾各5个交易日）
+    cursor.execute(f'''
+        WITH daily AS ({daily_source})
+        SELECT date, cnt FROM daily ORDER BY date LIMIT 5
+    ''')
+    report['daily_head'] = [list(row) for row in cursor]
+    cursor.execute(f'''
+        WITH daily AS ({daily_source})
+        SELECT date, cnt FROM daily ORDER BY date DESC LIMIT 5
+    ''')
+    report['daily_tail'] = [list(row) for row in reversed(cursor.fetchall())]
+
+    # 连板高度分布
+    cursor.execute('''
+        SELECT chain_height, COUNT(*) as cnt
+        FROM limit_analysis_result
+        WHERE chain_height > 0
+        GROUP BY chain_height
+        ORDER BY chain_height
+        LIMIT 10
+    ''')
+    report['chain'] = [list(row) for row in cursor]
+
+    # 空值与重复记录一次查询返回计数（空值走部分索引，重复检查走 UNIQUE(date, code) 自带索引）
+    cursor.execute('''
+        SELECT
+            (SELECT COUNT(*) FROM daily_market_data WHERE close IS NULL OR pre_close IS NULL),
+            (SELECT COUNT(*) FROM (
+                SELECT 1 FROM daily_market_data
+                GROUP BY date, code
+                HAVING COUNT(*) > 1
+            ))
+    ''')
+    report['null_count'], report['duplicate_count'] = cursor.fetchone()
+    return report
+
+
+def load_report(conn, force: bool = False) -> dict:
+    """按数据版本读取缓存的统计结果，未命中时重新计算并写入缓存"""
+    cache_path = os.path.join(CACHE_DIR, f"check_{data_version(conn)}.json")
+    if not force and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            pass
+
+    report = collect_report(conn)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # 旧版本的缓存不再有效
+        for old_path in glob.glob(os.path.join(CACHE_DIR, "check_*.json")):
+            os.remove(old_path)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False)
+    except Exception as e:
+        print(f"⚠️  写入检查结果缓存失败: {e}", file=sys.stderr)
+    return report
+
+
+def print_report(report: dict):
+    """打印文本格式的检查报告"""
+    print("=" * 70)
+    print("                    数据完整性检查报告")
+    print("=" * 70)
+
+    # 1. 基本统计
+    print("\n📊 基本统计")
+    print("-" * 50)
+    print(f"股票总数 (stock_meta): {report['stock_count']}")
+    print(f"日线数据总数 (daily_market_data): {report['market_count']}")
+    print(f"涨停分析结果数 (limit_analysis_result): {report['limit_count']}")
+
+    # 2. 日期范围
+    print("\n📅 日期范围")
+    print("-" * 50)
+    print(f"数据起始日期: {report['date_min']}")
+    print(f"数据结束日期: {report['date_max']}")
+    print(f"交易日总数: {report['trade_days']} 天")
+
+    # 3. 每日数据量分布
+    print("\n📈 每日数据量分布")
+    print("-" * 50)
+    print(f"每日平均数据量: {report['avg_count']:.0f} 条")
+    print(f"每日最小数据量: {report['min_count']} 条")
+    print(f"每日最大数据量: {report['max_count']} 条")
+
+    print("\n前5个交易日:")
+    for date, count in report['daily_head']:
+        print(f"  {date}: {count} 条")
+
+    print("\n后5个交易日:")
+    for date, count in report['daily_tail']:
+        print(f"  {date}: {count} 条")
+
+    # 4. 数据覆盖率
+    print("\n📋 数据覆盖率分析")
+    print("-" * 50)
+    print(f"理论最大数据量: {report['stock_count']} × {report['trade_days']} = {report['theoretical_max']} 条")
+    print(f"实际数据量: {report['market_count']} 条")
+    print(f"数据覆盖率: {report['coverage']:.1f}%")
+
+    # 5. 涨停统计
+    print("\n🔥 涨停统计")
+    print("-" * 50)
+    print(f"涨停记录数: {report['limit_up_count']}")
+    print(f"最高连板数: {report['max_chain']}")
+
+    print("\n连板高度分布:")
+    for height, count in report['chain']:
+        print(f"  {height}板: {count} 次")
+
+    # 6. 数据异常检查
+    print("\n⚠️  数据异常检查")
+    print("-" * 50)
+    print(f"空值记录数: {report['null_count']}")
+    print(f"重复记录数: {report['duplicate_count']}")
+
+    if report['null_count'] == 0 and report['duplicate_count'] == 0:
+        print("\n✅ 数据完整性检查通过！")
+    else:
+        print("\n⚠️  存在数据异常，请检查")
+
+    print("\n" + "=" * 70)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据完整性检查')
+    parser.add_argument('--json', action='store_true', help='以 JSON 格式输出统计结果')
+    parser.add_argument('--force', action='store_true', help='忽略缓存，重新统计')
+    args = parser.parse_args()
+
+    # 报告整体缓冲输出，退出时统一写出，避免每行 print 都刷新一次；
+    # Windows 下改用 UTF-8，避免 GBK 控制台/管道无法编码 emoji
+    if hasattr(sys.stdout, "reconfigure"):
+        if sys.platform == "win32":
+            sys.stdout.reconfigure(encoding="utf-8")
+        sys.stdout.reconfigure(line_buffering=False)
+
+    conn = database.get_readonly_connection(DB_PATH)
+    try:
+        # 版本键与全部统计在同一读事务内完成：快照一致，且只加一次共享锁
+        conn.execute("BEGIN")
+        report = load_report(conn, force=args.force)
+        conn.rollback()
+    finally:
+        conn.close()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
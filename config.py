@@ -33,9 +33,14 @@ LIMIT_RATIO = {
 # 涨停判定误差容忍度
 LIMIT_TOLERANCE = 0.001  # 0.1%误差
 
+# 整数基点形式（1bp = 0.01%），供按分计价的整数涨停判定使用
+LIMIT_RATIO_BP = {k: int(round(v * 10000)) for k, v in LIMIT_RATIO.items()}
+LIMIT_TOLERANCE_BP = int(round(LIMIT_TOLERANCE * 10000))
+
 # 数据获取配置
 FETCH_BATCH_SIZE = 100  # 每批次获取股票数量
-FETCH_SLEEP_INTERVAL = 0.5  # 请求间隔（秒），避免限流
+FETCH_CONCURRENCY = 8  # AkShare 并发请求线程数
+FETCH_RATE_PER_SEC = 4  # AkShare 每秒最多请求次数
 
 # 调度配置
 DAILY_UPDATE_TIME = '16:00'  # 每日更新时间（收盘后）
@@ -44,6 +49,14 @@ DAILY_UPDATE_TIME = '16:00'  # 每日更新时间（收盘后）
 VERBOSE_OUTPUT = True
 PROGRESS_EVERY = 1  # 每隔多少只股票打印进度（数值越小输出越频繁）
 PRINT_EACH_STOCK = True  # 是否每只股票都输出开始提示
+# 调试日志默认关闭（设置环境变量 STOCK_DEBUG=1 开启）；关闭时跳过序列化与写盘
+DEBUG_LOG_ENABLE = os.environ.get("STOCK_DEBUG") == "1"
+# 调试日志文件路径（可用环境变量 STOCK_DEBUG_LOG 指定），默认写到项目下的 .cursor/debug.log
+DEBUG_LOG_PATH = os.environ.get("STOCK_DEBUG_LOG") or os.path.join(os.path.dirname(__file__), '.cursor', 'debug.log')
+# 查询结果使用 pyarrow 列式类型（需安装 pyarrow，Streamlit 已自带）；未安装时自动退回 NumPy 类型
+QUERY_ARROW_BACKEND = True
+# Web 历史统计页的统计窗口（天）：趋势图与高连板排行只扫描最近这段时间的数据
+WEB_HISTORY_DAYS = 365
 
 # AkShare 网络配置（可选）
 # 例如: AK_PROXY = "http://127.0.0.1:7890"
@@ -55,8 +68,8 @@ AK_HTTP_TIMEOUT = None
 HISTORY_MAX_ATTEMPTS = 2
 
 # Tushare 备用数据源（可选）
-# 需要你自行在 https://tushare.pro/ 注册并获取 Token
-TUSHARE_TOKEN = "b7c40ce1fb64e1e46d404414606a4cba5e0b6234c15f84ffe5a0e465"
+# 需要你自行在 https://tushare.pro/ 注册并获取 Token，只从环境变量 TUSHARE_TOKEN 读取（未设置时不使用 Tushare）
+TUSHARE_TOKEN = os.environ.get("TUSHARE_TOKEN") or None
 TUSHARE_MAX_CALLS_PER_MIN = 195
 TUSHARE_USE_IN_MVP = True
 TUSHARE_USE_IN_BACKFILL = True
@@ -64,28 +77,61 @@ TUSHARE_USE_IN_BACKFILL = True
 # Tushare 数据拉取模式
 # True: 按日期批量拉取（pro.daily(trade_date=...)），需要较高积分
 # False: 逐股拉取（pro.daily(ts_code=...)），积分要求低但调用次数多
+# 'auto': 按本次运行的股票数与天数选择调用次数更少的模式（同样需要较高积分）
 TUSHARE_USE_BY_DATE_MODE = False  # 免费用户建议设为 False
 
+def choose_tushare_mode(n_stocks: int, n_days: int) -> str:
+    """按调用次数选择拉取模式：按日期每天一次调用，逐股每只股票一次调用"""
+    return 'by_date' if n_days < n_stocks else 'by_code'
+
+def use_tushare_by_date(n_stocks: int, n_days: int) -> bool:
+    """解析 TUSHARE_USE_BY_DATE_MODE（支持 True/False/'auto'）"""
+    if TUSHARE_USE_BY_DATE_MODE == 'auto':
+        return choose_tushare_mode(n_stocks, n_days) == 'by_date'
+    return bool(TUSHARE_USE_BY_DATE_MODE)
+
+# 单次逐股拉取时批次内的并发请求数（总频率仍受每分钟额度限制）
+TUSHARE_FETCH_CONCURRENCY = 4
+
+# 回填并发拉取的最大线程数（实际并发由 AIMD 控制器动态调整）
+FETCH_MAX_WORKERS = 4
+
+# 当日股票列表缓存（同一天内多次运行不再重复请求数据源）
+STOCK_LIST_CACHE_ENABLE = True
+
+# 缓存历史区间的逐股拉取结果（断点续传/重跑时跳过已拉取批次）
+FETCH_CACHE_ENABLE = True
+# 拉取缓存的有效期（秒）：过期条目不再命中，并在写入新缓存时清理
+FETCH_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
 # 全量回填限速（易移除标记）
 BACKFILL_RATE_LIMIT_ENABLE = True
 BACKFILL_RATE_LIMIT_CALLS_PER_MIN = 195
 
 # 板块识别规则（股票代码前缀）
+_BOARD_PREFIX = {
+    '60': 'MAIN',  # 沪市主板
+    '00': 'MAIN',  # 深市主板
+    '30': 'GEM',   # 创业板
+    '68': 'STAR',  # 科创板
+    '92': 'BJ',    # 北交所
+}
+
 def get_board_type(code: str) -> str:
-    """根据股票代码识别板块类型"""
-    if code.startswith('60'):
-        return 'MAIN'  # 沪市主板
-    elif code.startswith('00'):
-        return 'MAIN'  # 深市主板
-    elif code.startswith('30'):
-        return 'GEM'   # 创业板
-    elif code.startswith('68'):
-        return 'STAR'  # 科创板
-    elif code.startswith('92'):
-        return 'BJ'    # 北交所
-    else:
-        return 'MAIN'  # 默认主板
+    """根据股票代码识别板块类型（未知前缀默认主板）"""
+    return _BOARD_PREFIX.get(code[:2], 'MAIN')
+
+def get_board_type_vec(codes):
+    """批量识别板块类型（codes 为 pandas Series，按前两位整列映射）"""
+    return codes.astype(str).str[:2].map(_BOARD_PREFIX).fillna('MAIN')
+
+# ST/*ST/SST/S*ST 及未股改的 "S " 前缀
+_ST_PREFIXES = ('ST', '*ST', 'SST', 'S*ST', 'S ')
 
 def is_st_stock(name: str) -> bool:
     """判断是否为ST股票"""
-    return 'ST' in name or '*ST' in name or 'S' in name[:2]
+    return name.startswith(_ST_PREFIXES)
+
+def is_st_stock_vec(names):
+    """批量判断是否为ST股票（names 为 pandas Series，空值视为非ST）"""
+    return names.str.startswith(_ST_PREFIXES).fillna(False).astype(bool)
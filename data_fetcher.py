@@ -2,33 +2,25 @@
 数据获取模块 - 基于AkShare
 """
 import akshare as ak
+import numpy as np
 import pandas as pd
 import time
 import sys
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 import config
-import json
+import functools
 import os
-from typing import Tuple
+import threading
+import hashlib
+import io
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # #region agent log
-_DEBUG_LOG_PATH = r"c:\Users\Larryppg\Desktop\stock.cursor\.cursor\debug.log"
-def _dbg_log(hypothesis_id: str, location: str, message: str, data: dict):
-    try:
-        payload = {
-            "sessionId": "debug-session",
-            "runId": "pre-fix",
-            "hypothesisId": hypothesis_id,
-            "location": location,
-            "message": message,
-            "data": data,
-            "timestamp": int(time.time() * 1000),
-        }
-        with open(_DEBUG_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
-    except Exception:
-        pass
+# 调试日志与 database 共用同一个后台写入队列（首次写日志时才启动线程）
+from database import _dbg_log
 # #endregion agent log
 
 # #region agent log
@@ -78,8 +70,126 @@ except Exception:
     pass
 
 
+# AkShare 可用接口在模块加载时探测一次（不同版本提供的接口不同），按优先级排列
+_STOCK_LIST_SOURCES = tuple(
+    (name, getattr(ak, attr)) for name, attr in [
+        ("spot_em", "stock_zh_a_spot_em"),
+        ("info_a", "stock_info_a_code_name"),
+        ("info_sh", "stock_info_sh_name_code"),
+        ("info_sz", "stock_info_sz_name_code"),
+    ] if hasattr(ak, attr)
+)
+_HIST_PROVIDERS = tuple(
+    (name, getattr(ak, attr)) for name, attr in [
+        ("em", "stock_zh_a_hist"),
+        ("tx", "stock_zh_a_hist_tx"),
+        ("163", "stock_zh_a_hist_163"),
+        ("sina", "stock_zh_a_hist_sina"),
+    ] if hasattr(ak, attr)
+)
+
+# AkShare 历史行情列名 -> 标准列名（按输出列顺序）
+_HIST_COLUMN_MAP = {
+    '日期': 'date',
+    '开盘': 'open',
+    '最高': 'high',
+    '最低': 'low',
+    '收盘': 'close',
+    '成交量': 'volume',
+    '成交额': 'amount',
+}
+
+# 股票板块类型固定为分类类型，多数据源合并时类别一致、不会退化为 object
+STOCK_BOARD_DTYPE = pd.CategoricalDtype(['MAIN', 'GEM', 'STAR', 'BJ'])
+
+# 股票列表每个交易日最多变化一次：进程内按日期缓存，并落盘到数据库目录供后续进程复用
+_STOCK_LIST_CACHE = {}
+_STOCK_LIST_CACHE_PATH = os.path.join(os.path.dirname(config.DB_PATH), 'stock_list.pkl')
+
+
+@functools.lru_cache(maxsize=4)
+def _tushare_client(token: str):
+    import tushare as ts
+    return ts.pro_api(token)
+
+
+def get_tushare_client(token: str = None):
+    """获取 Tushare pro 客户端（同一 token 进程内只创建一次）；未配置 token 时抛出 ValueError"""
+    token = token or getattr(config, "TUSHARE_TOKEN", None)
+    if not token:
+        raise ValueError("未设置 Tushare Token，请配置环境变量 TUSHARE_TOKEN")
+    return _tushare_client(token)
+
+
+@functools.lru_cache(maxsize=1)
+def _warn_tushare_token_missing():
+    """未配置 token 时提示一次（同一进程内不重复输出）"""
+    print("⚠️  未设置环境变量 TUSHARE_TOKEN，跳过 Tushare 数据源")
+
+
 def get_stock_list() -> pd.DataFrame:
-    """获取A股股票列表"""
+    """获取A股股票列表（当日已获取过则直接复用）"""
+    if not getattr(config, "STOCK_LIST_CACHE_ENABLE", True):
+        return _fetch_stock_list()
+
+    today = datetime.now().strftime('%Y%m%d')
+    stocks = _STOCK_LIST_CACHE.get(today)
+    if stocks is None:
+        try:
+            mtime = os.path.getmtime(_STOCK_LIST_CACHE_PATH)
+            if datetime.fromtimestamp(mtime).strftime('%Y%m%d') == today:
+                stocks = pd.read_pickle(_STOCK_LIST_CACHE_PATH)
+                print(f"✓ 使用当日缓存的股票列表，共 {len(stocks)} 只")
+        except Exception:
+            stocks = None
+    if stocks is None:
+        stocks = _fetch_stock_list()
+        if stocks.empty:
+            return stocks
+        try:
+            stocks.to_pickle(_STOCK_LIST_CACHE_PATH)
+        except Exception as e:
+            _dbg_log("H1", "data_fetcher.py:get_stock_list", "cache_write_exception", {"error": str(e)})
+    _STOCK_LIST_CACHE.clear()
+    _STOCK_LIST_CACHE[today] = stocks
+    return stocks.copy()
+
+
+def _board_type_stats(stocks: pd.DataFrame) -> dict:
+    """股票列表的板块分布（调试日志用）"""
+    try:
+        is_bj = (stocks['board_type'] == 'BJ').to_numpy()
+        prefix_92 = stocks['code'].str.startswith('92').to_numpy(dtype=bool, na_value=False)
+        return {
+            "total": int(len(stocks)),
+            "bj_count": int(is_bj.sum()),
+            "prefix_92_count": int(prefix_92.sum()),
+            "prefix_92_bj_count": int((is_bj & prefix_92).sum()),
+            "board_type_counts": {str(k): int(v) for k, v in stocks['board_type'].value_counts().items()},
+        }
+    except Exception as e:
+        return {"total": int(len(stocks)), "error": str(e)}
+
+
+def _merge_latest_by_code(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    按 code 合并多个数据源，同一代码以靠后的来源为准
+
+    等价于 concat 后 drop_duplicates(subset=["code"], keep="last")，
+    但从后往前用已见代码集合过滤，每行只判断一次，不先拼出完整的中间表。
+    """
+    seen = set()
+    keepers = []
+    for f in reversed(frames):
+        mask = ~f['code'].isin(seen) & ~f['code'].duplicated(keep='last')
+        kept = f[mask]
+        keepers.append(kept)
+        seen.update(kept['code'])
+    return pd.concat(keepers[::-1], ignore_index=True)
+
+
+def _fetch_stock_list() -> pd.DataFrame:
+    """从数据源获取A股股票列表"""
     try:
         # #region agent log
         _dbg_log("H1", "data_fetcher.py:get_stock_list", "enter", {})
@@ -94,33 +204,25 @@ def get_stock_list() -> pd.DataFrame:
             stocks = df[[code_col, name_col]].copy()
             stocks.columns = ['code', 'name']
             if code_col == 'ts_code':
-                stocks['code'] = stocks['code'].astype(str).str.split('.').str[0]
+                stocks['code'] = stocks['code'].astype(str).str[:6]
 
             # 添加板块类型
-            stocks['board_type'] = stocks['code'].apply(config.get_board_type)
+            stocks['board_type'] = config.get_board_type_vec(stocks['code'])
             # 判断是否ST
-            stocks['is_st'] = stocks['name'].apply(config.is_st_stock).astype(int)
-            # 根据板块和ST设置涨跌幅限制
+            stocks['is_st'] = config.is_st_stock_vec(stocks['name']).astype(int)
+            # 根据板块和ST设置涨跌幅限制（整列计算，配置只读取一次）
             # 注意：只有主板ST股票是±5%，创业板/科创板/北交所ST股票跟普通股一样
-            def get_limit_ratio(row):
-                board = row['board_type']
-                if row['is_st'] and board == 'MAIN':
-                    # 只有主板ST股票是±5%
-                    return config.LIMIT_RATIO['ST']
-                # 创业板/科创板/北交所的ST股票与普通股涨跌幅限制相同
-                return config.LIMIT_RATIO.get(board, config.LIMIT_RATIO['MAIN'])
-            stocks['limit_ratio'] = stocks.apply(get_limit_ratio, axis=1)
+            limit_ratio = config.LIMIT_RATIO
+            stocks['limit_ratio'] = stocks['board_type'].map(limit_ratio).fillna(limit_ratio['MAIN'])
+            stocks.loc[(stocks['is_st'] == 1) & (stocks['board_type'] == 'MAIN'), 'limit_ratio'] = limit_ratio['ST']
             stocks['market'] = 'A'
+            # 取值很少的列存为分类类型，比较/计数按整数编码进行
+            stocks['board_type'] = stocks['board_type'].astype(STOCK_BOARD_DTYPE)
+            stocks['market'] = stocks['market'].astype('category')
             return stocks
 
         # 多数据源尝试，避免单一接口偶发断连
-        sources = [("spot_em", ak.stock_zh_a_spot_em)]
-        if hasattr(ak, "stock_info_a_code_name"):
-            sources.append(("info_a", ak.stock_info_a_code_name))
-        if hasattr(ak, "stock_info_sh_name_code"):
-            sources.append(("info_sh", ak.stock_info_sh_name_code))
-        if hasattr(ak, "stock_info_sz_name_code"):
-            sources.append(("info_sz", ak.stock_info_sz_name_code))
+        sources = list(_STOCK_LIST_SOURCES)
         # Tushare 兜底（避免 AkShare 网络异常导致列表不全）
         token = getattr(config, "TUSHARE_TOKEN", None)
         # #region agent log
@@ -130,8 +232,7 @@ def get_stock_list() -> pd.DataFrame:
         # #endregion agent log
         if token:
             def _tushare_stock_basic():
-                import tushare as ts
-                pro = ts.pro_api(token)
+                pro = get_tushare_client(token)
                 df = pro.stock_basic(exchange='', list_status='L', fields='ts_code,name')
                 return df
             sources.append(("tushare_basic", _tushare_stock_basic))
@@ -144,6 +245,8 @@ def get_stock_list() -> pd.DataFrame:
         last_error = None
         collected = []
         success_sources = []
+        # 板块统计仅用于调试日志，关闭日志时整段跳过
+        debug_log = getattr(config, "DEBUG_LOG_ENABLE", False)
         for source_name, func in sources:
             try:
                 # #region agent log
@@ -154,21 +257,8 @@ def get_stock_list() -> pd.DataFrame:
                     raise ValueError("返回结果为空")
                 stocks = _normalize_stock_list(raw_df)
                 # #region agent log
-                try:
-                    prefix_92 = stocks['code'].astype(str).str.startswith('92')
-                    bj_count = int((stocks['board_type'] == 'BJ').sum())
-                    prefix_92_count = int(prefix_92.sum())
-                    prefix_92_bj_count = int(((stocks['board_type'] == 'BJ') & prefix_92).sum())
-                    board_type_counts = stocks['board_type'].value_counts().to_dict()
-                    _dbg_log("H17", "data_fetcher.py:get_stock_list", "board_type_stats", {
-                        "total": int(len(stocks)),
-                        "bj_count": bj_count,
-                        "prefix_92_count": prefix_92_count,
-                        "prefix_92_bj_count": prefix_92_bj_count,
-                        "board_type_counts": board_type_counts
-                    })
-                except Exception:
-                    pass
+                if debug_log:
+                    _dbg_log("H17", "data_fetcher.py:get_stock_list", "board_type_stats", _board_type_stats(stocks))
                 # #endregion agent log
                 print(f"✓ 获取股票列表成功({source_name})，共 {len(stocks)} 只")
                 # #region agent log
@@ -194,8 +284,7 @@ def get_stock_list() -> pd.DataFrame:
                 continue
 
         if collected:
-            merged = pd.concat(collected, ignore_index=True)
-            merged = merged.drop_duplicates(subset=["code"], keep="last")
+            merged = _merge_latest_by_code(collected)
             # 若数量仍偏少，尝试 Tushare 兜底补全
             if len(merged) < 4000 and token:
                 # #region agent log
@@ -206,8 +295,7 @@ def get_stock_list() -> pd.DataFrame:
                 try:
                     ts_df = _tushare_stock_basic()
                     ts_stocks = _normalize_stock_list(ts_df)
-                    merged = pd.concat([merged, ts_stocks], ignore_index=True)
-                    merged = merged.drop_duplicates(subset=["code"], keep="last")
+                    merged = _merge_latest_by_code([merged, ts_stocks])
                     # #region agent log
                     _dbg_log("H34", "data_fetcher.py:get_stock_list", "tushare_fallback_success", {
                         "tushare_count": int(len(ts_stocks)),
@@ -222,22 +310,9 @@ def get_stock_list() -> pd.DataFrame:
                     })
                     # #endregion agent log
             # #region agent log
-            try:
-                prefix_92 = merged['code'].astype(str).str.startswith('92')
-                bj_count = int((merged['board_type'] == 'BJ').sum())
-                prefix_92_count = int(prefix_92.sum())
-                prefix_92_bj_count = int(((merged['board_type'] == 'BJ') & prefix_92).sum())
-                board_type_counts = merged['board_type'].value_counts().to_dict()
-                _dbg_log("H33", "data_fetcher.py:get_stock_list", "combined_success", {
-                    "total": int(len(merged)),
-                    "sources": success_sources,
-                    "bj_count": bj_count,
-                    "prefix_92_count": prefix_92_count,
-                    "prefix_92_bj_count": prefix_92_bj_count,
-                    "board_type_counts": board_type_counts
-                })
-            except Exception:
-                pass
+            if debug_log:
+                _dbg_log("H33", "data_fetcher.py:get_stock_list", "combined_success",
+                         dict(_board_type_stats(merged), sources=success_sources))
             _dbg_log("H1", "data_fetcher.py:get_stock_list", "success", {"count": int(len(merged))})
             # #endregion agent log
             return merged
@@ -252,7 +327,48 @@ def get_stock_list() -> pd.DataFrame:
         return pd.DataFrame()
 
 
-def get_stock_history(code: str, start_date: str, end_date: str, adjust: str = '') -> pd.DataFrame:
+def _to_yyyymmdd(dates: pd.Series) -> pd.Series:
+    """日期列统一为 YYYYMMDD 字符串；已是该格式时原样返回，否则整列转换一次"""
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        first = dates.iloc[0] if len(dates) else None
+        if isinstance(first, str) and len(first) == 8 and first.isdigit():
+            return dates
+        dates = pd.to_datetime(dates)
+    days = np.datetime_as_string(dates.to_numpy().astype('datetime64[D]'), unit='D')
+    return pd.Series(np.char.replace(days, '-', ''), index=dates.index)
+
+
+def _history_cacheable(end_date: str) -> bool:
+    """区间已收盘才可缓存：结束日早于今天，或今天为周末/已过 15:30"""
+    now = datetime.now()
+    if str(end_date) < now.strftime('%Y%m%d'):
+        return True
+    return now.weekday() >= 5 or now.strftime('%H:%M') >= '15:30'
+
+
+# 代码前缀 -> 交易所前缀（先查前两位，再查首位）
+_EXCHANGE_PREFIX_2 = {"00": "sz", "30": "sz", "60": "sh", "68": "sh"}
+_EXCHANGE_PREFIX_1 = {"8": "bj", "4": "bj"}
+
+
+def _exchange_prefix(code: str) -> str:
+    """交易所前缀（部分接口要求 sz/sh/bj 前缀），未知前缀返回空串"""
+    return _EXCHANGE_PREFIX_2.get(code[:2]) or _EXCHANGE_PREFIX_1.get(code[:1], "")
+
+
+def _resolve_exchange_prefixes(codes: List[str]) -> Dict[str, str]:
+    """批量解析交易所前缀（整列判断，结果与 _exchange_prefix 一致）"""
+    codes_s = pd.Series(codes, dtype=object).astype(str)
+    prefixes = (
+        codes_s.str[:2].map(_EXCHANGE_PREFIX_2)
+        .fillna(codes_s.str[:1].map(_EXCHANGE_PREFIX_1))
+        .fillna("")
+    )
+    return dict(zip(codes, prefixes.tolist()))
+
+
+def get_stock_history(code: str, start_date: str, end_date: str, adjust: str = '',
+                      exchange_prefix: Optional[str] = None) -> pd.DataFrame:
     """
     获取单只股票历史行情
     
@@ -261,19 +377,48 @@ def get_stock_history(code: str, start_date: str, end_date: str, adjust: str = '
         start_date: 开始日期 YYYYMMDD
         end_date: 结束日期 YYYYMMDD
         adjust: 复权类型 ''不复权 'qfq'前复权 'hfq'后复权
+        exchange_prefix: 预先解析的交易所前缀（批量调用时传入，省去逐只判断）
+
+    已收盘区间的结果缓存在数据库中，重复运行不再请求网络。
     """
+    cached = _load_cached_history(code, start_date, end_date, adjust)
+    if cached is not None:
+        return cached
+    return _fetch_and_cache_history(code, start_date, end_date, adjust, exchange_prefix)
+
+
+def _history_cache_key(code: str, start_date: str, end_date: str, adjust: str = '') -> Optional[str]:
+    """历史行情缓存键；缓存关闭或区间未收盘时返回 None"""
+    if not getattr(config, "FETCH_CACHE_ENABLE", True) or not _history_cacheable(end_date):
+        return None
+    raw = f"{code}|{start_date}|{end_date}|{adjust}"
+    return "history_" + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _load_cached_history(code: str, start_date: str, end_date: str, adjust: str = '') -> Optional[pd.DataFrame]:
+    cache_key = _history_cache_key(code, start_date, end_date, adjust)
+    return _load_cached_market_data(cache_key) if cache_key is not None else None
+
+
+def _fetch_and_cache_history(code: str, start_date: str, end_date: str, adjust: str = '',
+                             exchange_prefix: Optional[str] = None) -> pd.DataFrame:
+    """请求网络拉取历史行情，非空结果写入缓存"""
+    df = _fetch_stock_history(code, start_date, end_date, adjust, exchange_prefix)
+    cache_key = _history_cache_key(code, start_date, end_date, adjust)
+    if cache_key is not None and not df.empty:
+        _store_cached_market_data(cache_key, df)
+    return df
+
+
+def _fetch_stock_history(code: str, start_date: str, end_date: str, adjust: str = '',
+                         exchange_prefix: Optional[str] = None) -> pd.DataFrame:
+    """从 AkShare 各数据源（失败时 Tushare 兜底）拉取单只股票历史行情"""
     try:
         # #region agent log
         # 符号变体（部分接口可能要求带交易所前缀）
-        symbol_variants = [code]
-        if code.startswith(("00", "30")):
-            symbol_variants.append(f"sz{code}")
-        elif code.startswith("60"):
-            symbol_variants.append(f"sh{code}")
-        elif code.startswith(("68",)):
-            symbol_variants.append(f"sh{code}")
-        elif code.startswith(("8", "4")):
-            symbol_variants.append(f"bj{code}")
+        if exchange_prefix is None:
+            exchange_prefix = _exchange_prefix(code)
+        symbol_variants = (code, f"{exchange_prefix}{code}") if exchange_prefix else (code,)
 
         _dbg_log("H2", "data_fetcher.py:get_stock_history", "enter", {
             "code": code,
@@ -296,13 +441,7 @@ def get_stock_history(code: str, start_date: str, end_date: str, adjust: str = '
             _dbg_log("H6", "data_fetcher.py:get_stock_history", "attempt", {"code": code, "attempt": attempt})
             # #endregion agent log
             try:
-                providers = [("em", ak.stock_zh_a_hist)]
-                if hasattr(ak, "stock_zh_a_hist_tx"):
-                    providers.append(("tx", ak.stock_zh_a_hist_tx))
-                if hasattr(ak, "stock_zh_a_hist_163"):
-                    providers.append(("163", ak.stock_zh_a_hist_163))
-                if hasattr(ak, "stock_zh_a_hist_sina"):
-                    providers.append(("sina", ak.stock_zh_a_hist_sina))
+                providers = _HIST_PROVIDERS
                 # #region agent log
                 _dbg_log("H11", "data_fetcher.py:get_stock_history", "providers_available", {
                     "code": code,
@@ -397,32 +536,28 @@ def get_stock_history(code: str, start_date: str, end_date: str, adjust: str = '
                     last_error = ValueError("empty_df")
                     continue
 
-                # 标准化列名
-                df = df.rename(columns={
-                    '日期': 'date',
-                    '开盘': 'open',
-                    '最高': 'high',
-                    '最低': 'low',
-                    '收盘': 'close',
-                    '成交量': 'volume',
-                    '成交额': 'amount'
-                })
-
-                # 选择需要的列
-                columns = ['date', 'open', 'high', 'low', 'close', 'volume', 'amount']
-                df = df[[col for col in columns if col in df.columns]]
+                # 先只选出需要的列再标准化列名（部分数据源已是英文列名）
+                keep = {}
+                for raw_col, col in _HIST_COLUMN_MAP.items():
+                    if raw_col in df.columns:
+                        keep[raw_col] = col
+                    elif col in df.columns:
+                        keep[col] = col
+                df = df.loc[:, list(keep)].rename(columns=keep)
 
                 # 添加股票代码
                 df['code'] = code
 
-                # 计算前收盘价
-                df['pre_close'] = df['close'].shift(1)
-
-                # 去除第一行（没有前收盘价）
-                df = df.dropna(subset=['pre_close'])
+                # 计算前收盘价并去除第一行（没有前收盘价）：直接切片错位赋值
+                close_arr = df['close'].to_numpy(dtype=float)
+                df = df.iloc[1:].copy()
+                df['pre_close'] = close_arr[:-1]
+                # 前一日收盘价缺失的行同样无法计算涨跌幅
+                if np.isnan(close_arr[:-1]).any():
+                    df = df[~np.isnan(close_arr[:-1])]
 
                 # 转换日期格式为YYYYMMDD
-                df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y%m%d')
+                df['date'] = _to_yyyymmdd(df['date'])
 
                 # #region agent log
                 _dbg_log("H2", "data_fetcher.py:get_stock_history", "success", {"code": code, "rows": int(len(df)), "attempt": attempt})
@@ -448,16 +583,8 @@ def get_stock_history(code: str, start_date: str, end_date: str, adjust: str = '
         # 尝试 Tushare 兜底（可选）
         if getattr(config, "TUSHARE_TOKEN", None):
             try:
-                import tushare as ts
-                pro = ts.pro_api(config.TUSHARE_TOKEN)
-                if code.startswith("6"):
-                    ts_code = f"{code}.SH"
-                elif code.startswith(("0", "3")):
-                    ts_code = f"{code}.SZ"
-                elif code.startswith(("8", "4")):
-                    ts_code = f"{code}.BJ"
-                else:
-                    ts_code = f"{code}.SZ"
+                pro = get_tushare_client()
+                ts_code = _to_ts_code(code)
                 df = pro.daily(ts_code=ts_code, start_date=start, end_date=end)
                 if df is None or df.empty:
                     # #region agent log
@@ -465,18 +592,7 @@ def get_stock_history(code: str, start_date: str, end_date: str, adjust: str = '
                     # #endregion agent log
                     return pd.DataFrame()
                 # 标准化列名
-                df = df.rename(columns={
-                    'trade_date': 'date',
-                    'open': 'open',
-                    'high': 'high',
-                    'low': 'low',
-                    'close': 'close',
-                    'vol': 'volume',
-                    'amount': 'amount',
-                    'pre_close': 'pre_close',
-                })
-                df['code'] = code
-                df = df[['date', 'open', 'high', 'low', 'close', 'volume', 'amount', 'pre_close', 'code']]
+                df = _normalize_tushare_daily(df, code)
                 # #region agent log
                 _dbg_log("H13", "data_fetcher.py:get_stock_history", "tushare_success", {"code": code, "rows": int(len(df))})
                 # #endregion agent log
@@ -500,6 +616,24 @@ def get_stock_history(code: str, start_date: str, end_date: str, adjust: str = '
         return pd.DataFrame()
 
 
+def concat_market_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    拼接同结构的行情块（逐股或按交易日拉取）
+
+    每列只做一次 np.concatenate 后一次性构造 DataFrame，
+    避免 pd.concat 对数千个小块逐块合并；列不一致时退回 pd.concat。
+    code 列存为分类类型：每行只占一个整数编码，按代码分组也更快。
+    """
+    columns = list(frames[0].columns)
+    if any(list(f.columns) != columns for f in frames):
+        result = pd.concat(frames, ignore_index=True)
+    else:
+        result = pd.DataFrame({col: np.concatenate([f[col].to_numpy() for f in frames]) for col in columns})
+    if 'code' in result.columns:
+        result['code'] = result['code'].astype('category')
+    return result
+
+
 def fetch_market_data(stock_codes: List[str], start_date: str, end_date: str) -> pd.DataFrame:
     """
     批量获取市场数据
@@ -526,25 +660,40 @@ def fetch_market_data(stock_codes: List[str], start_date: str, end_date: str) ->
     _dbg_log("H3", "data_fetcher.py:fetch_market_data", "enter", {"total": total, "start_date": start_date, "end_date": end_date})
     # #endregion agent log
     
+    # 先读缓存，只有未命中的股票才请求网络并占用限速额度
+    cached = {}
+    for code in stock_codes:
+        df = _load_cached_history(code, start_date, end_date)
+        if df is not None:
+            cached[code] = df
+    misses = [code for code in stock_codes if code not in cached]
+
+    # 线程池并发请求（I/O 密集），按每秒额度限速代替逐只 sleep；交易所前缀整批解析一次
+    prefixes = _resolve_exchange_prefixes(misses)
+    fetched = throttled_map(
+        lambda code: _fetch_and_cache_history(code, start_date, end_date, exchange_prefix=prefixes[code]),
+        misses,
+        max_workers=getattr(config, "FETCH_CONCURRENCY", 8),
+        rate_per_sec=getattr(config, "FETCH_RATE_PER_SEC", 4),
+    )
+    verbose = getattr(config, "VERBOSE_OUTPUT", True)
+    progress_every = int(getattr(config, "PROGRESS_EVERY", 5))
+    print_each = getattr(config, "PRINT_EACH_STOCK", True)
     for idx, code in enumerate(stock_codes, 1):
-        if getattr(config, "PRINT_EACH_STOCK", True):
-            print(f"获取中: {idx}/{total} {code}")
-        df = get_stock_history(code, start_date, end_date)
+        # 按输入顺序合并缓存结果与网络结果
+        df = cached[code] if code in cached else next(fetched)
+        if print_each:
+            print(f"获取完成: {idx}/{total} {code}")
         
         if not df.empty:
             all_data.append(df)
         
         # 显示进度
-        verbose = getattr(config, "VERBOSE_OUTPUT", True)
-        progress_every = int(getattr(config, "PROGRESS_EVERY", 5))
         if verbose and (idx % progress_every == 0 or idx == total):
             print(f"进度: {idx}/{total} ({idx/total*100:.1f}%)")
-        
-        # 避免请求过快
-        time.sleep(config.FETCH_SLEEP_INTERVAL)
     
     if all_data:
-        result = pd.concat(all_data, ignore_index=True)
+        result = concat_market_frames(all_data)
         print(f"✓ 数据获取完成，共 {len(result)} 条记录")
         # #region agent log
         _dbg_log("H3", "data_fetcher.py:fetch_market_data", "success", {"rows": int(len(result))})
@@ -558,6 +707,112 @@ def fetch_market_data(stock_codes: List[str], start_date: str, end_date: str) ->
         return pd.DataFrame()
 
 
+class RateLimiter:
+    """滑动窗口限速：任意 window 秒内最多 max_calls 次调用（线程安全）"""
+
+    def __init__(self, max_calls: int, window: float = 60.0):
+        self.max_calls = max(1, int(max_calls))
+        self.window = window
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def wait_if_throttled(self):
+        """在发起请求前调用：窗口内额度用尽时等待最早一次调用滑出窗口"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.window:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                wait = self.window - (now - self._calls[0])
+            time.sleep(max(wait, 0.01))
+
+    def penalize(self, retry_after: float):
+        """服务端返回限流时，占满窗口使后续调用至少等待 retry_after 秒"""
+        with self._lock:
+            until = time.monotonic() + retry_after - self.window
+            self._calls = deque([until] * self.max_calls)
+
+
+def throttled_map(fn, items, max_workers: int = 8, rate_per_sec: float = 4) -> Iterator:
+    """
+    线程池并发执行 fn(item)，按输入顺序产出结果
+
+    每次调用前经滑动窗口限速（每秒最多 rate_per_sec 次），并发数不超过 max_workers。
+    """
+    limiter = RateLimiter(max(1, int(rate_per_sec)), window=1.0)
+
+    def _call(item):
+        limiter.wait_if_throttled()
+        return fn(item)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)))
+    try:
+        yield from executor.map(_call, items)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def _get_rate_limiter(max_calls: int) -> RateLimiter:
+    """按额度获取进程内共享的限速器（并发批次共用同一分钟额度）"""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(max_calls)
+        if limiter is None:
+            limiter = RateLimiter(max_calls)
+            _rate_limiters[max_calls] = limiter
+        return limiter
+
+
+def _is_quota_error(e: Exception) -> bool:
+    """判断是否为 Tushare 访问频率超限的报错"""
+    text = str(e)
+    return "最多访问" in text or "429" in text or "rate limit" in text.lower()
+
+
+class AimdConcurrency:
+    """AIMD 并发控制：未限流时加性增加，触发限流时乘性减半"""
+
+    def __init__(self, max_limit: int, initial: float = 1.0,
+                 increase: float = 0.5, decrease: float = 0.5):
+        self.max_limit = max(1, int(max_limit))
+        self.increase = increase
+        self.decrease = decrease
+        self._limit = min(float(initial), float(self.max_limit))
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        """当前允许的并发数（至少为 1）"""
+        return max(1, int(self._limit))
+
+    def on_success(self):
+        with self._lock:
+            self._limit = min(float(self.max_limit), self._limit + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self._limit = max(1.0, self._limit * self.decrease)
+
+
+# Tushare 日线所需列（只有 trade_date/vol 需要改名，其余已是标准列名）
+_TUSHARE_DAILY_COLUMNS = ['trade_date', 'open', 'high', 'low', 'close', 'vol', 'amount', 'pre_close']
+
+
+def _normalize_tushare_daily(df: pd.DataFrame, code: Optional[str] = None) -> pd.DataFrame:
+    """Tushare 日线转为标准列；未指定 code 时（按日期拉取）从 ts_code 解析"""
+    # ts_code 固定为 6 位代码 + 交易所后缀（如 000001.SZ），直接切片取代码
+    codes = df['ts_code'].str[:6] if code is None else code
+    df = df[_TUSHARE_DAILY_COLUMNS].rename(columns={'trade_date': 'date', 'vol': 'volume'})
+    df['code'] = codes
+    return df
+
+
 def _to_ts_code(code: str) -> str:
     if code.startswith("6"):
         return f"{code}.SH"
@@ -568,6 +823,95 @@ def _to_ts_code(code: str) -> str:
     return f"{code}.SZ"
 
 
+def _fetch_cache_key(stock_codes: List[str], start_date: str, end_date: str) -> str:
+    raw = ",".join(sorted(stock_codes)) + "|" + str(start_date) + "|" + str(end_date)
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def _load_cached_market_data(key: str) -> Optional[pd.DataFrame]:
+    """
+    读取批次拉取缓存（缓存失败不影响正常拉取）
+
+    缓存为 zlib 压缩的 JSON（orient="table"，带列类型），读取时只解析数据、不执行反序列化代码；
+    旧版本写入的 pickle 缓存解析失败后按未命中处理，重新拉取后覆盖
+    """
+    try:
+        import database
+        payload = database.get_fetch_cache(key)
+        if not payload:
+            return None
+        return pd.read_json(io.BytesIO(zlib.decompress(payload)), orient="table")
+    except Exception as e:
+        _dbg_log("H14", "data_fetcher.py:_load_cached_market_data", "cache_read_exception", {"error": str(e)})
+        return None
+
+
+def _store_cached_market_data(key: str, df: pd.DataFrame):
+    try:
+        import database
+        payload = df.to_json(orient="table", index=False, double_precision=15).encode()
+        database.put_fetch_cache(key, zlib.compress(payload, 1))
+    except Exception as e:
+        _dbg_log("H14", "data_fetcher.py:_store_cached_market_data", "cache_write_exception", {"error": str(e)})
+
+
+def _fetch_tushare_daily(pro, code: str, start_date: str, end_date: str,
+                         limiter: Optional[RateLimiter], controller: Optional[AimdConcurrency],
+                         max_calls: int, run_label: str, idx: int) -> Tuple[Optional[pd.DataFrame], int, str]:
+    """
+    拉取单只股票的 Tushare 日线
+
+    返回 (df, 调用次数, 状态)，状态为 ok / empty / error / rate_limited。
+    """
+    ts_code = _to_ts_code(code)
+    call_count = 0
+    try:
+        for attempt in (1, 2):
+            # --- RATE LIMIT BEGIN (EASY REMOVE) ---
+            if limiter is not None:
+                limiter.wait_if_throttled()
+            # --- RATE LIMIT END ---
+            try:
+                df = pro.daily(ts_code=ts_code, start_date=start_date, end_date=end_date)
+                call_count += 1
+                break
+            except Exception as e:
+                call_count += 1
+                if not _is_quota_error(e):
+                    raise
+                # #region agent log
+                _dbg_log("H15", "data_fetcher.py:fetch_market_data_tushare", "rate_limit_hit", {
+                    "call_count": call_count,
+                    "max_calls": max_calls,
+                    "run_label": run_label,
+                    "idx": int(idx),
+                    "code": code,
+                    "attempt": attempt
+                })
+                # #endregion agent log
+                if controller is not None:
+                    controller.on_throttle()
+                if attempt == 2:
+                    return None, call_count, "rate_limited"
+                if limiter is not None:
+                    limiter.penalize(limiter.window)
+                else:
+                    time.sleep(60)
+        if df is None or df.empty:
+            _dbg_log("H14", "data_fetcher.py:fetch_market_data_tushare", "empty_df", {"code": code, "ts_code": ts_code})
+            return None, call_count, "empty"
+        df = _normalize_tushare_daily(df, code)
+        return df, call_count, "ok"
+    except Exception as e:
+        _dbg_log("H14", "data_fetcher.py:fetch_market_data_tushare", "fetch_exception", {
+            "code": code,
+            "ts_code": ts_code,
+            "error": str(e),
+            "error_type": type(e).__name__
+        })
+        return None, call_count, "error"
+
+
 def fetch_market_data_tushare(
     stock_codes: List[str],
     start_date: str,
@@ -575,8 +919,22 @@ def fetch_market_data_tushare(
     max_calls: int | None = None,
     rate_limit_enable: bool = True,
     run_label: str = "mvp",
+    controller: AimdConcurrency | None = None,
+    concurrency: int | None = None,
+    allow_by_date: bool = True,
 ) -> Tuple[pd.DataFrame, bool, int]:
-    """使用 Tushare 拉取历史行情（MVP/回填）"""
+    """
+    使用 Tushare 拉取历史行情（MVP/回填）
+
+    配置允许按日期拉取（TUSHARE_USE_BY_DATE_MODE，需要较高积分）且 allow_by_date 为 True 时，
+    按 config.use_tushare_by_date 的判断转为按交易日拉取；分批调用时应传 allow_by_date=False，
+    否则每一批都会重复下载全市场数据。
+    否则逐股请求，批次内按 concurrency 个线程并发（默认 TUSHARE_FETCH_CONCURRENCY）。
+    启用限速时按每分钟 max_calls 次的滑动窗口主动限速；服务端仍返回频率超限时
+    暂停一个窗口后重试，并通知 controller 降低并发。重试仍超限、或按日期拉取有交易日失败时
+    返回 rate_limited=True，调用方可重新运行补齐。
+    结束日期早于今天的完整结果会缓存到数据库，断点续传时同一批次不再重复拉取。
+    """
     # #region agent log
     _dbg_log("H14", "data_fetcher.py:fetch_market_data_tushare", "enter", {
         "total": len(stock_codes),
@@ -587,74 +945,101 @@ def fetch_market_data_tushare(
     })
     # #endregion agent log
 
+    # 当日数据可能仍在更新，只缓存历史区间
+    cache_key = None
+    if getattr(config, "FETCH_CACHE_ENABLE", True) and str(end_date) < datetime.now().strftime('%Y%m%d'):
+        cache_key = _fetch_cache_key(stock_codes, start_date, end_date)
+        cached = _load_cached_market_data(cache_key)
+        if cached is not None:
+            _dbg_log("H14", "data_fetcher.py:fetch_market_data_tushare", "cache_hit", {
+                "rows": int(len(cached)),
+                "run_label": run_label
+            })
+            return cached, False, 0
+
     token = getattr(config, "TUSHARE_TOKEN", None)
     if not token:
         _dbg_log("H14", "data_fetcher.py:fetch_market_data_tushare", "token_missing", {})
+        _warn_tushare_token_missing()
         return pd.DataFrame(), False, 0
 
     try:
-        import tushare as ts
-        pro = ts.pro_api(token)
+        pro = get_tushare_client(token)
     except Exception as e:
         _dbg_log("H14", "data_fetcher.py:fetch_market_data_tushare", "init_exception", {"error": str(e)})
         return pd.DataFrame(), False, 0
 
+    # 配置允许按日期拉取时（免费积分不支持），按调用次数决定是否每天一次调用返回全市场再按股票过滤
+    trade_dates = None
+    if allow_by_date and getattr(config, "TUSHARE_USE_BY_DATE_MODE", False):
+        try:
+            trade_dates = _tushare_trade_dates(token, str(start_date), str(end_date))
+        except Exception as e:
+            _dbg_log("H14", "data_fetcher.py:fetch_market_data_tushare", "trade_cal_exception", {"error": str(e)})
+    if trade_dates and config.use_tushare_by_date(len(stock_codes), len(trade_dates)):
+        _dbg_log("H14", "data_fetcher.py:fetch_market_data_tushare", "dispatch_by_date", {
+            "total": len(stock_codes),
+            "trade_dates": len(trade_dates),
+            "run_label": run_label
+        })
+        failures = []
+        chunks = list(fetch_market_data_tushare_by_date(
+            start_date, end_date, stock_codes=stock_codes, failures=failures
+        ))
+        result = concat_market_frames(chunks) if chunks else pd.DataFrame()
+        # 有交易日失败时不缓存，并以 rate_limited 通知调用方结果不完整
+        if cache_key is not None and chunks and not failures:
+            _store_cached_market_data(cache_key, result)
+        return result, bool(failures), len(trade_dates) + 1
+
     max_calls = int(max_calls or getattr(config, "TUSHARE_MAX_CALLS_PER_MIN", 50))
+    limiter = _get_rate_limiter(max_calls) if rate_limit_enable else None
+    concurrency = max(1, int(concurrency or getattr(config, "TUSHARE_FETCH_CONCURRENCY", 4)))
+    print_each = getattr(config, "PRINT_EACH_STOCK", True)
+    # 任一股票重试后仍超限即停止发起新请求
+    stop = threading.Event()
+
+    def _task(item):
+        idx, code = item
+        if stop.is_set():
+            return None
+        if print_each:
+            print(f"Tushare获取中: {idx}/{len(stock_codes)} {code}")
+        outcome = _fetch_tushare_daily(
+            pro, code, start_date, end_date, limiter, controller, max_calls, run_label, idx
+        )
+        if outcome[2] == "rate_limited":
+            stop.set()
+        return outcome
+
+    # 逐股请求为纯网络等待，多线程并发发起，总调用频率仍由共享限速器控制
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(_task, enumerate(stock_codes, 1)))
+    else:
+        outcomes = [_task(item) for item in enumerate(stock_codes, 1)]
+
     call_count = 0
     rate_limited = False
+    fetch_failed = False
     all_data = []
-
-    for idx, code in enumerate(stock_codes, 1):
-        # --- RATE LIMIT BEGIN (EASY REMOVE) ---
-        if rate_limit_enable and call_count >= max_calls:
-            # #region agent log
-            _dbg_log("H15", "data_fetcher.py:fetch_market_data_tushare", "rate_limit_hit", {
-                "call_count": call_count,
-                "max_calls": max_calls,
-                "run_label": run_label,
-                "idx": int(idx),
-                "next_code": code
-            })
-            # #endregion agent log
+    for outcome in outcomes:
+        if outcome is None:
+            continue
+        df, calls, status = outcome
+        call_count += calls
+        if status == "rate_limited":
             rate_limited = True
-            break
-        # --- RATE LIMIT END ---
-        if getattr(config, "PRINT_EACH_STOCK", True):
-            print(f"Tushare获取中: {idx}/{len(stock_codes)} {code}")
-        ts_code = _to_ts_code(code)
-        try:
-            df = pro.daily(ts_code=ts_code, start_date=start_date, end_date=end_date)
-            call_count += 1
-            if df is None or df.empty:
-                _dbg_log("H14", "data_fetcher.py:fetch_market_data_tushare", "empty_df", {"code": code, "ts_code": ts_code})
-                continue
-            df = df.rename(columns={
-                'trade_date': 'date',
-                'open': 'open',
-                'high': 'high',
-                'low': 'low',
-                'close': 'close',
-                'vol': 'volume',
-                'amount': 'amount',
-                'pre_close': 'pre_close',
-            })
-            df['code'] = code
-            df = df[['date', 'open', 'high', 'low', 'close', 'volume', 'amount', 'pre_close', 'code']]
+        elif status == "error":
+            fetch_failed = True
+        elif df is not None:
             all_data.append(df)
-        except Exception as e:
-            _dbg_log("H14", "data_fetcher.py:fetch_market_data_tushare", "fetch_exception", {
-                "code": code,
-                "ts_code": ts_code,
-                "error": str(e),
-                "error_type": type(e).__name__
-            })
-            continue
 
     if not all_data:
         _dbg_log("H14", "data_fetcher.py:fetch_market_data_tushare", "empty_all_data", {"call_count": call_count})
         return pd.DataFrame(), rate_limited, call_count
 
-    result = pd.concat(all_data, ignore_index=True)
+    result = concat_market_frames(all_data)
     # #region agent log
     try:
         if "date" in result.columns:
@@ -681,14 +1066,93 @@ def fetch_market_data_tushare(
         "rows_for_end_date": int(rows_for_end_date)
     })
     # #endregion agent log
+    if cache_key is not None and not rate_limited and not fetch_failed:
+        _store_cached_market_data(cache_key, result)
     return result, rate_limited, call_count
 
 
+def fetch_market_data_tushare_batches(
+    batches: List[List[str]],
+    start_date: str,
+    end_date: str,
+    max_calls: int | None = None,
+    rate_limit_enable: bool = True,
+    run_label: str = "backfill",
+    controller: AimdConcurrency | None = None,
+) -> Iterator[Tuple[int, List[str], pd.DataFrame, bool, int]]:
+    """
+    线程池预取多个批次的 Tushare 行情，按批次顺序产出
+
+    拉取在后台线程并发进行，调用方在当前线程消费结果（保证 SQLite 单写入者）。
+    在途批次数由 AIMD 控制器决定，上限为 FETCH_MAX_WORKERS。
+
+    产出:
+        (batch_idx, batch_codes, batch_data, rate_limited, call_count)
+    """
+    max_workers = max(1, int(getattr(config, "FETCH_MAX_WORKERS", 4)))
+    if controller is None:
+        calls_per_min = int(max_calls or getattr(config, "TUSHARE_MAX_CALLS_PER_MIN", 50))
+        controller = AimdConcurrency(min(max_workers, max(1, calls_per_min // 2)))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    next_idx = 0
+    try:
+        while pending or next_idx < len(batches):
+            while next_idx < len(batches) and len(pending) < controller.limit:
+                batch_codes = batches[next_idx]
+                future = executor.submit(
+                    fetch_market_data_tushare,
+                    batch_codes,
+                    start_date,
+                    end_date,
+                    max_calls=max_calls,
+                    rate_limit_enable=rate_limit_enable,
+                    run_label=run_label,
+                    controller=controller,
+                    # 并发已在批次层面控制，批次内顺序请求
+                    concurrency=1,
+                    allow_by_date=False,
+                )
+                pending.append((next_idx, batch_codes, future))
+                next_idx += 1
+
+            batch_idx, batch_codes, future = pending.popleft()
+            batch_data, rate_limited, call_count = future.result()
+            if rate_limited:
+                controller.on_throttle()
+            else:
+                controller.on_success()
+            yield batch_idx, batch_codes, batch_data, rate_limited, call_count
+    finally:
+        # 调用方提前退出（限流/中断）时丢弃尚未开始的批次
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@functools.lru_cache(maxsize=32)
+def _tushare_trade_dates(token: str, start_date: str, end_date: str) -> Tuple[str, ...]:
+    """区间内的开市日（交易日历按参数缓存，同一区间只请求一次）"""
+    cal = get_tushare_client(token).trade_cal(start_date=start_date, end_date=end_date)
+    if cal is None or cal.empty:
+        return ()
+    return tuple(sorted(cal[cal["is_open"] == 1]["cal_date"].astype(str)))
+
+
 def fetch_market_data_tushare_by_date(
     start_date: str,
     end_date: str,
-) -> pd.DataFrame:
-    """按交易日批量拉取日线数据（降低接口调用次数）"""
+    stock_codes: Optional[List[str]] = None,
+    failures: Optional[List[Tuple[str, str]]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    按交易日批量拉取日线数据（降低接口调用次数）
+
+    以生成器形式逐个交易日产出 DataFrame，调用方可边拉取边写库，
+    无需在内存中持有全部日期的数据。无数据的交易日不产出结果。
+    传入 stock_codes 时只保留这些股票。
+    拉取失败的交易日以 (交易日, 'error' / 'rate_limited') 追加到 failures（如传入）并打印提示；
+    频率超限重试后仍失败时停止请求后续交易日。
+    """
     # #region agent log
     _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "enter", {
         "start_date": start_date,
@@ -700,24 +1164,20 @@ def fetch_market_data_tushare_by_date(
     token = getattr(config, "TUSHARE_TOKEN", None)
     if not token:
         _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "token_missing", {})
-        return pd.DataFrame()
+        _warn_tushare_token_missing()
+        return
 
     try:
-        import tushare as ts
-        pro = ts.pro_api(token)
+        pro = get_tushare_client(token)
     except Exception as e:
         _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "init_exception", {"error": str(e)})
-        return pd.DataFrame()
+        return
 
     try:
-        cal = pro.trade_cal(start_date=start_date, end_date=end_date)
-        if cal is None or cal.empty:
-            _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "trade_cal_empty", {})
-            return pd.DataFrame()
-        trade_dates = cal[cal["is_open"] == 1]["cal_date"].astype(str).tolist()
+        trade_dates = _tushare_trade_dates(token, str(start_date), str(end_date))
         if not trade_dates:
             _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "no_trade_dates", {})
-            return pd.DataFrame()
+            return
         # #region agent log
         _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "trade_dates", {
             "count": int(len(trade_dates)),
@@ -730,57 +1190,84 @@ def fetch_market_data_tushare_by_date(
             "error": str(e),
             "error_type": type(e).__name__
         })
-        return pd.DataFrame()
+        return
 
-    all_data = []
-    for trade_date in trade_dates:
+    code_set = set(stock_codes) if stock_codes is not None else None
+    limiter = _get_rate_limiter(int(getattr(config, "TUSHARE_MAX_CALLS_PER_MIN", 50)))
+
+    # 任一交易日重试后仍超限即停止发起新请求
+    stop = threading.Event()
+
+    def _fetch_date(trade_date: str) -> Tuple[Optional[pd.DataFrame], str]:
+        """返回 (df, 状态)，状态为 ok / empty / error / rate_limited / skipped"""
+        if stop.is_set():
+            return None, "skipped"
         try:
-            df = pro.daily(trade_date=trade_date)
+            for attempt in (1, 2):
+                limiter.wait_if_throttled()
+                try:
+                    df = pro.daily(trade_date=trade_date)
+                    break
+                except Exception as e:
+                    if not _is_quota_error(e):
+                        raise
+                    _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "rate_limit_hit", {
+                        "trade_date": trade_date,
+                        "attempt": attempt
+                    })
+                    if attempt == 2:
+                        stop.set()
+                        return None, "rate_limited"
+                    limiter.penalize(limiter.window)
             if df is None or df.empty:
-                continue
-            df = df.rename(columns={
-                'trade_date': 'date',
-                'open': 'open',
-                'high': 'high',
-                'low': 'low',
-                'close': 'close',
-                'vol': 'volume',
-                'amount': 'amount',
-                'pre_close': 'pre_close',
-            })
-            df['code'] = df['ts_code'].astype(str).str.split('.').str[0]
-            df = df[['date', 'open', 'high', 'low', 'close', 'volume', 'amount', 'pre_close', 'code']]
-            all_data.append(df)
+                return None, "empty"
+            df = _normalize_tushare_daily(df)
+            if code_set is not None:
+                df = df[df['code'].isin(code_set)]
+            return (df, "ok") if not df.empty else (None, "empty")
         except Exception as e:
             _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "daily_exception", {
                 "trade_date": trade_date,
                 "error": str(e),
                 "error_type": type(e).__name__
             })
-            continue
+            return None, "error"
 
-    if not all_data:
-        _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "empty_all_data", {})
-        return pd.DataFrame()
+    # 多个交易日并发请求（共享每分钟额度限速），仍按交易日顺序产出
+    total_rows = 0
+    yielded_dates = 0
+    failed = []
+    workers = max(1, int(getattr(config, "TUSHARE_FETCH_CONCURRENCY", 4)))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for trade_date, (df, status) in zip(trade_dates, executor.map(_fetch_date, trade_dates)):
+            if status in ("error", "rate_limited", "skipped"):
+                failed.append((trade_date, "rate_limited" if status == "skipped" else status))
+                continue
+            if df is None:
+                continue
+            total_rows += len(df)
+            yielded_dates += 1
+            yield df
+    finally:
+        # 调用方提前退出时丢弃尚未开始的请求
+        executor.shutdown(wait=False, cancel_futures=True)
+        if failed:
+            if failures is not None:
+                failures.extend(failed)
+            limited = sum(status == "rate_limited" for _, status in failed)
+            print(f"⚠️  按日期拉取有 {len(failed)} 个交易日未获取（其中频率超限 {limited} 个），"
+                  f"首个: {failed[0][0]}，可重新运行补齐")
 
-    result = pd.concat(all_data, ignore_index=True)
     # #region agent log
-    try:
-        unique_codes = int(result["code"].nunique()) if "code" in result.columns else 0
-        date_min = result["date"].astype(str).min() if "date" in result.columns else None
-        date_max = result["date"].astype(str).max() if "date" in result.columns else None
-    except Exception:
-        unique_codes = 0
-        date_min = None
-        date_max = None
-    _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "success", {
-        "rows": int(len(result)),
-        "unique_codes": int(unique_codes),
-        "date_min": date_min,
-        "date_max": date_max
-    })
+    if not yielded_dates:
+        _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "empty_all_data", {})
+    else:
+        _dbg_log("H27", "data_fetcher.py:fetch_market_data_tushare_by_date", "success", {
+            "rows": int(total_rows),
+            "dates": int(yielded_dates)
+        })
     # #endregion agent log
-    return result
 
 
 def get_recent_trading_days(days: int = 90) -> tuple:
@@ -1,13 +1,17 @@
 """
 数据库初始化与操作模块
 """
+import atexit
 import sqlite3
 import os
+import queue
 import time
 import json
 import threading
+import weakref
 import config
 import argparse
+from functools import lru_cache
 from typing import List, Dict, Any
 import pandas as pd
 from config import DB_PATH
@@ -16,22 +20,104 @@ from config import DB_PATH
 DB_MODULE_VERSION = "2026-01-24-debug-1"
 
 # #region agent log
-_DEBUG_LOG_PATH = r"c:\Users\Larryppg\Desktop\stock.cursor\.cursor\debug.log"
-def _dbg_log(hypothesis_id: str, location: str, message: str, data: dict):
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+
+@lru_cache(maxsize=None)
+def _log_prefix(hypothesis_id: str, location: str, message: str) -> str:
+    """每个调用点的固定字段只序列化一次，之后只需拼接 data 和时间戳"""
+    head = json.dumps({
+        "sessionId": "debug-session",
+        "runId": "pre-fix",
+        "hypothesisId": hypothesis_id,
+        "location": location,
+        "message": message,
+    }, ensure_ascii=False)
+    return head[:-1] + ',"data":'
+
+
+def _dumps_log_data(data: dict) -> str:
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(data, option=_orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(data, ensure_ascii=False)
+
+
+# 调试日志入队后由后台线程批量格式化并写入，调用方不做文件 I/O；线程在首次写日志时才启动
+_LOG_Q = queue.Queue()
+_LOG_WRITE_LOCK = threading.Lock()
+_LOG_BATCH_SIZE = 100
+_LOG_FLUSH_INTERVAL = 0.5
+_log_thread = None
+_log_thread_lock = threading.Lock()
+
+
+def _write_log_batch(batch: list):
+    lines = []
+    for hypothesis_id, location, message, data, timestamp in batch:
+        try:
+            lines.append(
+                f"{_log_prefix(hypothesis_id, location, message)}{_dumps_log_data(data)}"
+                f',"timestamp":{timestamp}}}\n'
+            )
+        except Exception:
+            pass
     try:
-        payload = {
-            "sessionId": "debug-session",
-            "runId": "pre-fix",
-            "hypothesisId": hypothesis_id,
-            "location": location,
-            "message": message,
-            "data": data,
-            "timestamp": int(time.time() * 1000),
-        }
-        with open(_DEBUG_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        with _LOG_WRITE_LOCK, open(config.DEBUG_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
     except Exception:
         pass
+
+
+def _log_worker():
+    stopping = False
+    while not stopping:
+        batch = []
+        item = _LOG_Q.get()
+        deadline = time.monotonic() + _LOG_FLUSH_INTERVAL
+        while True:
+            # None 为退出标记：写完手上的批次后结束
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= _LOG_BATCH_SIZE or remaining <= 0:
+                break
+            try:
+                item = _LOG_Q.get(timeout=remaining)
+            except queue.Empty:
+                break
+        if batch:
+            _write_log_batch(batch)
+
+
+def _flush_dbg_log():
+    """退出时通知后台线程写完队列中剩余的日志"""
+    _LOG_Q.put(None)
+    _log_thread.join(timeout=5)
+
+
+def _start_log_worker():
+    global _log_thread
+    with _log_thread_lock:
+        if _log_thread is None:
+            _log_thread = threading.Thread(target=_log_worker, name="dbg-log", daemon=True)
+            _log_thread.start()
+            atexit.register(_flush_dbg_log)
+
+
+def _dbg_log(hypothesis_id: str, location: str, message: str, data: dict):
+    if not getattr(config, "DEBUG_LOG_ENABLE", False):
+        return
+    if _log_thread is None:
+        _start_log_worker()
+    _LOG_Q.put_nowait((hypothesis_id, location, message, data, int(time.time() * 1000)))
 # #endregion agent log
 
 # #region agent log
@@ -69,6 +155,94 @@ def _log_db_file_state(hypothesis_id: str, location: str):
 # #endregion agent log
 
 
+# 二级索引定义（唯一约束自带的索引不在此列，批量导入期间可安全删除后重建）
+SECONDARY_INDEXES = {
+    # (date, code) 查询由 UNIQUE(date, code) 自带的索引覆盖，不再单独建索引
+    "idx_daily_code_date": "daily_market_data(code, date)",
+    # 部分索引只收录缺失价格的行，空值检查只需读极少量索引项
+    "idx_daily_nulls": "daily_market_data(date) WHERE close IS NULL OR pre_close IS NULL",
+    "idx_limit_date_height": "limit_analysis_result(date, chain_height)",
+    "idx_limit_code_date": "limit_analysis_result(code, date)",
+    # 覆盖当日涨停/炸板统计与明细筛选：按 (date, limit_status) 定位，板型与炸板标记直接从索引读取
+    "idx_limit_date_status": "limit_analysis_result(date, limit_status, is_fried, board_type)",
+    # 覆盖连板高度分布/涨停计数/最高连板统计，可走仅索引扫描
+    "idx_limit_height_status": "limit_analysis_result(chain_height, limit_status)",
+}
+
+
+# 每日涨停统计汇总的聚合语句（回填与按日期刷新共用）
+_LIMIT_SUMMARY_SELECT = """
+    SELECT date, SUM(limit_status = 1), SUM(limit_status = 1 AND board_type = 'yizi'),
+           SUM(is_fried = 1), COALESCE(MAX(chain_height), 0)
+    FROM limit_analysis_result
+"""
+
+
+# 每日行情统计汇总的聚合语句（建表回填与按日期刷新共用）
+_DAILY_STATS_SELECT = """
+    SELECT date, COUNT(*), SUM(close IS NULL OR pre_close IS NULL)
+    FROM daily_market_data
+"""
+
+
+def _refresh_summary(conn, summary_table: str, select_sql: str, dates):
+    """按日期从明细重算汇总表（不提交，由调用方控制事务），整批写入后每个日期只聚合一次"""
+    dates = sorted({str(d) for d in dates})
+    try:
+        # 分批绑定参数，避免超过 SQLite 单条语句的参数上限
+        for i in range(0, len(dates), 500):
+            part = dates[i:i + 500]
+            conn.execute(
+                f"INSERT OR REPLACE INTO {summary_table} {select_sql} "
+                f"WHERE date IN ({','.join('?' * len(part))}) GROUP BY date",
+                part
+            )
+    except sqlite3.OperationalError:
+        # 旧库尚未执行 init_database 时没有汇总表：跳过，建表时会从明细整体回填
+        pass
+
+
+def _insert_daily_data(conn, data_df: pd.DataFrame):
+    """写入日线行情并按写入的日期重算每日行情统计汇总（不提交，由调用方控制事务）"""
+    _insert_dataframe(conn, 'daily_market_data', data_df)
+    if not data_df.empty:
+        _refresh_summary(conn, 'daily_stats_summary', _DAILY_STATS_SELECT, data_df['date'].unique())
+
+
+def _insert_limit_results(conn, results_df: pd.DataFrame):
+    """写入涨停分析结果并按写入的日期重算每日涨停统计汇总（不提交，由调用方控制事务）"""
+    _insert_dataframe(conn, 'limit_analysis_result', results_df)
+    if not results_df.empty:
+        _refresh_summary(conn, 'daily_limit_summary', _LIMIT_SUMMARY_SELECT, results_df['date'].unique())
+
+
+def _create_indexes(cursor, names):
+    for name in names:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {SECONDARY_INDEXES[name]}")
+
+
+def drop_secondary_indexes():
+    """批量回填前删除二级索引，避免逐行维护 B 树"""
+    conn = get_connection()
+    try:
+        for name in SECONDARY_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def rebuild_secondary_indexes():
+    """批量回填结束后一次性重建二级索引，并刷新查询规划统计"""
+    conn = get_connection()
+    try:
+        _create_indexes(conn.cursor(), SECONDARY_INDEXES)
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+
 def init_database():
     """初始化数据库表结构"""
     # 确保数据目录存在
@@ -113,15 +287,27 @@ def init_database():
     """)
     
     # 创建索引
-    cursor.execute("""
-    CREATE INDEX IF NOT EXISTS idx_daily_date_code 
-    ON daily_market_data(date, code)
-    """)
+    _create_indexes(cursor, ("idx_daily_code_date", "idx_daily_nulls"))
+    # 旧库中与 UNIQUE 索引重复的 (date, code) 索引，每次写入都要多维护一棵 B 树
+    cursor.execute("DROP INDEX IF EXISTS idx_daily_date_code")
     
+    # 每日行情统计汇总表（每次写入行情后按写入的日期整批重算，统计报表无需扫描明细）
     cursor.execute("""
-    CREATE INDEX IF NOT EXISTS idx_daily_code_date 
-    ON daily_market_data(code, date)
+    CREATE TABLE IF NOT EXISTS daily_stats_summary (
+        date TEXT PRIMARY KEY,
+        row_count INTEGER NOT NULL DEFAULT 0,
+        null_count INTEGER NOT NULL DEFAULT 0
+    )
     """)
+    cursor.execute("SELECT 1 FROM daily_stats_summary LIMIT 1")
+    if cursor.fetchone() is None:
+        # 首次创建时从已有明细回填
+        cursor.execute(
+            f"INSERT INTO daily_stats_summary (date, row_count, null_count) {_DAILY_STATS_SELECT} GROUP BY date"
+        )
+    # 旧库中逐行维护汇总的触发器会让批量写入的工作量翻倍，改为写入后按日期刷新
+    for trigger in ("trg_daily_stats_insert", "trg_daily_stats_delete", "trg_daily_stats_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
     
     # 涨停分析结果表
     cursor.execute("""
@@ -138,15 +324,24 @@ def init_database():
     """)
     
     # 创建索引
-    cursor.execute("""
-    CREATE INDEX IF NOT EXISTS idx_limit_date_height 
-    ON limit_analysis_result(date, chain_height)
-    """)
+    _create_indexes(cursor, (
+        "idx_limit_date_height", "idx_limit_code_date", "idx_limit_date_status", "idx_limit_height_status"
+    ))
     
+    # 每日涨停统计汇总表：每次写入结果后按写入的日期重算（整批一次聚合，不逐行触发），趋势图无需扫描明细
     cursor.execute("""
-    CREATE INDEX IF NOT EXISTS idx_limit_code_date 
-    ON limit_analysis_result(code, date)
+    CREATE TABLE IF NOT EXISTS daily_limit_summary (
+        date TEXT PRIMARY KEY,
+        limit_count INTEGER NOT NULL DEFAULT 0,
+        yizi_count INTEGER NOT NULL DEFAULT 0,
+        fried_count INTEGER NOT NULL DEFAULT 0,
+        max_chain INTEGER NOT NULL DEFAULT 0
+    )
     """)
+    cursor.execute("SELECT 1 FROM daily_limit_summary LIMIT 1")
+    if cursor.fetchone() is None:
+        # 首次创建时从已有明细回填
+        cursor.execute(f"INSERT INTO daily_limit_summary {_LIMIT_SUMMARY_SELECT} GROUP BY date")
     
     # 数据获取进度表
     cursor.execute("""
@@ -160,6 +355,24 @@ def init_database():
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )
     """)
+    
+    # 行情拉取结果缓存（断点续传时复用已拉取的批次）
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS fetch_cache (
+        key TEXT PRIMARY KEY,
+        payload BLOB NOT NULL,
+        ts INTEGER NOT NULL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_fetch_cache_ts ON fetch_cache(ts)")
+
+    # 写入序号：每次写入行情/结果/股票信息时在同一事务内递增，供报告缓存判断数据是否变化
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS data_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    """)
 
     # 可选：初始化时清理旧数据
     prune_before = getattr(config, "DATA_PRUNE_BEFORE_DATE", None)
@@ -178,15 +391,27 @@ def init_database():
             conn.execute("PRAGMA busy_timeout=30000;")
             conn.execute("PRAGMA journal_mode=WAL;")
 
+            # SQLite 编译了 UPDATE/DELETE LIMIT 时直接限量删除，省去 rowid 子查询的二次查找
+            delete_limit = any(
+                row[0] == "ENABLE_UPDATE_DELETE_LIMIT"
+                for row in conn.execute("PRAGMA compile_options")
+            )
+
             def _prune_table(table_name: str, batch_size: int = 50000) -> int:
-                total_deleted = 0
-                while True:
-                    cursor.execute(
+                if delete_limit:
+                    delete_sql = f"DELETE FROM {table_name} WHERE date < ? LIMIT ?"
+                else:
+                    delete_sql = (
                         f"DELETE FROM {table_name} "
-                        f"WHERE rowid IN (SELECT rowid FROM {table_name} WHERE date < ? LIMIT ?)",
-                        (prune_before, batch_size),
+                        f"WHERE rowid IN (SELECT rowid FROM {table_name} WHERE date < ? LIMIT ?)"
                     )
+                total_deleted = 0
+                while True:
+                    cursor.execute(delete_sql, (prune_before, batch_size))
                     deleted = cursor.rowcount
+                    # 最后一轮删除为空即结束，不再输出日志
+                    if deleted <= 0:
+                        break
                     total_deleted += deleted
                     # #region agent log
                     _dbg_log("H22", "database.py:init_database", "prune_batch", {
@@ -195,15 +420,18 @@ def init_database():
                         "total_deleted": int(total_deleted)
                     })
                     # #endregion agent log
-                    if deleted:
-                        print(f"清理中: {table_name} 已删除 {total_deleted} 条")
-                    conn.commit()
-                    if deleted == 0:
-                        break
+                    print(f"清理中: {table_name} 已删除 {total_deleted} 条")
+                # 分批删除只为限制单条语句的规模，整表清理完成后提交一次
+                conn.commit()
                 return total_deleted
 
             daily_deleted = _prune_table("daily_market_data")
             limit_deleted = _prune_table("limit_analysis_result")
+            conn.execute("DELETE FROM daily_stats_summary WHERE date < ?", (prune_before,))
+            conn.execute("DELETE FROM daily_limit_summary WHERE date < ?", (prune_before,))
+            if daily_deleted or limit_deleted:
+                _mark_data_written(conn)
+            conn.commit()
             # #region agent log
             _dbg_log("H22", "database.py:init_database", "prune_done", {
                 "prune_before": prune_before,
@@ -237,6 +465,7 @@ def delete_database_file() -> bool:
         # #endregion agent log
         return False
     try:
+        _close_pool()
         os.remove(DB_PATH)
         print(f"✓ 已删除数据库文件: {DB_PATH}")
         # #region agent log
@@ -255,8 +484,80 @@ def delete_database_file() -> bool:
         return False
 
 
+class _PooledConnection(sqlite3.Connection):
+    """线程内复用的连接：close() 只回滚未提交事务，不真正关闭"""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def _close(self):
+        super().close()
+
+
+class _ConnectionHolder:
+    """线程内复用连接的持有者，只被该线程的 thread-local 引用；线程退出后被回收时关闭其连接"""
+    __slots__ = ("key", "conn", "finalizer", "__weakref__")
+
+    def __init__(self):
+        self.key = None
+        self.conn = None
+        self.finalizer = None
+
+
+def _close_quietly(conn):
+    try:
+        conn._close()
+    except Exception:
+        pass
+
+
+# 每个线程按 (进程, 数据库路径) 复用一个连接，避免反复建连、设置 PRAGMA 和解析 schema；
+# 线程池中的短生命周期线程退出时连接随之关闭，不会在进程内累积
+_local = threading.local()
+_pool_lock = threading.Lock()
+_all_connections = weakref.WeakSet()
+_pool_generation = 0
+
+
+def _close_pool():
+    """关闭所有线程的复用连接（进程退出或删除数据库文件前调用）"""
+    global _pool_generation
+    with _pool_lock:
+        conns = list(_all_connections)
+        _all_connections.clear()
+        _pool_generation += 1
+    for conn in conns:
+        _close_quietly(conn)
+
+
+atexit.register(_close_pool)
+
+
 def get_connection():
-    """获取数据库连接"""
+    """获取数据库连接（同一线程内复用，线程退出后自动关闭）"""
+    holder = getattr(_local, "holder", None)
+    if holder is None:
+        holder = _local.holder = _ConnectionHolder()
+    key = (os.getpid(), DB_PATH, _pool_generation)
+    if holder.key == key:
+        if not holder.conn.in_transaction:
+            return holder.conn
+        # 复用连接正处于外层事务中，另开独立连接，避免 close() 回滚外层事务
+        return _open_connection(sqlite3.Connection)
+    if holder.finalizer is not None:
+        # 旧连接已由 _close_pool 关闭，或属于 fork 前的父进程：不再由本线程关闭
+        holder.finalizer.detach()
+    # 线程退出时由回收线程关闭连接，因此允许跨线程 close；使用仍只在本线程内
+    conn = _open_connection(_PooledConnection, check_same_thread=False)
+    holder.key, holder.conn = key, conn
+    holder.finalizer = weakref.finalize(holder, _close_quietly, conn)
+    with _pool_lock:
+        _all_connections.add(conn)
+    return conn
+
+
+def _open_connection(factory, check_same_thread: bool = True):
     # #region agent log
     _dbg_log("H1", "database.py:get_connection", "create_connection", {
         "db_path": DB_PATH,
@@ -265,7 +566,7 @@ def get_connection():
     })
     _log_db_file_state("H1", "database.py:get_connection")
     # #endregion agent log
-    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn = sqlite3.connect(DB_PATH, timeout=30, factory=factory, check_same_thread=check_same_thread)
     # #region agent log
     _dbg_log("H1", "database.py:get_connection", "apply_pragmas", {
         "busy_timeout_ms": 30000,
@@ -275,6 +576,13 @@ def get_connection():
     try:
         conn.execute("PRAGMA busy_timeout=30000;")
         conn.execute("PRAGMA journal_mode=WAL;")
+        # WAL 模式下 NORMAL 已足够安全，避免每次提交都 fsync：
+        # 断电/崩溃时最多丢失最后几个已提交事务，数据库不会损坏（数据可从 Tushare 重新拉取）
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        conn.execute("PRAGMA cache_size=-200000;")
+        # 读多的查询通过 mmap 读页，省去 pread 拷贝
+        conn.execute("PRAGMA mmap_size=268435456;")
     except Exception as e:
         # #region agent log
         _dbg_log("H2", "database.py:get_connection", "pragma_exception", {
@@ -285,6 +593,22 @@ def get_connection():
     return conn
 
 
+def get_readonly_connection(db_path: str = None, check_same_thread: bool = True):
+    """
+    获取只读连接（诊断/统计脚本使用，大缓存 + mmap，禁止写入）
+    
+    check_same_thread=False 时可跨线程共享（如 Web 端各会话共用一个连接）
+    """
+    path = os.path.abspath(db_path or DB_PATH)
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30, cached_statements=256,
+                           check_same_thread=check_same_thread)
+    conn.execute("PRAGMA query_only=1;")
+    conn.execute("PRAGMA cache_size=-262144;")
+    conn.execute("PRAGMA mmap_size=1073741824;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    return conn
+
+
 # #region agent log
 def _probe_write_lock():
     try:
@@ -303,6 +627,131 @@ def _probe_write_lock():
 # #endregion agent log
 
 
+def _dataframe_rows(df: pd.DataFrame):
+    """
+    将 DataFrame 转为 Python 原生类型的行元组，NaN 写入为 NULL
+
+    逐列 tolist() 得到原生类型后 zip 成行；含缺失值的列用整列一次算出的缺失掩码替换为 None，
+    不逐个调用 pd.isna
+    """
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        values = series.tolist()
+        if series.hasnans:
+            missing = series.isna().to_numpy().tolist()
+            values = [None if m else v for v, m in zip(values, missing)]
+        columns.append(values)
+    return zip(*columns)
+
+
+def _mark_data_written(conn):
+    """递增写入序号（不提交，与本次写入同属一个事务）"""
+    try:
+        conn.execute(
+            "INSERT INTO data_meta (key, value) VALUES ('write_seq', 1) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+        )
+    except sqlite3.OperationalError:
+        # 旧库尚未执行 init_database 时没有该表：跳过
+        pass
+
+
+def get_write_seq(conn) -> int:
+    """读取写入序号（单行主键查询）；旧库没有写入序号表时返回 None"""
+    try:
+        row = conn.execute("SELECT value FROM data_meta WHERE key = 'write_seq'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else 0
+
+
+def _insert_dataframe(conn, table: str, df: pd.DataFrame):
+    """
+    在给定连接上批量插入 DataFrame（不提交，由调用方控制事务）
+
+    使用 INSERT OR IGNORE：与已有 (date, code) 重复的行由 SQLite 直接跳过，重复运行是幂等的。
+    """
+    if df.empty:
+        return
+    columns = list(df.columns)
+    placeholders = ",".join("?" * len(columns))
+    sql = f"INSERT OR IGNORE INTO {table} ({','.join(columns)}) VALUES ({placeholders})"
+    conn.executemany(sql, _dataframe_rows(df))
+    _mark_data_written(conn)
+
+
+def _sqlite_max_variables(conn) -> int:
+    """单条语句允许绑定的最大参数数（读取连接的实际上限；Python 3.11 以前按 SQLite 版本估计）"""
+    if hasattr(conn, "getlimit"):
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    return 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+
+def insert_dataframe_multirow(conn, table: str, df: pd.DataFrame) -> int:
+    """
+    使用多行 VALUES 语句批量插入 DataFrame（不提交，由调用方控制事务）
+
+    每条语句的行数按参数上限 / 列数计算；整批语句只构造一次，尾部余量单独构造。
+
+    返回:
+        插入的行数
+    """
+    if df.empty:
+        return 0
+    columns = list(df.columns)
+    ncols = len(columns)
+    rows_per_stmt = max(1, _sqlite_max_variables(conn) // ncols)
+    row_tpl = "(" + ",".join("?" * ncols) + ")"
+    prefix = f"INSERT INTO {table} ({','.join(columns)}) VALUES "
+
+    rows = list(_dataframe_rows(df))
+    total = len(rows)
+    full_end = total - total % rows_per_stmt
+    if full_end:
+        full_sql = prefix + ",".join([row_tpl] * rows_per_stmt)
+        for start in range(0, full_end, rows_per_stmt):
+            conn.execute(full_sql, [v for row in rows[start:start + rows_per_stmt] for v in row])
+    if full_end < total:
+        tail = rows[full_end:]
+        conn.execute(prefix + ",".join([row_tpl] * len(tail)), [v for row in tail for v in row])
+    return total
+
+
+def create_stage_table(conn, table: str) -> str:
+    """
+    创建与目标表同结构、无索引无约束的临时暂存表，返回暂存表名
+
+    批量导入时先写入暂存表，再由 load_stage_table 一次性按序写入目标表，
+    目标表的唯一索引只需在最后维护一次。
+    """
+    stage = f"stage_{table}"
+    conn.execute(f"DROP TABLE IF EXISTS temp.{stage}")
+    conn.execute(f"CREATE TEMP TABLE {stage} AS SELECT * FROM {table} WHERE 0")
+    return stage
+
+
+def load_stage_table(conn, stage: str, table: str, columns: List[str],
+                     order_by: str = None) -> int:
+    """
+    将暂存表数据一次性写入目标表并删除暂存表（不提交，由调用方控制事务），返回写入行数
+
+    与 _insert_dataframe 一致使用 INSERT OR IGNORE：重跑覆盖已有日期时跳过已存在的 (date, code)，
+    不会因唯一约束冲突回滚整次导入
+    """
+    cols = ",".join(columns)
+    sql = f"INSERT OR IGNORE INTO {table} ({cols}) SELECT {cols} FROM temp.{stage}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    cursor = conn.execute(sql)
+    if table == 'daily_market_data':
+        dates = [row[0] for row in conn.execute(f"SELECT DISTINCT date FROM temp.{stage}")]
+        _refresh_summary(conn, 'daily_stats_summary', _DAILY_STATS_SELECT, dates)
+    conn.execute(f"DROP TABLE temp.{stage}")
+    _mark_data_written(conn)
+    return cursor.rowcount
+
+
 def save_stock_meta(stocks_df: pd.DataFrame):
     """保存股票元信息"""
     # #region agent log
@@ -336,6 +785,8 @@ def save_stock_meta(stocks_df: pd.DataFrame):
         })
         # #endregion agent log
         stocks_df.to_sql('stock_meta', conn, if_exists='append', index=False)
+        _mark_data_written(conn)
+        conn.commit()
     except Exception as e:
         # #region agent log
         _dbg_log("H2", "database.py:save_stock_meta", "to_sql_exception", {
@@ -351,85 +802,67 @@ def save_stock_meta(stocks_df: pd.DataFrame):
             pass
 
 
-def save_daily_data(data_df: pd.DataFrame):
-    """保存日线行情数据"""
+def save_daily_data(data_df: pd.DataFrame, conn=None):
+    """
+    保存日线行情数据
+
+    参数:
+        data_df: 日线行情数据
+        conn: 可选的外部连接；传入时在该连接的事务内写入，不提交也不关闭
+    """
+    if conn is not None:
+        _insert_daily_data(conn, data_df)
+        return
     conn = get_connection()
     # #region agent log
-    try:
-        if "date" in data_df.columns:
-            date_series = data_df["date"].astype(str)
-            date_min = date_series.min()
-            date_max = date_series.max()
-            date_counts = date_series.value_counts().head(5).to_dict()
-        else:
-            date_min = None
-            date_max = None
-            date_counts = {}
-        unique_codes = int(data_df["code"].nunique()) if "code" in data_df.columns else 0
-        _dbg_log("H25", "database.py:save_daily_data", "enter", {
-            "rows": int(len(data_df)),
-            "unique_codes": int(unique_codes),
-            "date_min": date_min,
-            "date_max": date_max,
-            "top_date_counts": date_counts
-        })
-    except Exception:
-        pass
-    # #endregion agent log
-    # #region agent log
-    try:
-        _dbg_log("H31", "database.py:save_daily_data", "version_marker", {
-            "chunk_size": int(getattr(config, "DAILY_SAVE_CHUNK_SIZE", 50000)),
-            "rows": int(len(data_df))
-        })
-    except Exception:
-        pass
+    if getattr(config, "DEBUG_LOG_ENABLE", False):
+        try:
+            if "date" in data_df.columns:
+                date_series = data_df["date"].astype(str)
+                date_min = date_series.min()
+                date_max = date_series.max()
+                date_counts = date_series.value_counts().head(5).to_dict()
+            else:
+                date_min = None
+                date_max = None
+                date_counts = {}
+            unique_codes = int(data_df["code"].nunique()) if "code" in data_df.columns else 0
+            _dbg_log("H25", "database.py:save_daily_data", "enter", {
+                "rows": int(len(data_df)),
+                "unique_codes": int(unique_codes),
+                "date_min": date_min,
+                "date_max": date_max,
+                "top_date_counts": date_counts
+            })
+        except Exception:
+            pass
     # #endregion agent log
     try:
-        total_rows = int(len(data_df))
-        # SQLite 变量数限制为 999，每行约 9 列，安全 chunk_size = 999/9 ≈ 100
-        # 使用较小的 chunk_size 避免 "too many SQL variables" 错误
-        sqlite_safe_chunk = 100  # 保守值，确保不超过 SQLite 限制
-        chunk_size = min(int(getattr(config, "DAILY_SAVE_CHUNK_SIZE", 50000)), sqlite_safe_chunk)
-        # #region agent log
-        _dbg_log("H31", "database.py:save_daily_data", "chunked_write_start", {
-            "total_rows": total_rows,
-            "chunk_size": int(chunk_size),
-            "sqlite_safe_chunk": sqlite_safe_chunk
-        })
-        # #endregion agent log
-        for start in range(0, total_rows, chunk_size):
-            end = min(start + chunk_size, total_rows)
-            chunk = data_df.iloc[start:end]
-            chunk.to_sql('daily_market_data', conn, if_exists='append', index=False, method='multi')
-            conn.commit()
-            # #region agent log
-            if start == 0 or (start + chunk_size) >= total_rows:
-                _dbg_log("H31", "database.py:save_daily_data", "chunked_write_progress", {
-                    "start": int(start),
-                    "end": int(end),
-                    "written": int(end)
-                })
-            # #endregion agent log
+        # 单条预编译语句 executemany 逐行绑定，不受 SQL 变量数限制，无需分块；
+        # 整批在同一个事务内写入，只在最后提交（同步落盘）一次
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            _insert_daily_data(conn, data_df)
         # #region agent log
         _dbg_log("H25", "database.py:save_daily_data", "success", {
             "rows": int(len(data_df))
         })
         # #endregion agent log
         # #region agent log
-        try:
-            if "date" in data_df.columns:
-                date_max = data_df["date"].astype(str).max()
-                count_row = pd.read_sql_query(
-                    f"SELECT COUNT(*) as cnt FROM daily_market_data WHERE date = '{date_max}'",
-                    conn
-                ).iloc[0]
-                _dbg_log("H31", "database.py:save_daily_data", "post_insert_count", {
-                    "date": date_max,
-                    "count": int(count_row["cnt"])
-                })
-        except Exception:
-            pass
+        # 写后回查只在开启调试日志时执行，避免每次保存多一次查询
+        if getattr(config, "DEBUG_LOG_ENABLE", False):
+            try:
+                if "date" in data_df.columns:
+                    date_max = data_df["date"].astype(str).max()
+                    count = conn.execute(
+                        "SELECT COUNT(*) FROM daily_market_data WHERE date = ?", (date_max,)
+                    ).fetchone()[0]
+                    _dbg_log("H31", "database.py:save_daily_data", "post_insert_count", {
+                        "date": date_max,
+                        "count": int(count)
+                    })
+            except Exception:
+                pass
         # #endregion agent log
     except Exception as e:
         # #region agent log
@@ -442,30 +875,89 @@ def save_daily_data(data_df: pd.DataFrame):
     conn.close()
 
 
-def save_limit_results(results_df: pd.DataFrame):
-    """保存涨停分析结果"""
+def save_limit_results(results_df: pd.DataFrame, conn=None):
+    """
+    保存涨停分析结果
+
+    参数:
+        results_df: 连板分析结果
+        conn: 可选的外部连接；传入时在该连接的事务内写入，不提交也不关闭
+    """
+    if conn is not None:
+        _insert_limit_results(conn, results_df)
+        return
     conn = get_connection()
-    results_df.to_sql('limit_analysis_result', conn, if_exists='append', index=False)
-    conn.close()
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            _insert_limit_results(conn, results_df)
+    finally:
+        conn.close()
 
 
-def get_stock_daily_data(code: str, start_date: str = None, end_date: str = None) -> pd.DataFrame:
-    """获取指定股票的日线数据"""
-    conn = get_connection()
-    query = f"SELECT * FROM daily_market_data WHERE code = '{code}'"
+def get_stock_daily_data(code: str, start_date: str = None, end_date: str = None,
+                         conn=None) -> pd.DataFrame:
+    """获取指定股票的日线数据（传入 conn 时可读取该连接内未提交的写入）"""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    # 参数化查询：同一形态的语句可复用连接的预编译缓存
+    query = "SELECT * FROM daily_market_data WHERE code = ?"
+    params = [code]
     
     if start_date:
-        query += f" AND date >= '{start_date}'"
+        query += " AND date >= ?"
+        params.append(start_date)
     if end_date:
-        query += f" AND date <= '{end_date}'"
+        query += " AND date <= ?"
+        params.append(end_date)
     
     query += " ORDER BY date ASC"
     
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    df = pd.read_sql_query(query, conn, params=params)
+    if own_conn:
+        conn.close()
     return df
 
 
+def get_daily_data_bulk(codes: List[str], start_date: str = None, end_date: str = None,
+                        conn=None) -> pd.DataFrame:
+    """
+    一次查询获取多只股票的日线数据
+
+    代码列表按 SQLite 参数上限分段绑定；传入 conn 时可读取该连接内未提交的写入。
+    """
+    if not codes:
+        return pd.DataFrame()
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+
+    date_clause = ""
+    date_params = []
+    if start_date:
+        date_clause += " AND date >= ?"
+        date_params.append(start_date)
+    if end_date:
+        date_clause += " AND date <= ?"
+        date_params.append(end_date)
+
+    step = _sqlite_max_variables(conn) - len(date_params)
+    frames = []
+    try:
+        for i in range(0, len(codes), step):
+            part = list(codes[i:i + step])
+            query = (
+                f"SELECT * FROM daily_market_data WHERE code IN ({','.join('?' * len(part))})"
+                f"{date_clause} ORDER BY code, date"
+            )
+            frames.append(pd.read_sql_query(query, conn, params=part + date_params))
+    finally:
+        if own_conn:
+            conn.close()
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
 def update_fetch_progress(task_id: str, status: str, current_date: str = None):
     """更新数据获取进度"""
     conn = get_connection()
@@ -488,6 +980,37 @@ def update_fetch_progress(task_id: str, status: str, current_date: str = None):
     conn.close()
 
 
+def _fetch_cache_cutoff() -> int:
+    """拉取缓存的过期时间点（早于该时间写入的条目视为过期）"""
+    return int(time.time()) - int(getattr(config, "FETCH_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+
+def get_fetch_cache(key: str):
+    """读取行情拉取缓存，未命中或已过期返回 None"""
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT payload FROM fetch_cache WHERE key = ? AND ts >= ?", (key, _fetch_cache_cutoff())
+        ).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def put_fetch_cache(key: str, payload: bytes):
+    """写入行情拉取缓存，同一事务内清理过期条目（按 ts 索引删除，缓存不会无限增长）"""
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute("DELETE FROM fetch_cache WHERE ts < ?", (_fetch_cache_cutoff(),))
+            conn.execute(
+                "INSERT OR REPLACE INTO fetch_cache (key, payload, ts) VALUES (?, ?, ?)",
+                (key, sqlite3.Binary(payload), int(time.time()))
+            )
+    finally:
+        conn.close()
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='数据库初始化/重置工具')
     parser.add_argument(
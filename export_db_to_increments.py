@@ -47,18 +47,25 @@ def export_database_to_increments(start_date: str = None, end_date: str = None):
     total_market = 0
     total_limits = 0
     
+    # 两张表各做一次按日期有序的范围扫描，再在内存中按日期切分，
+    # 代替每个日期各查询一次
+    range_params = (dates[0], dates[-1])
+    market_all = pd.read_sql_query(
+        "SELECT * FROM daily_market_data WHERE date BETWEEN ? AND ? ORDER BY date",
+        conn, params=range_params
+    )
+    limits_all = pd.read_sql_query(
+        "SELECT * FROM limit_analysis_result WHERE date BETWEEN ? AND ? ORDER BY date",
+        conn, params=range_params
+    )
+    market_by_date = dict(list(market_all.groupby('date', sort=False)))
+    limits_by_date = dict(list(limits_all.groupby('date', sort=False)))
+    empty_market = market_all.iloc[0:0]
+    empty_limits = limits_all.iloc[0:0]
+    
     for i, date in enumerate(dates, 1):
-        # 获取市场数据
-        market_query = f"""
-            SELECT * FROM daily_market_data WHERE date = '{date}'
-        """
-        market_df = pd.read_sql_query(market_query, conn)
-        
-        # 获取分析结果
-        limits_query = f"""
-            SELECT * FROM limit_analysis_result WHERE date = '{date}'
-        """
-        limits_df = pd.read_sql_query(limits_query, conn)
+        market_df = market_by_date.get(date, empty_market)
+        limits_df = limits_by_date.get(date, empty_limits)
         
         if market_df.empty and limits_df.empty:
             continue
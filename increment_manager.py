@@ -9,10 +9,16 @@
 import os
 import json
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import config
 
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
 
 # 增量文件目录
 INCREMENTS_DIR = os.path.join(os.path.dirname(__file__), 'data', 'increments')
@@ -28,6 +34,16 @@ def get_increment_path(date: str) -> str:
     return os.path.join(INCREMENTS_DIR, f"{date}.json")
 
 
+def _dumps_increment(increment: dict) -> bytes:
+    """序列化增量数据：优先用 orjson（可选依赖），不支持的类型退回标准库"""
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(increment, option=_orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass
+    return json.dumps(increment, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
 def save_daily_increment(
     date: str,
     market_data: pd.DataFrame,
@@ -55,8 +71,9 @@ def save_daily_increment(
     increment = {
         'date': date,
         'created_at': datetime.now().isoformat(),
-        'market_data': market_data.to_dict(orient='records') if not market_data.empty else [],
-        'limit_results': limit_results.to_dict(orient='records') if not limit_results.empty else [],
+        # 按列名 + 行数组（split）存储，不再每行重复列名
+        'market_data': market_data.to_dict(orient='split', index=False) if not market_data.empty else [],
+        'limit_results': limit_results.to_dict(orient='split', index=False) if not limit_results.empty else [],
         'stats': {
             'market_rows': len(market_data),
             'limit_rows': len(limit_results),
@@ -65,8 +82,9 @@ def save_daily_increment(
     }
     
     path = get_increment_path(date)
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(increment, f, ensure_ascii=False, indent=2)
+    with open(path, 'wb') as f:
+        f.write(_dumps_increment(increment))
+    _invalidate_increment_index()
     
     file_size = os.path.getsize(path) / 1024  # KB
     print(f"✓ 增量文件已保存: {path} ({file_size:.1f} KB)")
@@ -81,17 +99,109 @@ def load_increment(date: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
     返回:
         (market_data, limit_results)
     """
+    market_section, limit_section = _read_increment_sections(date)
+    return _frame_from_rows([_section_rows(market_section)]), _frame_from_rows([_section_rows(limit_section)])
+
+
+def _loads_increment(raw: bytes) -> dict:
+    """解析增量文件：优先用 orjson；旧文件中标准库写出的 NaN 等非标准 JSON 退回标准库"""
+    if _orjson is not None:
+        try:
+            return _orjson.loads(raw)
+        except _orjson.JSONDecodeError:
+            pass
+    return json.loads(raw.decode('utf-8'))
+
+
+def _read_increment_sections(date: str) -> Tuple[object, object]:
+    """读取增量文件中的市场数据与分析结果两部分原始内容（文件不存在时为空）"""
     path = get_increment_path(date)
     if not os.path.exists(path):
-        return pd.DataFrame(), pd.DataFrame()
+        return [], []
     
-    with open(path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(path, 'rb') as f:
+        data = _loads_increment(f.read())
     
-    market_data = pd.DataFrame(data.get('market_data', []))
-    limit_results = pd.DataFrame(data.get('limit_results', []))
+    return data.get('market_data', []), data.get('limit_results', [])
+
+
+def _section_rows(section) -> Tuple[list, list]:
+    """
+    将一部分内容统一为 (列名, 行列表)
+
+    新文件为 split 格式 {'columns': [...], 'data': [[...], ...]}；
+    旧文件为逐行字典列表，按首行的键顺序取值。
+    """
+    if isinstance(section, dict):
+        return list(section.get('columns', [])), section.get('data', [])
+    if not section:
+        return [], []
+    columns = list(section[0].keys())
+    return columns, [[record.get(col) for col in columns] for record in section]
+
+
+def _frame_from_rows(parts: List[Tuple[list, list]]) -> pd.DataFrame:
+    """按列名分组合并各部分的行，每种列结构只构造一次 DataFrame"""
+    rows_by_columns = {}
+    for columns, rows in parts:
+        if rows:
+            rows_by_columns.setdefault(tuple(columns), []).extend(rows)
+    frames = [pd.DataFrame(rows, columns=list(columns)) for columns, rows in rows_by_columns.items()]
+    if not frames:
+        return pd.DataFrame()
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+# 增量文件索引缓存：(目录 mtime, {日期: 文件大小})
+_increment_index = None
+
+
+def _invalidate_increment_index():
+    """增量文件有写入或删除时清空索引缓存"""
+    global _increment_index
+    _increment_index = None
+
+
+def _scan_increments() -> Dict[str, int]:
+    """
+    一次 scandir 取得全部增量文件的日期和大小（按日期排序）
     
-    return market_data, limit_results
+    目录 mtime 未变化且本进程未写入时直接复用上次的扫描结果
+    """
+    global _increment_index
+    ensure_increments_dir()
+    
+    dir_mtime = os.stat(INCREMENTS_DIR).st_mtime_ns
+    if _increment_index is not None and _increment_index[0] == dir_mtime:
+        return _increment_index[1]
+    
+    index = {}
+    with os.scandir(INCREMENTS_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json'):
+                date = entry.name[:-5]  # 移除 .json
+                if len(date) == 8 and date.isdigit():
+                    index[date] = entry.stat().st_size
+    
+    index = dict(sorted(index.items()))
+    _increment_index = (dir_mtime, index)
+    return index
+
+
+def increments_version() -> Tuple:
+    """
+    增量文件的版本标识（各文件名、大小、修改时间），任一文件新增、删除或覆盖写入即变化
+    
+    只做一次 scandir，不读取文件内容，可在每次页面刷新时调用
+    """
+    ensure_increments_dir()
+    version = []
+    with os.scandir(INCREMENTS_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                version.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(version))
 
 
 def list_increments() -> List[str]:
@@ -101,21 +211,13 @@ def list_increments() -> List[str]:
     返回:
         日期列表（按日期排序）
     """
-    ensure_increments_dir()
-    
-    dates = []
-    for filename in os.listdir(INCREMENTS_DIR):
-        if filename.endswith('.json'):
-            date = filename[:-5]  # 移除 .json
-            if len(date) == 8 and date.isdigit():
-                dates.append(date)
-    
-    return sorted(dates)
+    return list(_scan_increments())
 
 
 def load_all_increments(
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    include_market: bool = True
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
     加载所有增量数据
@@ -123,6 +225,7 @@ def load_all_increments(
     参数:
         start_date: 起始日期（可选）
         end_date: 结束日期（可选）
+        include_market: 是否构造市场数据（只用分析结果时传 False，市场数据返回空表）
     
     返回:
         (market_data, limit_results)
@@ -137,20 +240,24 @@ def load_all_increments(
     if not dates:
         return pd.DataFrame(), pd.DataFrame()
     
-    all_market = []
-    all_limits = []
+    # 先汇总各日的原始行，最后各构造一次 DataFrame（只做一次类型推断）
+    market_parts = []
+    limit_parts = []
     
-    for date in dates:
-        market, limits = load_increment(date)
-        if not market.empty:
-            all_market.append(market)
-        if not limits.empty:
-            all_limits.append(limits)
+    # 多个文件并发读取（文件 I/O 期间释放 GIL），结果按日期顺序返回
+    if len(dates) > 1:
+        with ThreadPoolExecutor(max_workers=min(8, len(dates))) as executor:
+            sections = list(executor.map(_read_increment_sections, dates))
+    else:
+        sections = [_read_increment_sections(dates[0])]
     
-    market_data = pd.concat(all_market, ignore_index=True) if all_market else pd.DataFrame()
-    limit_results = pd.concat(all_limits, ignore_index=True) if all_limits else pd.DataFrame()
+    for market, limits in sections:
+        if include_market:
+            market_parts.append(_section_rows(market))
+        limit_parts.append(_section_rows(limits))
     
-    return market_data, limit_results
+    market_data = _frame_from_rows(market_parts) if include_market else pd.DataFrame()
+    return market_data, _frame_from_rows(limit_parts)
 
 
 def merge_increments_to_db(dates: Optional[List[str]] = None):
@@ -174,22 +281,36 @@ def merge_increments_to_db(dates: Optional[List[str]] = None):
     total_market = 0
     total_limits = 0
     
-    for date in dates:
-        market_data, limit_results = load_increment(date)
-        
-        if not market_data.empty:
-            try:
-                database.save_daily_data(market_data)
-                total_market += len(market_data)
-            except Exception as e:
-                print(f"  ⚠️ {date} 市场数据合并警告: {e}")
-        
-        if not limit_results.empty:
-            try:
-                database.save_limit_results(limit_results)
-                total_limits += len(limit_results)
-            except Exception as e:
-                print(f"  ⚠️ {date} 分析结果合并警告: {e}")
+    # 全部日期在同一个事务内合并，只提交一次；
+    # 每个日期的每张表用保存点隔离，失败时只撤销该部分并继续（重复行由 INSERT OR IGNORE 跳过）
+    conn = database.get_connection()
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for date in dates:
+                market_data, limit_results = load_increment(date)
+                
+                if not market_data.empty:
+                    conn.execute("SAVEPOINT merge_market")
+                    try:
+                        database.save_daily_data(market_data, conn=conn)
+                        total_market += len(market_data)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO merge_market")
+                        print(f"  ⚠️ {date} 市场数据合并警告: {e}")
+                    conn.execute("RELEASE merge_market")
+                
+                if not limit_results.empty:
+                    conn.execute("SAVEPOINT merge_limits")
+                    try:
+                        database.save_limit_results(limit_results, conn=conn)
+                        total_limits += len(limit_results)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO merge_limits")
+                        print(f"  ⚠️ {date} 分析结果合并警告: {e}")
+                    conn.execute("RELEASE merge_limits")
+    finally:
+        conn.close()
     
     print(f"✓ 合并完成: {total_market} 条市场数据, {total_limits} 条分析结果")
 
@@ -205,26 +326,19 @@ def get_increments_summary() -> dict:
             'total_size_kb': float
         }
     """
-    ensure_increments_dir()
-    
-    dates = list_increments()
-    if not dates:
+    index = _scan_increments()
+    if not index:
         return {
             'total_files': 0,
             'date_range': (None, None),
             'total_size_kb': 0
         }
     
-    total_size = 0
-    for date in dates:
-        path = get_increment_path(date)
-        if os.path.exists(path):
-            total_size += os.path.getsize(path)
-    
+    dates = list(index)
     return {
         'total_files': len(dates),
         'date_range': (dates[0], dates[-1]),
-        'total_size_kb': total_size / 1024
+        'total_size_kb': sum(index.values()) / 1024
     }
 
 
@@ -249,6 +363,7 @@ def cleanup_old_increments(keep_days: int = 90):
                 removed += 1
             except Exception as e:
                 print(f"  ⚠️ 删除 {date} 失败: {e}")
+    _invalidate_increment_index()
     
     if removed:
         print(f"✓ 已清理 {removed} 个旧增量文件")
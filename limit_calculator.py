@@ -27,6 +27,24 @@ def is_limit_up(close: float, pre_close: float, limit_ratio: float) -> bool:
     return close >= limit_price * (1 - config.LIMIT_TOLERANCE)
 
 
+def limit_up_mask(close: np.ndarray, pre_close: np.ndarray, limit_ratio: float) -> np.ndarray:
+    """
+    批量判断是否涨停（与 is_limit_up 判定规则一致），limit_ratio 可为标量或逐行数组
+    
+    价格换算为整数“分”、涨跌幅与容忍度换算为整数基点后做整数比较，
+    不受浮点尾差影响：close * 10^8 >= pre_close * (10^4 + 涨幅bp) * (10^4 - 容忍bp)
+    """
+    close = np.asarray(close, dtype=np.float64)
+    pre_close = np.asarray(pre_close, dtype=np.float64)
+    valid = ~(np.isnan(close) | np.isnan(pre_close)) & (pre_close > 0)
+    close_cents = np.rint(np.where(valid, close, 0) * 100).astype(np.int64)
+    pre_cents = np.rint(np.where(valid, pre_close, 0) * 100).astype(np.int64)
+    # limit_ratio 可为标量或逐行数组（批量计算时各股票比例不同）
+    ratio_bp = np.rint(np.asarray(limit_ratio, dtype=np.float64) * 10000).astype(np.int64)
+    factor = (10000 + ratio_bp) * (10000 - config.LIMIT_TOLERANCE_BP)
+    return valid & (close_cents * 100000000 >= pre_cents * factor)
+
+
 def is_yizi_board(open_price: float, high: float, low: float, close: float, 
                   pre_close: float, limit_ratio: float) -> bool:
     """
@@ -58,6 +76,20 @@ def is_yizi_board(open_price: float, high: float, low: float, close: float,
     return all_near_limit
 
 
+def yizi_mask(open_price: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray,
+              limit_price: np.ndarray) -> np.ndarray:
+    """
+    批量判断一字板价格形态（与 is_yizi_board 判定规则一致）
+    
+    开、高、低、收均在涨停价的容忍范围内；任一价格缺失时比较结果为 False
+    """
+    tolerance = limit_price * config.LIMIT_TOLERANCE
+    mask = np.abs(open_price - limit_price) <= tolerance
+    for prices in (high, low, close):
+        mask &= np.abs(prices - limit_price) <= tolerance
+    return mask
+
+
 def is_fried_board(high: float, close: float, pre_close: float, limit_ratio: float) -> bool:
     """
     判断是否炸板（盘中触及涨停但收盘未封住）
@@ -84,6 +116,74 @@ def is_fried_board(high: float, close: float, pre_close: float, limit_ratio: flo
     return touched_limit and not_closed_limit
 
 
+def fried_mask(high: np.ndarray, close: np.ndarray, pre_close: np.ndarray,
+               limit_price: np.ndarray) -> np.ndarray:
+    """
+    批量判断炸板价格形态（与 is_fried_board 判定规则一致，是否涨停由调用方另行排除）
+    
+    最高价触及涨停但收盘价未封住；收盘价或前收盘价缺失时不算
+    """
+    tolerance = limit_price * config.LIMIT_TOLERANCE
+    threshold = limit_price * (1 - tolerance)
+    # 原地累积与运算，只保留一个结果数组
+    mask = high >= threshold
+    mask &= close < threshold
+    mask &= ~np.isnan(close)
+    mask &= ~np.isnan(pre_close)
+    return mask
+
+
+# 板型取值固定：分类编码 0 normal / 1 yizi / 2 fried
+BOARD_TYPE_DTYPE = pd.CategoricalDtype(['normal', 'yizi', 'fried'])
+
+
+def _accumulate_chain(limit_up: np.ndarray, group_start: np.ndarray = None) -> np.ndarray:
+    """
+    由涨停标记累计连板高度（涨停 +1，未涨停归零）
+    
+    涨停累计数减去最近一次断链时的累计数，整段用 cumsum / maximum.accumulate 完成，无逐行循环。
+    group_start 标记每只股票的第一行：多只股票首尾相接时在此处重新计数。
+    """
+    up_count = np.cumsum(limit_up, dtype=np.int64)
+    base = np.where(limit_up, 0, up_count)
+    if group_start is not None:
+        # 组首行若涨停，以该行之前的累计数为基准，使其从 1 开始计数
+        base = np.where(group_start & limit_up, up_count - 1, base)
+    return up_count - np.maximum.accumulate(base)
+
+
+def _chain_columns(open_price, high, low, close, pre_close, limit_ratio,
+                   group_start: np.ndarray = None) -> dict:
+    """
+    整列计算涨停、一字板、炸板与连板高度，规则与 is_limit_up / is_yizi_board / is_fried_board 一致
+    
+    行须已按（代码、）日期排序；limit_ratio 可为标量或逐行数组。
+    """
+    limit_up = limit_up_mask(close, pre_close, limit_ratio)
+    limit_price = pre_close * (1 + limit_ratio)
+    
+    # 一字板只可能出现在涨停行（通常只占百分之几），只取这些行判断，
+    # 不再对四个价格列整列生成比较用的中间数组
+    yizi = np.zeros(len(limit_up), dtype=bool)
+    up_idx = np.flatnonzero(limit_up)
+    if len(up_idx):
+        yizi[up_idx] = yizi_mask(
+            open_price[up_idx], high[up_idx], low[up_idx], close[up_idx], limit_price[up_idx]
+        )
+    fried = fried_mask(high, close, pre_close, limit_price)
+    fried &= ~limit_up
+    
+    return {
+        'limit_status': limit_up.astype(np.int64),
+        'chain_height': _accumulate_chain(limit_up, group_start),
+        'is_fried': fried.astype(np.int64),
+        # 板型直接由整数编码构造分类列，不生成逐行字符串
+        'board_type': pd.Categorical.from_codes(
+            np.where(yizi, 1, np.where(fried, 2, 0)).astype(np.int8), dtype=BOARD_TYPE_DTYPE
+        ),
+    }
+
+
 def calculate_single_stock_chain(df: pd.DataFrame, code: str, limit_ratio: float) -> pd.DataFrame:
     """
     计算单只股票的连板高度
@@ -99,62 +199,33 @@ def calculate_single_stock_chain(df: pd.DataFrame, code: str, limit_ratio: float
     if df.empty:
         return pd.DataFrame()
     
-    # 确保按日期排序
-    df = df.sort_values('date').copy()
-    
-    # 初始化结果列
-    df['limit_status'] = 0
-    df['chain_height'] = 0
-    df['is_fried'] = 0
-    df['board_type'] = 'normal'
-    
-    # 逐行计算
-    chain_height = 0
-    
-    for idx in range(len(df)):
-        row = df.iloc[idx]
-        
-        # 跳过数据不完整的行
-        if pd.isna(row['close']) or pd.isna(row['pre_close']):
-            df.iloc[idx, df.columns.get_loc('chain_height')] = 0
-            chain_height = 0
-            continue
-        
-        # 判断是否涨停
-        limit_up = is_limit_up(row['close'], row['pre_close'], limit_ratio)
-        
-        if limit_up:
-            # 涨停，连板高度+1
-            chain_height += 1
-            df.iloc[idx, df.columns.get_loc('limit_status')] = 1
-            df.iloc[idx, df.columns.get_loc('chain_height')] = chain_height
-            
-            # 判断板型
-            if is_yizi_board(row['open'], row['high'], row['low'], 
-                           row['close'], row['pre_close'], limit_ratio):
-                df.iloc[idx, df.columns.get_loc('board_type')] = 'yizi'
-            else:
-                df.iloc[idx, df.columns.get_loc('board_type')] = 'normal'
-        else:
-            # 未涨停，检查是否炸板
-            fried = is_fried_board(row['high'], row['close'], row['pre_close'], limit_ratio)
-            
-            if fried:
-                df.iloc[idx, df.columns.get_loc('is_fried')] = 1
-                df.iloc[idx, df.columns.get_loc('board_type')] = 'fried'
-            
-            # 连板链断裂
-            df.iloc[idx, df.columns.get_loc('chain_height')] = 0
-            chain_height = 0
-    
-    # 选择需要的列
-    result = df[['date', 'limit_status', 'chain_height', 'is_fried', 'board_type']].copy()
-    result['code'] = code
-    
-    # 调整列顺序
-    result = result[['date', 'code', 'limit_status', 'chain_height', 'is_fried', 'board_type']]
-    
-    return result
+    # 只按日期重排所需的列数组（已有序时不重排），不复制整张表
+    dates = df['date'].to_numpy()
+    if df['date'].is_monotonic_increasing:
+        order = slice(None)
+    else:
+        order = np.argsort(dates, kind='stable')
+    
+    columns = _chain_columns(
+        df['open'].to_numpy()[order], df['high'].to_numpy()[order], df['low'].to_numpy()[order],
+        df['close'].to_numpy()[order], df['pre_close'].to_numpy()[order], limit_ratio
+    )
+    return pd.DataFrame({'date': dates[order], 'code': code, **columns}, index=df.index[order])
+
+
+# 连板计算所需的行情列
+_COMPUTE_COLUMNS = ['date', 'code', 'open', 'high', 'low', 'close', 'pre_close']
+_PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'pre_close']
+
+
+def _project_for_compute(market_data: pd.DataFrame) -> pd.DataFrame:
+    """只保留计算所需列，价格列降为 float32 以减少内存占用（不影响入库数据）"""
+    columns = [c for c in _COMPUTE_COLUMNS if c in market_data.columns]
+    projected = market_data[columns].copy()
+    for col in _PRICE_COLUMNS:
+        if col in projected.columns:
+            projected[col] = pd.to_numeric(projected[col], downcast='float')
+    return projected
 
 
 def calculate_batch_chain(market_data: pd.DataFrame, stock_meta: pd.DataFrame) -> pd.DataFrame:
@@ -168,38 +239,39 @@ def calculate_batch_chain(market_data: pd.DataFrame, stock_meta: pd.DataFrame) -
     返回:
         所有股票的连板分析结果
     """
-    all_results = []
-    
-    # 创建股票代码到涨跌幅限制的映射
-    limit_ratio_map = dict(zip(stock_meta['code'], stock_meta['limit_ratio']))
-    
-    # 按股票代码分组
-    grouped = market_data.groupby('code')
-    total_stocks = len(grouped)
-    
-    print(f"开始计算 {total_stocks} 只股票的连板高度...")
-    
-    for idx, (code, group_df) in enumerate(grouped, 1):
-        # 获取该股票的涨跌幅限制
-        limit_ratio = limit_ratio_map.get(code, config.LIMIT_RATIO['MAIN'])
-        
-        # 计算连板高度
-        result = calculate_single_stock_chain(group_df, code, limit_ratio)
-        
-        if not result.empty:
-            all_results.append(result)
-        
-        # 显示进度
-        if idx % 100 == 0 or idx == total_stocks:
-            print(f"计算进度: {idx}/{total_stocks} ({idx/total_stocks*100:.1f}%)")
-    
-    if all_results:
-        final_result = pd.concat(all_results, ignore_index=True)
-        print(f"✓ 连板计算完成，共 {len(final_result)} 条记录")
-        return final_result
-    else:
+    # 全市场按（代码, 日期）排序后一次整列计算，股票边界处连板重新计数，
+    # 不再逐只股票分组计算再拼接
+    data = _project_for_compute(market_data)
+    data = data[data['code'].notna()].sort_values(['code', 'date'])
+    if data.empty:
         print("✗ 未计算出任何结果")
         return pd.DataFrame()
+    
+    codes = data['code'].astype(str)
+    code_values = codes.to_numpy()
+    group_start = np.empty(len(code_values), dtype=bool)
+    group_start[0] = True
+    group_start[1:] = code_values[1:] != code_values[:-1]
+    
+    print(f"开始计算 {int(group_start.sum())} 只股票的连板高度...")
+    
+    # 各行的涨跌幅限制：每只股票只查表一次（按组首行的代码 reindex），再按组长度展开到各行；
+    # 未登记的股票使用主板比例
+    limit_ratio_map = pd.Series(dict(zip(stock_meta['code'], stock_meta['limit_ratio'])), dtype='float64')
+    starts = np.flatnonzero(group_start)
+    group_ratio = (
+        limit_ratio_map.reindex(code_values[starts]).fillna(config.LIMIT_RATIO['MAIN']).to_numpy(dtype=np.float64)
+    )
+    limit_ratio = np.repeat(group_ratio, np.diff(np.append(starts, len(code_values))))
+    
+    columns = _chain_columns(
+        data['open'].to_numpy(), data['high'].to_numpy(), data['low'].to_numpy(),
+        data['close'].to_numpy(), data['pre_close'].to_numpy(), limit_ratio, group_start
+    )
+    # 各列已是整列数组，一次构造结果；板型为分类类型，比较与计数都在整数编码上进行
+    final_result = pd.DataFrame({'date': data['date'].to_numpy(), 'code': code_values, **columns})
+    print(f"✓ 连板计算完成，共 {len(final_result)} 条记录")
+    return final_result
 
 
 def get_high_chain_stocks(results_df: pd.DataFrame, date: str, min_height: int = 2) -> pd.DataFrame:
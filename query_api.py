@@ -2,96 +2,233 @@
 查询接口模块 - 提供数据查询功能
 """
 import pandas as pd
+import numpy as np
 from typing import List, Optional, Dict, Any
 import database
+import config
 from config import DB_PATH
-import time
-import json
+import importlib.util
 import os
 import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# pyarrow 为可选依赖（Streamlit 安装时已自带）：只探测是否安装，不在导入本模块时加载；
+# 未安装时 read_frame 退回 NumPy 类型
+_HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
 
 # #region agent log
-_DEBUG_LOG_PATH = r"c:\Users\Larryppg\Desktop\stock.cursor\.cursor\debug.log"
-def _dbg_log(hypothesis_id: str, location: str, message: str, data: dict):
-    try:
-        payload = {
-            "sessionId": "debug-session",
-            "runId": "pre-fix",
-            "hypothesisId": hypothesis_id,
-            "location": location,
-            "message": message,
-            "data": data,
-            "timestamp": int(time.time() * 1000),
-        }
-        with open(_DEBUG_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
-    except Exception:
-        pass
+# 与 database 共用后台队列写调试日志，调用方不做文件 I/O
+from database import _dbg_log
 # #endregion agent log
 
 
+# 涨停/炸板明细返回的列
+_DETAIL_COLUMNS = [
+    'date', 'code', 'name', 'chain_height', 'board_type', 'is_fried',
+    'close', 'pre_close', 'volume', 'amount', 'change_pct'
+]
+
+
+def read_frame(query: str, conn, params=(), **kwargs) -> pd.DataFrame:
+    """
+    执行查询并返回 DataFrame
+    
+    可用时以 pyarrow 列式类型构造结果：字符串列（代码、名称、日期、板型）不再逐格生成 Python 对象
+    """
+    if _HAS_PYARROW and getattr(config, "QUERY_ARROW_BACKEND", True):
+        kwargs.setdefault("dtype_backend", "pyarrow")
+    return pd.read_sql_query(query, conn, params=params, **kwargs)
+
+
 class LimitQueryAPI:
     """连板数据查询API"""
     
-    def __init__(self):
-        self.conn = None
+    # 按日期缓存的当日明细帧数量上限
+    DAY_CACHE_SIZE = 64
+    # 同时排队/进行中的预读日期数上限（超出时忽略新的预读请求）
+    PREFETCH_QUEUE_SIZE = 4
+    
+    def __init__(self, conn=None):
+        # 可传入已有连接（如 Web 端进程级共享的只读连接），否则首次查询时再连接
+        self.conn = conn
+        # 当日连板结果 + 股票名称 + 行情的联表结果，按日期缓存（LRU）
+        self._day_cache = OrderedDict()
+        # 实例可能被多个线程共用，缓存的读写需加锁
+        self._cache_lock = threading.Lock()
+        # 最近一次 set_data_version 传入的数据版本
+        self._data_version = None
+        # 缓存代数：清空缓存时递增，清空前发起的查询结果不再写入缓存
+        self._cache_gen = 0
+        # 预读：单线程执行器 + 该线程专用的只读连接（首次预读时创建），以及进行中的日期 -> Future
+        self._prefetch_executor = None
+        self._prefetch_conn = None
+        self._db_path = None
+        self._prefetching = {}
     
     def connect(self):
         """建立数据库连接"""
         # #region agent log
-        _dbg_log("H5", "query_api.py:LimitQueryAPI.connect", "enter", {
-            "pid": os.getpid(),
-            "thread_id": threading.get_ident(),
-            "db_path": DB_PATH
-        })
+        # 调用处先判断开关：关闭时连负载字典都不构造
+        if getattr(config, "DEBUG_LOG_ENABLE", False):
+            _dbg_log("H5", "query_api.py:LimitQueryAPI.connect", "enter", {
+                "pid": os.getpid(),
+                "thread_id": threading.get_ident(),
+                "db_path": DB_PATH
+            })
         # #endregion agent log
         self.conn = database.get_connection()
+        self.clear_cache()
+    
+    def clear_cache(self):
+        """清空按日期缓存的明细（数据库有新数据写入后调用）"""
+        with self._cache_lock:
+            self._day_cache.clear()
+            self._cache_gen += 1
+    
+    def set_data_version(self, version):
+        """记录当前数据版本（如 PRAGMA data_version）；与上次不同时清空按日期缓存的明细"""
+        with self._cache_lock:
+            if version != self._data_version:
+                self._data_version = version
+                self._day_cache.clear()
+                self._cache_gen += 1
+    
+    def prefetch_days(self, dates: List[str]):
+        """
+        后台预读指定日期的当日明细（如相邻交易日），前后翻日期时直接命中缓存
+        
+        所有预读由同一个后台线程依次执行，使用该线程自己的只读连接，不与前台查询共用连接；
+        已缓存或正在预读的日期跳过，排队数量不超过 PREFETCH_QUEUE_SIZE
+        """
+        if not self.conn:
+            return
+        with self._cache_lock:
+            for date in dates:
+                if len(self._prefetching) >= self.PREFETCH_QUEUE_SIZE:
+                    break
+                if not date or date in self._day_cache or date in self._prefetching:
+                    continue
+                if self._prefetch_executor is None:
+                    self._db_path = self.conn.execute("PRAGMA database_list").fetchone()[2] or None
+                    self._prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="day-prefetch")
+                self._prefetching[date] = self._prefetch_executor.submit(self._prefetch_worker, date)
+    
+    def _prefetch_worker(self, date: str):
+        try:
+            if self._prefetch_conn is None:
+                # 只在预读线程中创建和使用；close() 可能在其他线程调用，因此允许跨线程关闭
+                self._prefetch_conn = database.get_readonly_connection(self._db_path, check_same_thread=False)
+            self._load_day_frame(date, conn=self._prefetch_conn)
+        except Exception as e:
+            # 预读失败不影响前台查询，前台未命中时会正常查询并报告错误
+            print(f"⚠️  预读 {date} 明细失败: {e}")
+            # #region agent log
+            _dbg_log("H36", "query_api.py:LimitQueryAPI._prefetch_worker", "prefetch_exception", {
+                "date": date,
+                "error": str(e),
+                "error_type": type(e).__name__
+            })
+            # #endregion agent log
+        finally:
+            with self._cache_lock:
+                self._prefetching.pop(date, None)
+    
+    def _read_frame(self, query: str, params=(), conn=None) -> pd.DataFrame:
+        """执行查询并返回 DataFrame（默认使用实例连接）"""
+        return read_frame(query, conn or self.conn, params)
     
     def close(self):
         """关闭数据库连接"""
         if self.conn:
             # #region agent log
-            _dbg_log("H5", "query_api.py:LimitQueryAPI.close", "close", {
-                "pid": os.getpid(),
-                "thread_id": threading.get_ident()
-            })
+            if getattr(config, "DEBUG_LOG_ENABLE", False):
+                _dbg_log("H5", "query_api.py:LimitQueryAPI.close", "close", {
+                    "pid": os.getpid(),
+                    "thread_id": threading.get_ident()
+                })
             # #endregion agent log
             self.conn.close()
+            self.clear_cache()
+        if self._prefetch_executor is not None:
+            self._prefetch_executor.shutdown(wait=True, cancel_futures=True)
+            self._prefetch_executor = None
+        if self._prefetch_conn is not None:
+            self._prefetch_conn.close()
+            self._prefetch_conn = None
     
-    def query_high_chain_stocks(self, date: str, min_height: int = 2) -> pd.DataFrame:
+    def _load_day_frame(self, date: str, conn=None) -> pd.DataFrame:
         """
-        查询指定日期的高连板股票
+        读取指定日期的全部连板结果（含股票名称与当日行情），按连板高度降序、代码升序
         
-        参数:
-            date: 日期 YYYYMMDD
-            min_height: 最小连板高度
-        
-        返回:
-            股票列表（按连板高度降序）
+        高连板、涨停明细、炸板明细都是这张当日明细的筛选，同一日期只联表查询一次；
+        该日期正在后台预读时等待预读完成，不重复查询。conn 仅供预读线程传入自己的连接
         """
-        if not self.conn:
+        with self._cache_lock:
+            frame = self._day_cache.get(date)
+            future = self._prefetching.get(date) if conn is None else None
+        if frame is None and future is not None:
+            future.result()
+            with self._cache_lock:
+                frame = self._day_cache.get(date)
+        if frame is not None:
+            with self._cache_lock:
+                if date in self._day_cache:
+                    self._day_cache.move_to_end(date)
+            return frame
+        
+        if conn is None and not self.conn:
             self.connect()
         
-        query = f"""
+        query = """
         SELECT 
+            l.date,
             l.code,
             s.name,
+            l.limit_status,
             l.chain_height,
             l.board_type,
             l.is_fried,
             m.close,
             m.pre_close,
+            m.volume,
+            m.amount,
             ROUND((m.close - m.pre_close) * 100.0 / m.pre_close, 2) as change_pct
         FROM limit_analysis_result l
         LEFT JOIN stock_meta s ON l.code = s.code
         LEFT JOIN daily_market_data m ON l.date = m.date AND l.code = m.code
-        WHERE l.date = '{date}' 
-          AND l.chain_height >= {min_height}
+        WHERE l.date = ?
         ORDER BY l.chain_height DESC, l.code
         """
         
-        df = pd.read_sql_query(query, self.conn)
-        return df
+        with self._cache_lock:
+            gen = self._cache_gen
+        frame = self._read_frame(query, (date,), conn=conn)
+        with self._cache_lock:
+            # 查询期间缓存被清空（数据已更新）时不写入旧结果
+            if gen == self._cache_gen:
+                self._day_cache[date] = frame
+                if len(self._day_cache) > self.DAY_CACHE_SIZE:
+                    self._day_cache.popitem(last=False)
+        return frame
+    
+    def query_high_chain_stocks(self, date: str, min_height: int = 2) -> pd.DataFrame:
+        """
+        查询指定日期的高连板股票
+        
+        参数:
+            date: 日期 YYYYMMDD
+            min_height: 最小连板高度
+        
+        返回:
+            股票列表（按连板高度降序）
+        """
+        day = self._load_day_frame(date)
+        df = day.loc[
+            day['chain_height'] >= min_height,
+            ['code', 'name', 'chain_height', 'board_type', 'is_fried', 'close', 'pre_close', 'change_pct']
+        ]
+        return df.reset_index(drop=True)
     
     def query_stock_chain_history(self, code: str, start_date: str = None, 
                                   end_date: str = None) -> pd.DataFrame:
@@ -109,7 +246,7 @@ class LimitQueryAPI:
         if not self.conn:
             self.connect()
         
-        query = f"""
+        query = """
         SELECT 
             l.date,
             l.chain_height,
@@ -122,19 +259,97 @@ class LimitQueryAPI:
             m.volume
         FROM limit_analysis_result l
         LEFT JOIN daily_market_data m ON l.date = m.date AND l.code = m.code
-        WHERE l.code = '{code}'
+        WHERE l.code = ?
         """
+        params = [code]
         
         if start_date:
-            query += f" AND l.date >= '{start_date}'"
+            query += " AND l.date >= ?"
+            params.append(start_date)
         if end_date:
-            query += f" AND l.date <= '{end_date}'"
+            query += " AND l.date <= ?"
+            params.append(end_date)
         
         query += " ORDER BY l.date"
         
-        df = pd.read_sql_query(query, self.conn)
+        df = self._read_frame(query, params)
         return df
     
+    def query_stock_chain_records(self, code: str, start_date: str = None, end_date: str = None,
+                                  limit: int = None, offset: int = 0) -> pd.DataFrame:
+        """
+        查询指定股票有连板的记录（chain_height > 0），筛选与分页在 SQL 中完成
+        
+        参数:
+            code: 股票代码
+            start_date: 开始日期（可选）
+            end_date: 结束日期（可选）
+            limit: 返回条数上限（可选）
+            offset: 跳过的条数
+        
+        返回:
+            连板记录（日期、连板高度、板型、收盘价、成交量）
+        """
+        if not self.conn:
+            self.connect()
+        
+        query = """
+        SELECT 
+            l.date,
+            l.chain_height,
+            l.board_type,
+            m.close,
+            m.volume
+        FROM limit_analysis_result l
+        LEFT JOIN daily_market_data m ON l.date = m.date AND l.code = m.code
+        WHERE l.code = ? AND l.chain_height > 0
+        """
+        params = [code]
+        
+        if start_date:
+            query += " AND l.date >= ?"
+            params.append(start_date)
+        if end_date:
+            query += " AND l.date <= ?"
+            params.append(end_date)
+        
+        query += " ORDER BY l.date"
+        
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([int(limit), int(offset)])
+        
+        return self._read_frame(query, params)
+    
+    def query_stock_chain_series(self, code: str, start_date: str = None,
+                                 end_date: str = None) -> pd.DataFrame:
+        """
+        查询指定股票的连板高度序列（绘图用，只读结果表，不联表行情）
+        
+        返回:
+            按日期升序的 date, chain_height
+        """
+        if not self.conn:
+            self.connect()
+        
+        query = """
+        SELECT date, chain_height
+        FROM limit_analysis_result
+        WHERE code = ? AND chain_height IS NOT NULL
+        """
+        params = [code]
+        
+        if start_date:
+            query += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            query += " AND date <= ?"
+            params.append(end_date)
+        
+        query += " ORDER BY date"
+        
+        return self._read_frame(query, params)
+    
     def query_stock_max_chain(self, code: str) -> Dict[str, Any]:
         """
         查询股票的历史最高连板记录
@@ -148,19 +363,19 @@ class LimitQueryAPI:
         if not self.conn:
             self.connect()
         
-        query = f"""
+        query = """
         SELECT 
             l.date,
             l.chain_height,
             s.name
         FROM limit_analysis_result l
         LEFT JOIN stock_meta s ON l.code = s.code
-        WHERE l.code = '{code}'
+        WHERE l.code = ?
         ORDER BY l.chain_height DESC
         LIMIT 1
         """
         
-        df = pd.read_sql_query(query, self.conn)
+        df = self._read_frame(query, (code,))
         
         if df.empty:
             return {'code': code, 'max_chain': 0, 'date': None, 'name': None}
@@ -168,7 +383,8 @@ class LimitQueryAPI:
         row = df.iloc[0]
         return {
             'code': code,
-            'name': row['name'],
+            # 无名称时 pyarrow 类型返回 pd.NA，统一为 None
+            'name': row['name'] if pd.notna(row['name']) else None,
             'max_chain': int(row['chain_height']),
             'date': row['date']
         }
@@ -187,52 +403,41 @@ class LimitQueryAPI:
             self.connect()
         
         # #region agent log
-        try:
-            count_row = pd.read_sql_query(
-                f"SELECT COUNT(*) as cnt FROM daily_market_data WHERE date = '{date}'",
-                self.conn
-            ).iloc[0]
-            _dbg_log("H30", "query_api.py:query_daily_summary", "daily_market_data_count", {
-                "date": date,
-                "count": int(count_row["cnt"])
-            })
-        except Exception as e:
-            _dbg_log("H30", "query_api.py:query_daily_summary", "daily_market_data_count_exception", {
-                "date": date,
-                "error": str(e),
-                "error_type": type(e).__name__
-            })
+        if getattr(config, "DEBUG_LOG_ENABLE", False):
+            try:
+                count = self.conn.execute(
+                    "SELECT COUNT(*) FROM daily_market_data WHERE date = ?", (date,)
+                ).fetchone()[0]
+                _dbg_log("H30", "query_api.py:query_daily_summary", "daily_market_data_count", {
+                    "date": date,
+                    "count": int(count)
+                })
+            except Exception as e:
+                _dbg_log("H30", "query_api.py:query_daily_summary", "daily_market_data_count_exception", {
+                    "date": date,
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                })
         # #endregion agent log
 
-        # 涨停数量统计
-        query_limit = f"""
-        SELECT 
-            COUNT(*) as total_limit,
-            SUM(CASE WHEN board_type = 'yizi' THEN 1 ELSE 0 END) as yizi_count,
-            SUM(CASE WHEN is_fried = 1 THEN 1 ELSE 0 END) as fried_count
-        FROM limit_analysis_result
-        WHERE date = '{date}' AND limit_status = 1
-        """
-        
-        limit_stats = pd.read_sql_query(query_limit, self.conn).iloc[0]
-        
-        # 连板高度分布
-        query_dist = f"""
-        SELECT chain_height, COUNT(*) as count
-        FROM limit_analysis_result
-        WHERE date = '{date}' AND chain_height > 0
-        GROUP BY chain_height
-        ORDER BY chain_height
-        """
-        
-        chain_dist = pd.read_sql_query(query_dist, self.conn)
+        # 统计由当日明细筛选得到，与涨停/炸板明细共用同一次联表查询（同一快照）；
+        # 炸板股未封板，limit_status 为 0，不能限定在涨停行内计数
+        day = self._load_day_frame(date)
+        is_limit = (day['limit_status'] == 1).to_numpy(dtype=bool, na_value=False)
+        is_yizi = (day['board_type'] == 'yizi').to_numpy(dtype=bool, na_value=False)
+        is_fried = (day['is_fried'] == 1).to_numpy(dtype=bool, na_value=False)
+        # 连板高度是很小的非负整数，用 bincount 一次计数（下标即高度，0 为非连板）
+        heights = np.bincount(day['chain_height'].to_numpy(dtype=np.int64, na_value=0))
         
         return {
             'date': date,
-            'total_limit': int(limit_stats['total_limit']),
-            'yizi_count': int(limit_stats['yizi_count']),
-            'fried_count': int(limit_stats['fried_count']),
-            'chain_distribution': chain_dist.to_dict('records')
+            'total_limit': int(is_limit.sum()),
+            'yizi_count': int((is_limit & is_yizi).sum()),
+            'fried_count': int(is_fried.sum()),
+            'chain_distribution': [
+                {'chain_height': height, 'count': int(count)}
+                for height, count in enumerate(heights) if height > 0 and count
+            ]
         }
 
     def query_daily_limit_stocks(self, date: str, include_fried: bool = True) -> pd.DataFrame:
@@ -246,35 +451,11 @@ class LimitQueryAPI:
         返回:
             涨停股票明细
         """
-        if not self.conn:
-            self.connect()
-
-        query = f"""
-        SELECT 
-            l.date,
-            l.code,
-            s.name,
-            l.chain_height,
-            l.board_type,
-            l.is_fried,
-            m.close,
-            m.pre_close,
-            m.volume,
-            m.amount,
-            ROUND((m.close - m.pre_close) * 100.0 / m.pre_close, 2) as change_pct
-        FROM limit_analysis_result l
-        LEFT JOIN stock_meta s ON l.code = s.code
-        LEFT JOIN daily_market_data m ON l.date = m.date AND l.code = m.code
-        WHERE l.date = '{date}' AND l.limit_status = 1
-        """
-
+        day = self._load_day_frame(date)
+        mask = day['limit_status'] == 1
         if not include_fried:
-            query += " AND l.is_fried = 0"
-
-        query += " ORDER BY l.chain_height DESC, l.code"
-
-        df = pd.read_sql_query(query, self.conn)
-        return df
+            mask &= day['is_fried'] == 0
+        return day.loc[mask, _DETAIL_COLUMNS].reset_index(drop=True)
 
     def query_daily_fried_stocks(self, date: str) -> pd.DataFrame:
         """
@@ -286,31 +467,8 @@ class LimitQueryAPI:
         返回:
             炸板股票明细
         """
-        if not self.conn:
-            self.connect()
-
-        query = f"""
-        SELECT 
-            l.date,
-            l.code,
-            s.name,
-            l.chain_height,
-            l.board_type,
-            l.is_fried,
-            m.close,
-            m.pre_close,
-            m.volume,
-            m.amount,
-            ROUND((m.close - m.pre_close) * 100.0 / m.pre_close, 2) as change_pct
-        FROM limit_analysis_result l
-        LEFT JOIN stock_meta s ON l.code = s.code
-        LEFT JOIN daily_market_data m ON l.date = m.date AND l.code = m.code
-        WHERE l.date = '{date}' AND l.is_fried = 1
-        ORDER BY l.chain_height DESC, l.code
-        """
-
-        df = pd.read_sql_query(query, self.conn)
-        return df
+        day = self._load_day_frame(date)
+        return day.loc[day['is_fried'] == 1, _DETAIL_COLUMNS].reset_index(drop=True)
     
     def query_recent_limit_stocks(self, days: int = 5, min_height: int = 1) -> pd.DataFrame:
         """
@@ -326,7 +484,7 @@ class LimitQueryAPI:
         if not self.conn:
             self.connect()
         
-        query = f"""
+        query = """
         SELECT 
             l.date,
             l.code,
@@ -335,35 +493,39 @@ class LimitQueryAPI:
             l.board_type
         FROM limit_analysis_result l
         LEFT JOIN stock_meta s ON l.code = s.code
-        WHERE l.chain_height >= {min_height}
+        WHERE l.chain_height >= ?
         ORDER BY l.date DESC, l.chain_height DESC
-        LIMIT {days * 100}
+        LIMIT ?
         """
         
-        df = pd.read_sql_query(query, self.conn)
+        df = self._read_frame(query, (min_height, days * 100))
         return df
     
     def search_stocks_by_name(self, keyword: str) -> pd.DataFrame:
         """
-        根据股票名称搜索
+        根据股票名称或代码搜索（名称包含关键词，或代码以关键词开头）
         
         参数:
             keyword: 搜索关键词
         
         返回:
-            匹配的股票列表
+            匹配的股票列表（label 列为 "代码 - 名称"，供下拉框直接显示）
         """
         if not self.conn:
             self.connect()
         
-        query = f"""
-        SELECT code, name, board_type, is_st
+        # 关键词中的 % _ 按字面匹配，不作为通配符
+        keyword = keyword.strip()
+        pattern = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        
+        query = """
+        SELECT code, name, board_type, is_st, code || ' - ' || COALESCE(name, '') AS label
         FROM stock_meta
-        WHERE name LIKE '%{keyword}%'
+        WHERE name LIKE ? ESCAPE '\\' OR code LIKE ? ESCAPE '\\'
         ORDER BY code
         """
         
-        df = pd.read_sql_query(query, self.conn)
+        df = self._read_frame(query, (f"%{pattern}%", f"{pattern}%"))
         return df
 
 
@@ -5,6 +5,7 @@ import pandas as pd
 import sqlite3
 from config import DB_PATH
 import database
+from query_api import read_frame
 
 
 def verify_limit_calculation():
@@ -24,18 +25,17 @@ def verify_limit_calculation():
     LIMIT 10
     """
     
-    stocks_with_chain = pd.read_sql_query(query, conn)
+    # 只需要代码列表，直接从游标读取，不构造 DataFrame
+    codes = [row[0] for row in conn.execute(query)]
     
-    if stocks_with_chain.empty:
+    if not codes:
         print("\n⚠️  暂无连板数据，请先运行MVP流程")
         conn.close()
         return
     
-    print(f"\n找到 {len(stocks_with_chain)} 只有连板记录的股票，开始验证...\n")
+    print(f"\n找到 {len(codes)} 只有连板记录的股票，开始验证...\n")
     
-    for idx, row in stocks_with_chain.iterrows():
-        code = row['code']
-        verify_single_stock(conn, code)
+    verify_stocks(conn, codes)
     
     conn.close()
     
@@ -44,64 +44,73 @@ def verify_limit_calculation():
     print("="*60)
 
 
-def verify_single_stock(conn, code: str):
-    """验证单只股票的连板计算"""
-    # 获取该股票的原始数据和计算结果
-    query_market = f"""
-    SELECT date, code, open, high, low, close, pre_close
-    FROM daily_market_data
-    WHERE code = '{code}'
-    ORDER BY date
-    """
+def verify_stocks(conn, codes: list):
+    """批量验证多只股票的连板计算（行情、结果、元信息一次联表查询）"""
+    if not codes:
+        return
     
-    query_result = f"""
-    SELECT date, code, limit_status, chain_height, is_fried, board_type
-    FROM limit_analysis_result
-    WHERE code = '{code}'
-    ORDER BY date
+    placeholders = ",".join("?" * len(codes))
+    query = f"""
+    SELECT m.date, m.code, m.open, m.high, m.low, m.close, m.pre_close,
+           l.limit_status, l.chain_height, l.is_fried, l.board_type,
+           s.name, s.limit_ratio
+    FROM daily_market_data m
+    LEFT JOIN limit_analysis_result l ON m.date = l.date AND m.code = l.code
+    LEFT JOIN stock_meta s ON m.code = s.code
+    WHERE m.code IN ({placeholders})
+      AND (l.limit_status = 1 OR l.is_fried = 1 OR l.chain_height > 0)
+    ORDER BY m.code, m.date
     """
     
-    market_data = pd.read_sql_query(query_market, conn)
-    limit_result = pd.read_sql_query(query_result, conn)
-    
-    # 合并数据
-    merged = pd.merge(market_data, limit_result, on=['date', 'code'], how='left')
-    
-    # 只显示有涨停或炸板的记录
-    interesting = merged[
-        (merged['limit_status'] == 1) | 
-        (merged['is_fried'] == 1) | 
-        (merged['chain_height'] > 0)
-    ]
+    # 只取有涨停、炸板或连板的记录（筛选在 SQL 中完成）；
+    # 逐行格式化涨幅与涨跌幅限制，保持 NumPy 类型（缺失值为 NaN 而非 pd.NA）
+    interesting = pd.read_sql_query(query, conn, params=tuple(codes))
+    interesting['change_pct'] = (interesting['close'] - interesting['pre_close']) / interesting['pre_close'] * 100
     
+    for code, group in interesting.groupby('code', sort=True):
+        _print_verification(code, group)
+
+
+def verify_single_stock(conn, code: str):
+    """验证单只股票的连板计算"""
+    verify_stocks(conn, [code])
+
+
+def _print_verification(code: str, interesting: pd.DataFrame):
+    """打印单只股票的涨停/连板记录及涨幅核对"""
     if interesting.empty:
         return
     
     print(f"\n股票代码: {code}")
     print("-" * 60)
     
-    # 获取股票元信息
-    query_meta = f"SELECT name, limit_ratio FROM stock_meta WHERE code = '{code}'"
-    meta = pd.read_sql_query(query_meta, conn)
-    
-    if not meta.empty:
-        name = meta.iloc[0]['name']
-        limit_ratio = meta.iloc[0]['limit_ratio']
+    # 股票元信息（联表带出，无元信息时为空值）
+    name = interesting['name'].iloc[0]
+    limit_ratio = interesting['limit_ratio'].iloc[0]
+    if pd.notna(name) or pd.notna(limit_ratio):
         print(f"股票名称: {name}")
         print(f"涨跌幅限制: {limit_ratio*100:.0f}%")
     
     print("\n涨停/连板记录:")
     print(interesting[['date', 'close', 'pre_close', 'chain_height', 'board_type']].to_string(index=False))
     
-    # 手工验证几个关键点
-    for _, row in interesting.head(5).iterrows():
-        date = row['date']
-        close = row['close']
-        pre_close = row['pre_close']
-        
-        if pd.notna(close) and pd.notna(pre_close) and pre_close > 0:
-            actual_change = (close - pre_close) / pre_close * 100
-            print(f"\n  {date}: 涨幅 {actual_change:.2f}% (收盘{close:.2f}, 前收{pre_close:.2f})")
+    # 手工验证几个关键点（涨幅已按列计算，格式化后一次输出）
+    sample = interesting.head(5)
+    sample = sample[sample['change_pct'].notna() & (sample['pre_close'] > 0)]
+    if not sample.empty:
+        lines = (
+            "\n  " + sample['date'].astype(str)
+            + ": 涨幅 " + sample['change_pct'].map('{:.2f}'.format)
+            + "% (收盘" + sample['close'].map('{:.2f}'.format)
+            + ", 前收" + sample['pre_close'].map('{:.2f}'.format) + ")"
+        )
+        print("\n".join(lines))
+
+
+def _fetch_frame(cursor, query: str) -> pd.DataFrame:
+    """在给定游标上执行查询并转为 DataFrame"""
+    cursor.execute(query)
+    return pd.DataFrame(cursor.fetchall(), columns=[col[0] for col in cursor.description])
 
 
 def check_data_quality():
@@ -111,6 +120,10 @@ def check_data_quality():
     print("="*60 + "\n")
     
     conn = database.get_connection()
+    # 四项检查共用一个游标，并在同一读事务内完成（同一快照，只加一次共享锁）
+    cursor = conn.cursor()
+    cursor.arraysize = 1000
+    conn.execute("BEGIN")
     
     # 检查1: 缺失数据
     print("[1] 检查缺失数据...")
@@ -123,7 +136,7 @@ def check_data_quality():
     FROM daily_market_data
     """
     
-    missing = pd.read_sql_query(query_missing, conn)
+    missing = _fetch_frame(cursor, query_missing)
     print(missing.to_string(index=False))
     
     # 检查2: 异常涨跌幅
@@ -138,7 +151,7 @@ def check_data_quality():
     LIMIT 10
     """
     
-    abnormal = pd.read_sql_query(query_abnormal, conn)
+    abnormal = _fetch_frame(cursor, query_abnormal)
     if not abnormal.empty:
         print(abnormal.to_string(index=False))
     else:
@@ -154,7 +167,7 @@ def check_data_quality():
     ORDER BY chain_height
     """
     
-    chain_dist = pd.read_sql_query(query_chain_dist, conn)
+    chain_dist = _fetch_frame(cursor, query_chain_dist)
     if not chain_dist.empty:
         print(chain_dist.to_string(index=False))
     else:
@@ -174,10 +187,11 @@ def check_data_quality():
     LIMIT 10
     """
     
-    top_chain = pd.read_sql_query(query_top_chain, conn)
+    top_chain = _fetch_frame(cursor, query_top_chain)
     if not top_chain.empty:
         print(top_chain.to_string(index=False))
     
+    conn.rollback()
     conn.close()
 
 
@@ -207,7 +221,7 @@ def export_sample_data(output_file: str = 'sample_results.csv'):
     LIMIT 500
     """
     
-    df = pd.read_sql_query(query, conn)
+    df = read_frame(query, conn)
     conn.close()
     
     if not df.empty:
@@ -8,29 +8,280 @@ except ImportError:
     print("⚠️  Streamlit未安装，请运行: pip install streamlit")
     exit(1)
 
+import io
+import numpy as np
 import pandas as pd
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+import config
 import query_api
 import database
 
+# 局部重跑：片段内控件变化时只重跑该片段（旧版 Streamlit 退化为普通函数）
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
 
-# 缓存增量数据（避免每次页面刷新都重新加载）
-@st.cache_data(ttl=300)  # 5分钟缓存
-def load_increments_data():
-    """加载所有增量文件数据"""
-    try:
-        import increment_manager
-        
-        dates = increment_manager.list_increments()
-        if not dates:
-            return pd.DataFrame(), pd.DataFrame(), []
+
+def read_increments():
+    """
+    读取所有增量文件数据
+    
+    返回 (按日期拆分的分析结果 {日期字符串: DataFrame}, 按日期拆分的涨停股, 日期列表)；
+    页面只用分析结果，不构造增量文件中的行情数据；
+    分析结果只在加载时按日期拆分一次，各页面按日期直接取用，不再逐次全表筛选。
+    涨停股与数据库查询同序（连板高度降序、代码升序），高连板筛选只需二分定位后切片
+    """
+    import increment_manager
+    
+    dates = increment_manager.list_increments()
+    if not dates:
+        return {}, {}, []
+    
+    _, limit_results = increment_manager.load_all_increments(include_market=False)
+    if limit_results.empty or 'date' not in limit_results.columns:
+        return {}, {}, dates
+    # 增量文件中的日期本就是字符串，只有旧文件存成整数时才转换一次
+    date_col = limit_results['date']
+    if not pd.api.types.is_string_dtype(date_col):
+        date_col = date_col.astype(str)
+    limits_by_date = {date: group for date, group in limit_results.groupby(date_col, sort=False)}
+    
+    limit_up_by_date = {}
+    if {'limit_status', 'chain_height'}.issubset(limit_results.columns):
+        limit_up_by_date = {
+            date: group[group['limit_status'] == 1].sort_values(
+                ['chain_height', 'code'], ascending=[False, True], ignore_index=True
+            )
+            for date, group in limits_by_date.items()
+        }
+    return limits_by_date, limit_up_by_date, dates
+
+
+def read_db_dates(conn) -> list:
+    """数据库中最近 90 个交易日（降序）"""
+    rows = conn.execute(
+        "SELECT DISTINCT date FROM limit_analysis_result ORDER BY date DESC LIMIT 90"
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def data_version() -> tuple:
+    """
+    当前数据版本：增量文件的名称/大小/修改时间 + 数据库的 data_version
+    
+    两者都只读元数据，每次页面刷新都可调用；其他连接提交写入后 data_version 即变化
+    """
+    import increment_manager
+    
+    return increment_manager.increments_version(), db_version()
+
+
+def db_version() -> int:
+    """数据库的 data_version：其他连接提交写入后变化，用作数据库查询缓存的版本键"""
+    with shared_conn() as conn:
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+# 缓存启动数据（避免每次页面刷新都重新加载）
+# 各缓存函数只在未命中时显示加载提示，页面框架（标题、侧边栏）先于查询绘制
+@st.cache_data(ttl=3600, max_entries=2, show_spinner="加载数据...")
+def load_bootstrap(version: tuple):
+    """
+    并发读取增量文件与数据库可用日期（两者互不依赖，均为 I/O）
+    
+    以数据版本为缓存键：数据未变化时一直命中缓存，不会因到期而让下一位访问者等待重新加载；
+    数据有更新时下一次刷新立即加载新数据。
+    返回 (增量数据元组, 数据库日期列表, 增量文件加载错误信息或 None, 加载时间)；
+    工作线程中不调用 Streamlit 接口，连接与锁在脚本线程取得后传入
+    """
+    conn, lock = get_conn(), get_conn_lock()
+    
+    def read_dates():
+        with lock:
+            return read_db_dates(conn)
+    
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        increments_future = executor.submit(read_increments)
+        dates_future = executor.submit(read_dates)
         
-        market_data, limit_results = increment_manager.load_all_increments()
-        return market_data, limit_results, dates
-    except Exception as e:
-        st.warning(f"加载增量文件失败: {e}")
-        return pd.DataFrame(), pd.DataFrame(), []
+        error = None
+        try:
+            increments = increments_future.result()
+        except Exception as e:
+            increments = ({}, {}, [])
+            error = str(e)
+        return increments, dates_future.result(), error, datetime.now().strftime('%H:%M:%S')
+
+
+def is_increment_date(increment_data: dict, selected_date: str) -> bool:
+    """所选日期是否来自增量文件（按加载时建好的日期集合判断，不扫描日期列表）"""
+    return bool(increment_data) and str(selected_date) in increment_data['dates_set']
+
+
+def get_increment_day(increment_data: dict, selected_date: str) -> pd.DataFrame:
+    """取增量文件中指定日期的分析结果（无数据时返回空表）"""
+    if not increment_data:
+        return pd.DataFrame()
+    return increment_data['limits_by_date'].get(str(selected_date), pd.DataFrame())
+
+
+def get_increment_limit_up(increment_data: dict, selected_date: str, min_height: int = 1) -> pd.DataFrame:
+    """取增量文件中指定日期连板高度不低于 min_height 的涨停股（按高度降序存放，二分定位后切片）"""
+    limit_up = increment_data['limit_up_by_date'].get(str(selected_date)) if increment_data else None
+    if limit_up is None:
+        return pd.DataFrame()
+    heights = limit_up['chain_height'].to_numpy()
+    end = np.searchsorted(-heights, -min_height, side='right')
+    return limit_up.iloc[:end]
+
+
+@st.cache_resource(show_spinner="连接数据库...")
+def get_conn():
+    """
+    进程级共享的只读数据库连接
+    
+    Streamlit 每次重跑都在新线程中执行，线程内复用的连接池无法跨重跑命中；
+    页面只读不写，所有会话共用一个只读连接，省去反复建连与 PRAGMA 设置；
+    各会话的脚本线程与启动加载的工作线程会并发使用，须在 get_conn_lock() 下访问（见 shared_conn）
+    """
+    return database.get_readonly_connection(check_same_thread=False)
+
+
+@st.cache_resource(show_spinner=False)
+def get_conn_lock():
+    """串行化共享只读连接访问的进程级锁（可重入：持锁的查询内部可再次取连接）"""
+    return threading.RLock()
+
+
+@contextmanager
+def shared_conn():
+    """持锁期间独占使用进程级共享的只读连接"""
+    with get_conn_lock():
+        yield get_conn()
+
+
+@st.cache_resource(show_spinner=False)
+def get_api():
+    """
+    进程级共享的查询API
+    
+    API 内按日期缓存的明细在数据库版本变化时清空（见 cached_query），无需定时重建
+    """
+    return query_api.LimitQueryAPI(conn=get_conn())
+
+
+@st.cache_data(ttl=3600, show_spinner="查询数据...")
+def _cached_query(_api, version: int, method: str, *args):
+    """以数据库版本、方法名与参数作为缓存键；_api 以下划线开头，不参与缓存键"""
+    return getattr(_api, method)(*args)
+
+
+def cached_query(api, method: str, *args):
+    """
+    缓存 LimitQueryAPI 的只读查询结果
+    
+    缓存键包含数据库版本：有新数据写入后下一次重跑即重新查询，并清空 API 内按日期缓存的明细，
+    与启动数据、历史统计的缓存同步失效；TTL 仅作兜底
+    """
+    # API 使用共享连接：整个查询在锁内执行
+    with get_conn_lock():
+        version = db_version()
+        api.set_data_version(version)
+        return _cached_query(api, version, method, *args)
+
+
+# 历史统计只在入库新交易日后变化：以数据库版本为缓存键，TTL 仅作兜底
+@st.cache_data(ttl=3600, max_entries=4, show_spinner="统计历史数据...")
+def load_limit_trend(start_date: str, version: int = 0) -> pd.DataFrame:
+    """
+    每日涨停/炸板数量（start_date 起，日期已解析为时间类型，计数为 int32）
+    
+    优先读取每日涨停统计汇总表（每个交易日一行）；旧库无汇总表时按覆盖索引 idx_limit_date_status 分组统计
+    """
+    with shared_conn() as conn:
+        has_summary = conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'daily_limit_summary'"
+        ).fetchone()[0]
+        if has_summary:
+            trend_query = """
+            SELECT date, limit_count, fried_count
+            FROM daily_limit_summary
+            WHERE date >= ?
+            ORDER BY date
+            """
+        else:
+            trend_query = """
+            SELECT 
+                date,
+                SUM(CASE WHEN limit_status = 1 THEN 1 ELSE 0 END) as limit_count,
+                SUM(CASE WHEN is_fried = 1 THEN 1 ELSE 0 END) as fried_count
+            FROM limit_analysis_result
+            WHERE date >= ?
+            GROUP BY date
+            ORDER BY date
+            """
+        trend_df = query_api.read_frame(trend_query, conn, (start_date,), parse_dates={'date': '%Y%m%d'})
+        # 计数收窄为 int32，缓存与发送给图表的数据量减半
+        return trend_df.astype({'limit_count': 'int32', 'fried_count': 'int32'})
+
+
+@st.cache_data(ttl=3600, max_entries=4, show_spinner="统计历史数据...")
+def load_top_chain(start_date: str, version: int = 0) -> pd.DataFrame:
+    """start_date 起的高连板排行 Top 20"""
+    top_query = """
+    SELECT 
+        l.code,
+        s.name,
+        l.date,
+        l.chain_height
+    FROM limit_analysis_result l
+    LEFT JOIN stock_meta s ON l.code = s.code
+    WHERE l.chain_height >= 3 AND l.date >= ?
+    ORDER BY l.chain_height DESC, l.date DESC
+    LIMIT 20
+    """
+    with shared_conn() as conn:
+        return query_api.read_frame(top_query, conn, (start_date,))
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """
+    导出 CSV 下载内容（带 BOM，Excel 可直接识别中文）
+    
+    按表格内容缓存：未点击下载时的页面重跑不再重复序列化
+    """
+    # 直接写入字节缓冲区，不先生成完整的 str 再编码
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False, encoding='utf-8-sig')
+    return buffer.getvalue()
+
+
+def prefetch_neighbor_dates(api, available_dates: list, selected_date: str, increment_data: dict = None):
+    """后台预读所选日期前后相邻交易日的数据库明细（增量文件中的日期不走数据库）"""
+    idx = available_dates.index(selected_date)
+    neighbors = [
+        available_dates[i] for i in (idx - 1, idx + 1)
+        if 0 <= i < len(available_dates) and not is_increment_date(increment_data, available_dates[i])
+    ]
+    # 预读本身在后台线程用独立连接执行，这里只在锁内读取库路径并提交任务
+    with get_conn_lock():
+        api.prefetch_days(neighbors)
+
+
+# 表格默认只渲染前若干行，勾选"显示全部"后再发送完整表格到前端
+TABLE_PREVIEW_ROWS = 200
+_toggle = getattr(st, "toggle", None) or st.checkbox
+
+
+def show_table(display_df: pd.DataFrame, key: str, **kwargs):
+    """显示表格：行数超过 TABLE_PREVIEW_ROWS 时先显示前几行，由开关切换为完整表格"""
+    if len(display_df) > TABLE_PREVIEW_ROWS and not _toggle(f"显示全部 {len(display_df)} 条", key=key):
+        st.caption(f"仅显示前 {TABLE_PREVIEW_ROWS} 条")
+        display_df = display_df.head(TABLE_PREVIEW_ROWS)
+    st.dataframe(display_df, **kwargs)
 
 
 def get_combined_dates(db_dates: list, increment_dates: list) -> list:
@@ -54,37 +305,33 @@ def main():
         st.header("⚙️ 功能菜单")
         page = st.radio(
             "选择功能",
-            ["市场概览", "涨停/炸板明细", "高连板查询", "个股分析", "历史统计"]
+            list(PAGES)
         )
         
-        # 显示数据源信息
+        # 显示数据源信息（先占位，数据加载后填充）
         st.markdown("---")
         st.caption("📊 数据源状态")
+        source_status = st.empty()
     
-    # 初始化API
-    api = query_api.LimitQueryAPI()
-    api.connect()
+    # 进程级共享的API（连接跨重跑复用，不在每次重跑时关闭）
+    api = get_api()
     
-    # 加载增量数据
-    increment_market, increment_limits, increment_dates = load_increments_data()
+    # 并发加载增量数据与数据库可用日期
+    (
+        (increment_limits_by_date, increment_limit_up_by_date, increment_dates),
+        db_dates, increment_error, loaded_at
+    ) = load_bootstrap(data_version())
+    if increment_error:
+        st.warning(f"加载增量文件失败: {increment_error}")
     
     # 在侧边栏显示增量文件信息
-    with st.sidebar:
+    with source_status.container():
         if increment_dates:
             st.success(f"✓ 增量文件: {len(increment_dates)} 个")
             st.caption(f"最新: {increment_dates[-1] if increment_dates else 'N/A'}")
         else:
             st.info("无增量文件")
-    
-    # 获取数据库可用日期
-    conn = database.get_connection()
-    dates_df = pd.read_sql_query(
-        "SELECT DISTINCT date FROM limit_analysis_result ORDER BY date DESC LIMIT 90",
-        conn
-    )
-    conn.close()
-    
-    db_dates = dates_df['date'].tolist() if not dates_df.empty else []
+        st.caption(f"数据加载于 {loaded_at}")
     
     # 合并日期
     available_dates = get_combined_dates(db_dates, increment_dates)
@@ -95,24 +342,44 @@ def main():
     
     # 将增量数据传递给各页面
     increment_data = {
-        'market': increment_market,
-        'limits': increment_limits,
-        'dates': increment_dates
+        'limits_by_date': increment_limits_by_date,
+        'limit_up_by_date': increment_limit_up_by_date,
+        'dates': increment_dates,
+        'dates_set': frozenset(increment_dates)
     }
     
     # 根据选择的页面显示不同内容
-    if page == "市场概览":
-        show_market_overview(api, available_dates, increment_data)
-    elif page == "涨停/炸板明细":
-        show_daily_limit_details(api, available_dates, increment_data)
-    elif page == "高连板查询":
-        show_high_chain_query(api, available_dates, increment_data)
-    elif page == "个股分析":
-        show_stock_analysis(api, available_dates, increment_data)
-    elif page == "历史统计":
-        show_historical_stats(api, available_dates, increment_data)
-    
-    api.close()
+    PAGES[page](api, available_dates, increment_data)
+
+
+def summarize_increment_day(day_data: pd.DataFrame) -> dict:
+    """由增量文件的当日结果计算市场摘要（各列只取一次 NumPy 数组，连板分布用 np.bincount 计数）"""
+    columns = day_data.columns
+    status = day_data['limit_status'].to_numpy() if 'limit_status' in columns else None
+    
+    chain_distribution = []
+    if status is not None and 'chain_height' in columns:
+        # 连板高度是很小的非负整数，直接按高度计数，无需排序去重
+        counts = np.bincount(day_data['chain_height'].to_numpy()[status == 1].astype(np.int64))
+        chain_distribution = [
+            {'chain_height': height, 'count': int(count)} for height, count in enumerate(counts) if count
+        ]
+    
+    return {
+        'total_limit': int(status.sum()) if status is not None else 0,
+        'yizi_count': int((day_data['board_type'].to_numpy() == 'yizi').sum()) if 'board_type' in columns else 0,
+        'fried_count': int(day_data['is_fried'].to_numpy().sum()) if 'is_fried' in columns else 0,
+        'chain_distribution': chain_distribution
+    }
+
+
+def fill_display_columns(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """补齐增量数据缺少的展示列（名称缺失时用代码代替，数值列填 0）；不缺列时原样返回，不复制"""
+    missing = {
+        col: (df['code'] if col == 'name' else 0)
+        for col in columns if col not in df.columns
+    }
+    return df.assign(**missing) if missing else df
 
 
 def get_data_for_date(api, selected_date: str, increment_data: dict, data_type: str = 'summary'):
@@ -122,12 +389,10 @@ def get_data_for_date(api, selected_date: str, increment_data: dict, data_type:
     data_type: 'summary', 'limits', 'fried', 'high_chain'
     """
     # 检查是否在增量文件中
-    if selected_date in increment_data['dates']:
-        limits_df = increment_data['limits']
-        if not limits_df.empty:
-            day_data = limits_df[limits_df['date'].astype(str) == str(selected_date)]
-            if not day_data.empty:
-                return day_data, 'increment'
+    if is_increment_date(increment_data, selected_date):
+        day_data = get_increment_day(increment_data, selected_date)
+        if not day_data.empty:
+            return day_data, 'increment'
     
     # 从数据库获取
     return None, 'database'
@@ -140,28 +405,24 @@ def show_market_overview(api, available_dates, increment_data=None):
     # 日期选择
     selected_date = st.selectbox("选择日期", available_dates)
     
+    prefetch_neighbor_dates(api, available_dates, selected_date, increment_data)
+    
     # 标记数据来源
-    is_from_increment = selected_date in (increment_data.get('dates', []) if increment_data else [])
+    is_from_increment = is_increment_date(increment_data, selected_date)
     if is_from_increment:
         st.caption("📄 数据来源: 增量文件")
     
     # 获取市场摘要
     # 如果是增量数据，手动计算摘要
     if is_from_increment and increment_data:
-        limits_df = increment_data['limits']
-        day_data = limits_df[limits_df['date'].astype(str) == str(selected_date)]
+        day_data = get_increment_day(increment_data, selected_date)
         
         if not day_data.empty:
-            summary = {
-                'total_limit': int(day_data['limit_status'].sum()) if 'limit_status' in day_data.columns else 0,
-                'yizi_count': int((day_data['board_type'] == 'yizi').sum()) if 'board_type' in day_data.columns else 0,
-                'fried_count': int(day_data['is_fried'].sum()) if 'is_fried' in day_data.columns else 0,
-                'chain_distribution': day_data[day_data['limit_status'] == 1].groupby('chain_height').size().reset_index().values.tolist() if 'chain_height' in day_data.columns and 'limit_status' in day_data.columns else []
-            }
+            summary = summarize_increment_day(day_data)
         else:
-            summary = api.query_daily_summary(selected_date)
+            summary = cached_query(api, 'query_daily_summary', selected_date)
     else:
-        summary = api.query_daily_summary(selected_date)
+        summary = cached_query(api, 'query_daily_summary', selected_date)
     
     # 显示关键指标
     col1, col2, col3, col4 = st.columns(4)
@@ -183,8 +444,8 @@ def show_market_overview(api, available_dates, increment_data=None):
         dist_df = pd.DataFrame(summary['chain_distribution'])
         dist_df.columns = ['连板高度', '数量']
         
-        # 使用柱状图显示
-        st.bar_chart(dist_df.set_index('连板高度'))
+        # 使用柱状图显示（按列名指定坐标轴，不再重建索引副本）
+        st.bar_chart(dist_df, x='连板高度', y='数量')
         
         # 详细表格
         st.dataframe(dist_df, use_container_width=True)
@@ -203,58 +464,51 @@ def show_high_chain_query(api, available_dates, increment_data=None):
     with col2:
         min_height = st.slider("最小连板高度", 1, 10, 2)
     
+    prefetch_neighbor_dates(api, available_dates, selected_date, increment_data)
+    
     # 标记数据来源
-    is_from_increment = selected_date in (increment_data.get('dates', []) if increment_data else [])
+    is_from_increment = is_increment_date(increment_data, selected_date)
     if is_from_increment:
         st.caption("📄 数据来源: 增量文件")
     
     # 查询高连板股票
     if is_from_increment and increment_data:
-        limits_df = increment_data['limits']
-        day_data = limits_df[limits_df['date'].astype(str) == str(selected_date)]
+        day_data = get_increment_day(increment_data, selected_date)
         
         if not day_data.empty and 'chain_height' in day_data.columns:
-            high_chain = day_data[
-                (day_data['limit_status'] == 1) & 
-                (day_data['chain_height'] >= min_height)
-            ].copy()
+            high_chain = get_increment_limit_up(increment_data, selected_date, min_height)
             # 添加缺失的列（如果有的话）
-            if 'change_pct' not in high_chain.columns:
-                high_chain['change_pct'] = 0
-            if 'close' not in high_chain.columns:
-                high_chain['close'] = 0
-            if 'name' not in high_chain.columns:
-                high_chain['name'] = high_chain['code']
+            if not high_chain.empty:
+                high_chain = fill_display_columns(high_chain, ['change_pct', 'close', 'name'])
         else:
-            high_chain = api.query_high_chain_stocks(selected_date, min_height)
+            high_chain = cached_query(api, 'query_high_chain_stocks', selected_date, min_height)
     else:
-        high_chain = api.query_high_chain_stocks(selected_date, min_height)
+        high_chain = cached_query(api, 'query_high_chain_stocks', selected_date, min_height)
     
     if not high_chain.empty:
         st.success(f"找到 {len(high_chain)} 只股票")
         
         # 格式化显示
         display_df = high_chain[['code', 'name', 'chain_height', 'board_type', 
-                                'change_pct', 'close']].copy()
+                                'change_pct', 'close']]
         display_df.columns = ['代码', '名称', '连板高度', '板型', '涨幅%', '收盘价']
         
-        # 添加颜色标记
-        def highlight_chain(row):
-            if row['连板高度'] >= 5:
-                return ['background-color: #ffcccc'] * len(row)
-            elif row['连板高度'] >= 3:
-                return ['background-color: #ffffcc'] * len(row)
-            else:
-                return [''] * len(row)
-        
-        st.dataframe(
-            display_df.style.apply(highlight_chain, axis=1),
+        # 连板高度以进度条显示（前端渲染，不生成逐格样式）
+        show_table(
+            display_df,
+            key="high_chain_show_all",
+            column_config={
+                '连板高度': st.column_config.ProgressColumn(
+                    '连板高度', min_value=0, max_value=max(10, int(display_df['连板高度'].max())), format='%d板'
+                ),
+                '涨幅%': st.column_config.NumberColumn(format='%.2f%%'),
+            },
             use_container_width=True,
             height=400
         )
         
         # 下载选项
-        csv = display_df.to_csv(index=False, encoding='utf-8-sig')
+        csv = to_csv_bytes(display_df)
         st.download_button(
             label="📥 下载CSV",
             data=csv,
@@ -272,48 +526,19 @@ def show_daily_limit_details(api, available_dates, increment_data=None):
     # 日期选择
     selected_date = st.selectbox("选择日期", available_dates, key="detail_date")
     
+    prefetch_neighbor_dates(api, available_dates, selected_date, increment_data)
+    
     # 标记数据来源
-    is_from_increment = selected_date in (increment_data.get('dates', []) if increment_data else [])
+    is_from_increment = is_increment_date(increment_data, selected_date)
     if is_from_increment:
         st.caption("📄 数据来源: 增量文件")
     
-    # 获取数据
-    if is_from_increment and increment_data:
-        limits_df = increment_data['limits']
-        day_data = limits_df[limits_df['date'].astype(str) == str(selected_date)]
-        
-        if not day_data.empty:
-            # 计算摘要
-            summary = {
-                'total_limit': int(day_data['limit_status'].sum()) if 'limit_status' in day_data.columns else 0,
-                'chain_distribution': day_data[day_data['limit_status'] == 1].groupby('chain_height').size().reset_index().values.tolist() if 'chain_height' in day_data.columns else [],
-                'fried_count': int(day_data['is_fried'].sum()) if 'is_fried' in day_data.columns else 0
-            }
-            
-            # 涨停股
-            limit_df = day_data[day_data['limit_status'] == 1].copy() if 'limit_status' in day_data.columns else pd.DataFrame()
-            # 炸板股
-            fried_df = day_data[day_data['is_fried'] == 1].copy() if 'is_fried' in day_data.columns else pd.DataFrame()
-            
-            # 添加缺失列
-            for df in [limit_df, fried_df]:
-                if not df.empty:
-                    if 'name' not in df.columns:
-                        df['name'] = df['code']
-                    if 'change_pct' not in df.columns:
-                        df['change_pct'] = 0
-                    if 'close' not in df.columns:
-                        df['close'] = 0
-                    if 'volume' not in df.columns:
-                        df['volume'] = 0
-        else:
-            summary = api.query_daily_summary(selected_date)
-            limit_df = api.query_daily_limit_stocks(selected_date)
-            fried_df = api.query_daily_fried_stocks(selected_date)
+    # 获取数据（明细表只取当前选中的一类，见下方视图切换）
+    day_data = get_increment_day(increment_data, selected_date) if is_from_increment and increment_data else pd.DataFrame()
+    if not day_data.empty:
+        summary = summarize_increment_day(day_data)
     else:
-        summary = api.query_daily_summary(selected_date)
-        limit_df = api.query_daily_limit_stocks(selected_date)
-        fried_df = api.query_daily_fried_stocks(selected_date)
+        summary = cached_query(api, 'query_daily_summary', selected_date)
     
     # 摘要指标
     col1, col2, col3 = st.columns(3)
@@ -324,41 +549,74 @@ def show_daily_limit_details(api, available_dates, increment_data=None):
     with col3:
         st.metric("炸板数", summary['fried_count'])
     
-    tab1, tab2 = st.tabs(["涨停股", "炸板股"])
+    # st.tabs 会在每次重跑时执行所有标签页的内容，改用单选切换，只筛选、格式化当前查看的一类；
+    # 数量取自摘要，标签上即可看出哪一类为空
+    counts = {"涨停股": summary['total_limit'], "炸板股": summary['fried_count']}
+    view = st.radio(
+        "明细类型",
+        list(counts),
+        horizontal=True,
+        key="detail_view",
+        format_func=lambda v: f"{v} ({counts[v]})",
+        label_visibility="collapsed"
+    )
     
-    with tab1:
-        if not limit_df.empty:
-            display_df = limit_df[['code', 'name', 'chain_height', 'board_type', 
-                                   'is_fried', 'change_pct', 'close', 'volume']].copy()
-            display_df.columns = ['代码', '名称', '连板高度', '板型', '是否炸板', '涨幅%', '收盘价', '成交量']
-            st.dataframe(display_df, use_container_width=True, height=520)
-            
-            csv = display_df.to_csv(index=False, encoding='utf-8-sig')
-            st.download_button(
-                label="📥 下载涨停股CSV",
-                data=csv,
-                file_name=f'limit_stocks_{selected_date}.csv',
-                mime='text/csv'
-            )
+    if view == "涨停股":
+        if not day_data.empty:
+            limit_df = day_data[day_data['limit_status'] == 1] if 'limit_status' in day_data.columns else pd.DataFrame()
+            if not limit_df.empty:
+                limit_df = fill_display_columns(limit_df, ['name', 'change_pct', 'close', 'volume'])
         else:
-            st.info("当日无涨停股票")
-    
-    with tab2:
-        if not fried_df.empty:
-            display_df = fried_df[['code', 'name', 'chain_height', 'board_type', 
-                                   'change_pct', 'close', 'volume']].copy()
-            display_df.columns = ['代码', '名称', '连板高度', '板型', '涨幅%', '收盘价', '成交量']
-            st.dataframe(display_df, use_container_width=True, height=520)
-            
-            csv = display_df.to_csv(index=False, encoding='utf-8-sig')
-            st.download_button(
-                label="📥 下载炸板股CSV",
-                data=csv,
-                file_name=f'fried_stocks_{selected_date}.csv',
-                mime='text/csv'
-            )
+            limit_df = cached_query(api, 'query_daily_limit_stocks', selected_date)
+        _limit_tab(limit_df, selected_date)
+    else:
+        if not day_data.empty:
+            fried_df = day_data[day_data['is_fried'] == 1] if 'is_fried' in day_data.columns else pd.DataFrame()
+            if not fried_df.empty:
+                fried_df = fill_display_columns(fried_df, ['name', 'change_pct', 'close', 'volume'])
         else:
-            st.info("当日无炸板股票")
+            fried_df = cached_query(api, 'query_daily_fried_stocks', selected_date)
+        _fried_tab(fried_df, selected_date)
+
+
+@fragment
+def _limit_tab(limit_df: pd.DataFrame, selected_date: str):
+    """涨停股标签页"""
+    if not limit_df.empty:
+        display_df = limit_df[['code', 'name', 'chain_height', 'board_type', 
+                               'is_fried', 'change_pct', 'close', 'volume']]
+        display_df.columns = ['代码', '名称', '连板高度', '板型', '是否炸板', '涨幅%', '收盘价', '成交量']
+        show_table(display_df, key="limit_show_all", use_container_width=True, height=520)
+        
+        csv = to_csv_bytes(display_df)
+        st.download_button(
+            label="📥 下载涨停股CSV",
+            data=csv,
+            file_name=f'limit_stocks_{selected_date}.csv',
+            mime='text/csv'
+        )
+    else:
+        st.info("当日无涨停股票")
+
+
+@fragment
+def _fried_tab(fried_df: pd.DataFrame, selected_date: str):
+    """炸板股标签页"""
+    if not fried_df.empty:
+        display_df = fried_df[['code', 'name', 'chain_height', 'board_type', 
+                               'change_pct', 'close', 'volume']]
+        display_df.columns = ['代码', '名称', '连板高度', '板型', '涨幅%', '收盘价', '成交量']
+        show_table(display_df, key="fried_show_all", use_container_width=True, height=520)
+        
+        csv = to_csv_bytes(display_df)
+        st.download_button(
+            label="📥 下载炸板股CSV",
+            data=csv,
+            file_name=f'fried_stocks_{selected_date}.csv',
+            mime='text/csv'
+        )
+    else:
+        st.info("当日无炸板股票")
 
 
 def show_stock_analysis(api, available_dates, increment_data=None):
@@ -373,114 +631,112 @@ def show_stock_analysis(api, available_dates, increment_data=None):
     
     if keyword:
         # 搜索股票
-        search_results = api.search_stocks_by_name(keyword)
+        search_results = cached_query(api, 'search_stocks_by_name', keyword)
         
         if not search_results.empty:
+            labels = search_results['label'].tolist()
             with col2:
-                selected_stock = st.selectbox(
+                selected_idx = st.selectbox(
                     "选择股票",
-                    search_results['code'] + ' - ' + search_results['name']
+                    range(len(labels)),
+                    format_func=labels.__getitem__
                 )
             
-            code = selected_stock.split(' - ')[0]
-            
             # 显示股票基本信息
-            stock_info = search_results[search_results['code'] == code].iloc[0]
-            st.info(f"**{stock_info['name']}** ({code}) - {stock_info['board_type']}")
-            
-            # 查询历史最高连板
-            max_chain = api.query_stock_max_chain(code)
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                st.metric("历史最高连板", f"{max_chain['max_chain']}板")
-            with col2:
-                if max_chain['date']:
-                    st.metric("最高连板日期", max_chain['date'])
+            stock_info = search_results.iloc[selected_idx]
+            code = stock_info['code']
+            _stock_meta_fragment(api, code, stock_info)
             
             # 查询连板历史
-            st.subheader("连板历史记录")
-            
-            # 日期范围选择
-            col1, col2 = st.columns(2)
-            with col1:
-                start_date = st.selectbox("开始日期", available_dates[-10:], index=0)
-            with col2:
-                end_date = st.selectbox("结束日期", available_dates, index=0)
+            _history_fragment(api, code, available_dates)
+        else:
+            st.warning("未找到匹配的股票")
+
+
+@fragment
+def _stock_meta_fragment(api, code: str, stock_info: pd.Series):
+    """个股基本信息与历史最高连板"""
+    st.info(f"**{stock_info['name']}** ({code}) - {stock_info['board_type']}")
+    
+    # 查询历史最高连板
+    max_chain = cached_query(api, 'query_stock_max_chain', code)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("历史最高连板", f"{max_chain['max_chain']}板")
+    with col2:
+        if max_chain['date']:
+            st.metric("最高连板日期", max_chain['date'])
+
+
+@fragment
+def _history_fragment(api, code: str, available_dates: list):
+    """连板历史记录（调整日期范围只重跑本片段）"""
+    st.subheader("连板历史记录")
+    
+    # 日期范围选择
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.selectbox("开始日期", available_dates[-10:], index=0)
+    with col2:
+        end_date = st.selectbox("结束日期", available_dates, index=0)
+    
+    series = cached_query(api, 'query_stock_chain_series', code, start_date, end_date)
+    
+    if not series.empty:
+        # 只显示有连板的记录（筛选在 SQL 中完成）
+        chain_records = cached_query(api, 'query_stock_chain_records', code, start_date, end_date)
+        
+        if not chain_records.empty:
+            display_df = chain_records[['date', 'chain_height', 'board_type', 
+                                        'close', 'volume']]
+            display_df.columns = ['日期', '连板高度', '板型', '收盘价', '成交量']
             
-            history = api.query_stock_chain_history(code, start_date, end_date)
+            st.dataframe(display_df, use_container_width=True)
             
-            if not history.empty:
-                # 只显示有连板的记录
-                chain_records = history[history['chain_height'] > 0]
-                
-                if not chain_records.empty:
-                    display_df = chain_records[['date', 'chain_height', 'board_type', 
-                                               'close', 'volume']].copy()
-                    display_df.columns = ['日期', '连板高度', '板型', '收盘价', '成交量']
-                    
-                    st.dataframe(display_df, use_container_width=True)
-                    
-                    # 连板高度趋势图
-                    st.line_chart(history.set_index('date')['chain_height'])
-                else:
-                    st.info("该时间范围内无连板记录")
-            else:
-                st.warning("未找到历史数据")
+            # 连板高度趋势图
+            st.line_chart(series, x='date', y='chain_height')
         else:
-            st.warning("未找到匹配的股票")
+            st.info("该时间范围内无连板记录")
+    else:
+        st.warning("未找到历史数据")
 
 
 def show_historical_stats(api, available_dates, increment_data=None):
     """历史统计页面"""
     st.header("历史统计分析")
     
-    conn = database.get_connection()
+    # 统计窗口：日期条件下推到 SQL，只扫描最近一段时间
+    history_days = getattr(config, "WEB_HISTORY_DAYS", 365)
+    start_date = (datetime.now() - timedelta(days=history_days)).strftime('%Y%m%d')
     
     # 每日涨停数量趋势
     st.subheader("每日涨停数量趋势")
     
-    trend_query = """
-    SELECT 
-        date,
-        SUM(CASE WHEN limit_status = 1 THEN 1 ELSE 0 END) as limit_count,
-        SUM(CASE WHEN is_fried = 1 THEN 1 ELSE 0 END) as fried_count
-    FROM limit_analysis_result
-    GROUP BY date
-    ORDER BY date
-    """
-    
-    trend_df = pd.read_sql_query(trend_query, conn)
+    version = db_version()
+    trend_df = load_limit_trend(start_date, version)
     
     if not trend_df.empty:
-        trend_df['date'] = pd.to_datetime(trend_df['date'], format='%Y%m%d')
-        trend_df = trend_df.set_index('date')
-        
-        st.line_chart(trend_df[['limit_count', 'fried_count']])
+        st.line_chart(trend_df, x='date', y=['limit_count', 'fried_count'])
     
     # 高连板股票统计
-    st.subheader("高连板股票排行（历史Top 20）")
+    st.subheader(f"高连板股票排行（近{history_days}天Top 20）")
     
-    top_query = """
-    SELECT 
-        l.code,
-        s.name,
-        l.date,
-        l.chain_height
-    FROM limit_analysis_result l
-    LEFT JOIN stock_meta s ON l.code = s.code
-    WHERE l.chain_height >= 3
-    ORDER BY l.chain_height DESC, l.date DESC
-    LIMIT 20
-    """
-    
-    top_df = pd.read_sql_query(top_query, conn)
+    top_df = load_top_chain(start_date, version)
     
     if not top_df.empty:
         top_df.columns = ['代码', '名称', '日期', '连板高度']
         st.dataframe(top_df, use_container_width=True)
-    
-    conn.close()
+
+
+# 页面名称 -> 渲染函数（侧边栏按此顺序列出）
+PAGES = {
+    "市场概览": show_market_overview,
+    "涨停/炸板明细": show_daily_limit_details,
+    "高连板查询": show_high_chain_query,
+    "个股分析": show_stock_analysis,
+    "历史统计": show_historical_stats,
+}
 
 
 if __name__ == '__main__':